@@ -1,11 +1,11 @@
-
 import bpy
 import os
+import sys
+import time
 import importlib
 
-from .core import material, template, utilities
+from .core import image_prefetch, jobs, material_cache, memory, previews, watcher
 from .ui import addon_preferences, material_panel
-from .unittests import operator_tests
 from . import constants, operators, properties
 
 bl_info = {
@@ -20,22 +20,51 @@ bl_info = {
     "category": "Pipeline",
 }
 
-modules = [constants, material, template, utilities, operators, properties, addon_preferences, material_panel, operator_tests]
+# Set this environment variable to reload the addon modules every time the addon is enabled
+DEV_MODE_VARIABLE = "MATERIAL_CREATOR_DEV_MODE"
+
+
+def reload_modules():
+    """
+    Reloads every loaded module of the addon, so code changes are picked up without restarting Blender.
+    """
+    prefix = __name__ + "."
+    for name in sorted(name for name in sys.modules if name.startswith(prefix)):
+        importlib.reload(sys.modules[name])
 
 
 def register():
     """
     Registers the addon classes when the addon is enabled.
     """
-    for module in modules:
-        importlib.reload(module)
+    start = time.perf_counter()
+    if os.environ.get(DEV_MODE_VARIABLE):
+        reload_modules()
+
     properties.register()
     operators.register()
     addon_preferences.register()
     material_panel.register()
+    material_cache.register()
+    memory.register()
+    previews.register()
+    watcher.register()
+    # Blender does not show info logs by default, so the registration time is printed to the console
+    print(f"Registered {constants.ToolInfo.NAME.value} in {(time.perf_counter() - start) * 1000:.1f} ms")
 
 
 def unregister():
+    jobs.unregister()
+    image_prefetch.PREFETCHER.stop()
+    watcher.unregister()
+    previews.unregister()
+    memory.unregister()
+    material_cache.unregister()
+    # These modules are only imported once they are first used
+    for module_name in ("catalog", "library", "usage"):
+        module = sys.modules.get(f"{__name__}.core.{module_name}")
+        if module:
+            module.unregister()
     operators.unregister()
     addon_preferences.unregister()
     properties.unregister()
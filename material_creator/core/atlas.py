@@ -0,0 +1,406 @@
+import os
+import bpy
+import logging
+import itertools
+import numpy as np
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from . import image_scan, material
+from .budgets import resize_pixels, to_rgba
+from .packing import read_image_pixels, write_image
+
+LOGGER = logging.getLogger(__name__)
+
+# UVs this far outside of the 0-1 range still count as not tiling
+UV_TOLERANCE = 1e-4
+ATLAS_PREFIX = "Atlas"
+
+
+@dataclass
+class AtlasEntry():
+    material_name: str
+    images: Dict[str, bpy.types.Image]
+    width: int
+    height: int
+    x: int = 0
+    y: int = 0
+
+
+@dataclass
+class AtlasResult():
+    materials: List[str] = field(default_factory=list)
+    meshes: int = 0
+    problems: List[str] = field(default_factory=list)
+
+
+def pack_shelves(sizes: List[Tuple[int, int]], width: int, padding: int) -> Tuple[List[Tuple[int, int]], int]:
+    """
+    Places rectangles on shelves, tallest first, filling each shelf from left to right.
+
+    Args:
+        sizes (List[Tuple[int, int]]): The width and height of each rectangle.
+        width (int): The width of the atlas.
+        padding (int): The number of pixels kept around each rectangle.
+
+    Returns:
+        Tuple[List[Tuple[int, int]], int]: The position of each rectangle, and the height used.
+    """
+    order = sorted(range(len(sizes)), key=lambda index: (-sizes[index][1], -sizes[index][0]))
+    positions = [None] * len(sizes)
+    x = y = shelf_height = 0
+    for index in order:
+        padded_width = sizes[index][0] + 2 * padding
+        padded_height = sizes[index][1] + 2 * padding
+        if x + padded_width > width:
+            y += shelf_height
+            x = shelf_height = 0
+        positions[index] = (x + padding, y + padding)
+        x += padded_width
+        shelf_height = max(shelf_height, padded_height)
+    return positions, y + shelf_height
+
+
+def plan_atlas(entries: List[AtlasEntry], max_size: int, padding: int) -> Tuple[int, int, List[AtlasEntry]]:
+    """
+    Finds the smallest power of two atlas holding the entries, placing as many as fit within the maximum size.
+
+    Args:
+        entries (List[AtlasEntry]): The entries to place, their positions are set.
+        max_size (int): The largest width and height of the atlas.
+        padding (int): The number of pixels kept around each entry.
+
+    Returns:
+        Tuple[int, int, List[AtlasEntry]]: The width and height of the atlas, and the entries which did not fit.
+    """
+    sizes = [(entry.width, entry.height) for entry in entries]
+    widest = max(size[0] for size in sizes) + 2 * padding
+    width = min(1 << max(0, (widest - 1).bit_length()), max_size)
+    while True:
+        positions, used_height = pack_shelves(sizes, width, padding)
+        if used_height <= width or width >= max_size:
+            break
+        width *= 2
+
+    height = min(1 << max(0, (used_height - 1).bit_length()), max_size)
+    remaining = []
+    for entry, (x, y) in zip(entries, positions):
+        if y + entry.height + padding > height:
+            remaining.append(entry)
+            continue
+        entry.x, entry.y = x, y
+    return width, height, remaining
+
+
+def get_slot_images(mat: bpy.types.Material) -> Optional[Dict[str, bpy.types.Image]]:
+    """
+    Get the image of every texture slot of the material, or None if a slot uses several different images.
+
+    Args:
+        mat (bpy.types.Material): The material.
+
+    Returns:
+        Optional[Dict[str, bpy.types.Image]]: The images keyed by slot name.
+    """
+    properties = material.get_material_properties(mat)
+    images = {}
+    for slot in material.get_texture_slots(properties, optional=True):
+        texture_nodes = material.get_texture_nodes(properties, slot.slot_name)
+        if isinstance(texture_nodes, ValueError):
+            return None
+        slot_images = {node.image for node in texture_nodes if node.image}
+        if len(slot_images) > 1:
+            return None
+        if slot_images:
+            images[slot.slot_name] = slot_images.pop()
+    return images
+
+
+def get_uv_layer(mesh: bpy.types.Mesh) -> Optional[bpy.types.MeshUVLoopLayer]:
+    """ Get the UV layer used by image textures without a UV map node, which is the active render layer """
+    for uv_layer in mesh.uv_layers:
+        if uv_layer.active_render:
+            return uv_layer
+    return mesh.uv_layers.active
+
+
+def read_mesh_arrays(mesh: bpy.types.Mesh) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    Reads the material index of each face, the material index of each face corner and the UVs in bulk.
+
+    Args:
+        mesh (bpy.types.Mesh): The mesh to read.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]: The face material indices, the corner material
+        indices and the (corners, 2) UVs, or None if the mesh has no UV layer.
+    """
+    face_materials = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", face_materials)
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    # The corners of each face are stored after those of the previous face
+    loop_materials = np.repeat(np.minimum(face_materials, max(len(mesh.materials) - 1, 0)), loop_totals)
+
+    uv_layer = get_uv_layer(mesh)
+    if not uv_layer:
+        return face_materials, loop_materials, None
+    uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    uv_layer.data.foreach_get("uv", uvs)
+    return face_materials, loop_materials, uvs.reshape(-1, 2)
+
+
+def find_tiling_materials(meshes: Iterable[bpy.types.Mesh], material_names: Iterable[str]) -> Dict[str, str]:
+    """
+    Finds the materials which cannot be atlased because their faces tile the texture or have no UVs.
+
+    Args:
+        meshes (Iterable[bpy.types.Mesh]): The meshes to check.
+        material_names (Iterable[str]): The names of the candidate materials.
+
+    Returns:
+        Dict[str, str]: The reason each material cannot be atlased, keyed by material name.
+    """
+    material_names = set(material_names)
+    excluded = {}
+    for mesh in meshes:
+        slots = {
+            index: mat.name for index, mat in enumerate(mesh.materials)
+            if mat and mat.name in material_names and mat.name not in excluded
+        }
+        if not slots:
+            continue
+
+        _face_materials, loop_materials, uvs = read_mesh_arrays(mesh)
+        for index, material_name in slots.items():
+            if uvs is None:
+                excluded[material_name] = f"'{mesh.name}' has no UVs"
+                continue
+            slot_uvs = uvs[loop_materials == index]
+            if slot_uvs.size and (slot_uvs.min() < -UV_TOLERANCE or slot_uvs.max() > 1 + UV_TOLERANCE):
+                excluded[material_name] = f"UVs of '{mesh.name}' tile outside of the 0-1 range"
+    return excluded
+
+
+def build_atlas_images(entries: List[AtlasEntry], width: int, height: int, padding: int,
+                       output_dir: str, base_name: str) -> Dict[str, str]:
+    """
+    Blits the images of the placed entries into one atlas per texture slot and writes them to disk.
+
+    Args:
+        entries (List[AtlasEntry]): The placed entries.
+        width (int): The width of the atlas.
+        height (int): The height of the atlas.
+        padding (int): The number of edge pixels repeated around each entry.
+        output_dir (str): The directory the atlases are written to.
+        base_name (str): The name the atlas file names start with.
+
+    Returns:
+        Dict[str, str]: The file paths of the atlases keyed by slot name.
+    """
+    atlas_paths = {}
+    slot_names = sorted({slot_name for entry in entries for slot_name in entry.images})
+    for slot_name in slot_names:
+        is_float = any(entry.images[slot_name].is_float for entry in entries)
+        atlas = np.zeros((height, width, 4), dtype=np.float32)
+        for entry in entries:
+            image = entry.images[slot_name]
+            pixels = read_image_pixels(image)
+            if (image.size[0], image.size[1]) != (entry.width, entry.height):
+                pixels = resize_pixels(pixels, entry.width, entry.height, clamp=not image.is_float)
+            tile = np.pad(to_rgba(pixels), ((padding, padding), (padding, padding), (0, 0)), mode='edge')
+            atlas[entry.y - padding:entry.y + entry.height + padding,
+                  entry.x - padding:entry.x + entry.width + padding] = tile
+
+        extension, file_format = (".exr", 'OPEN_EXR') if is_float else (".png", 'PNG')
+        atlas_paths[slot_name] = os.path.join(output_dir, f"{base_name}_{slot_name}{extension}")
+        write_image(atlas, atlas_paths[slot_name], file_format)
+    return atlas_paths
+
+
+def get_atlas_size(type_name: str, slot_names: Iterable[str], max_size: int) -> int:
+    """
+    Get the largest width and height of the atlases of a group, within the budget of every slot they fill.
+
+    Args:
+        type_name (str): The material type of the group.
+        slot_names (Iterable[str]): The slots holding an image.
+        max_size (int): The largest width and height asked for.
+
+    Returns:
+        int: The atlas size, the smallest of the maximum size and the slot budgets.
+    """
+    material_type = material.get_template().material_config.material_types[type_name]
+    slot_names = set(slot_names)
+    budgets = [
+        image_scan.get_slot_budget(material_type, slot)
+        for slot in material_type.required_texture_slots + material_type.optional_texture_slots
+        if slot.slot_name in slot_names
+    ]
+    return min([max_size] + [budget for budget in budgets if budget])
+
+
+def get_atlas_name(type_name: str, output_dir: str) -> str:
+    """
+    Get an atlas name which no material or file in the output directory uses yet,
+    so earlier atlases and the meshes using them are never overwritten.
+
+    Args:
+        type_name (str): The material type of the atlas.
+        output_dir (str): The directory the atlases are written to.
+
+    Returns:
+        str: The name, e.g. 'Atlas_PBR_2'.
+    """
+    suffix = material.get_template().material_config.material_types[type_name].suffix
+    file_names = os.listdir(output_dir) if os.path.isdir(output_dir) else []
+    for index in itertools.count():
+        name = f"{ATLAS_PREFIX}_{type_name}_{index}"
+        if name + suffix in bpy.data.materials or name in bpy.data.materials:
+            continue
+        if any(file_name.startswith(name + "_") for file_name in file_names):
+            continue
+        return name
+
+
+def create_atlas_material(name: str, type_name: str,
+                          atlas_paths: Dict[str, str]) -> Tuple[bpy.types.Material, material.TextureMapResult]:
+    """
+    Creates a material of the given type from the template and assigns the atlases to its slots.
+
+    Returns:
+        Tuple[bpy.types.Material, TextureMapResult]: The material, and the atlases which could not be assigned.
+    """
+    material_type = material.get_template().material_config.material_types[type_name]
+    atlas_material = bpy.data.materials.new(name=name + material_type.suffix)
+    atlas_material.use_nodes = True
+
+    properties = material.get_material_properties(atlas_material)
+    material.create_material_nodes(properties)
+    return atlas_material, material.set_texture_maps(properties, atlas_paths)
+
+
+def remap_mesh(mesh: bpy.types.Mesh, placements: Dict[str, Tuple[str, np.ndarray]]) -> bool:
+    """
+    Moves the UVs of the atlased materials into their atlas rectangles and assigns their faces to the
+    atlas materials, in a single bulk read and write of the mesh.
+
+    Args:
+        mesh (bpy.types.Mesh): The mesh to remap.
+        placements (Dict[str, Tuple[str, np.ndarray]]): The atlas material name and the UV scale and
+            offset (su, sv, ou, ov) keyed by the name of each atlased material.
+
+    Returns:
+        bool: True if the mesh used any atlased material.
+    """
+    atlased = {
+        index: placements[mat.name] for index, mat in enumerate(mesh.materials)
+        if mat and mat.name in placements
+    }
+    if not atlased:
+        return False
+
+    # Read before the atlas materials are added, which changes how out of range indices are clamped
+    face_materials, loop_materials, uvs = read_mesh_arrays(mesh)
+    slot_count = len(mesh.materials)
+    transforms = np.tile(np.array([1.0, 1.0, 0.0, 0.0], dtype=np.float32), (slot_count, 1))
+    remap = np.arange(slot_count, dtype=np.int32)
+    for index, (atlas_name, transform) in atlased.items():
+        atlas_index = mesh.materials.find(atlas_name)
+        if atlas_index < 0:
+            mesh.materials.append(bpy.data.materials[atlas_name])
+            atlas_index = len(mesh.materials) - 1
+        transforms[index] = transform
+        remap[index] = atlas_index
+
+    uvs = uvs * transforms[loop_materials, :2] + transforms[loop_materials, 2:]
+    get_uv_layer(mesh).data.foreach_set("uv", uvs.ravel())
+
+    face_materials = remap[np.minimum(face_materials, slot_count - 1)]
+    mesh.polygons.foreach_set("material_index", face_materials)
+    mesh.update()
+    return True
+
+
+def build_atlases(materials: Iterable[bpy.types.Material], output_dir: str, max_size: int = 4096,
+                  padding: int = 4) -> AtlasResult:
+    """
+    Combines materials of the same type into atlas materials. Materials are grouped by material type and by
+    the texture slots holding an image, every slot of a group is packed into its own atlas with the same layout.
+
+    The UVs of every mesh using the atlased materials are remapped into the atlas, and their faces assigned
+    to the atlas material. The original materials are kept, so users other than meshes are not affected.
+
+    Args:
+        materials (Iterable[bpy.types.Material]): The materials to combine.
+        output_dir (str): The directory the atlases are written to.
+        max_size (int): The largest width and height of an atlas, lowered to the slot budgets of each type.
+        padding (int): The number of edge pixels repeated around each material's images.
+
+    Returns:
+        AtlasResult: The atlas materials created and the materials which could not be atlased.
+    """
+    result = AtlasResult()
+    meshes = {obj.data for obj in bpy.data.objects if obj.type == 'MESH'}
+
+    candidates = {}
+    for mat in materials:
+        images = get_slot_images(mat) if mat.use_nodes and mat.node_tree else None
+        if not images:
+            result.problems.append(f"'{mat.name}' has no texture slot images, or several images in one slot")
+            continue
+        candidates[mat.name] = images
+
+    for material_name, reason in find_tiling_materials(meshes, candidates).items():
+        result.problems.append(f"'{material_name}' can not be atlased: {reason}")
+        del candidates[material_name]
+
+    groups = defaultdict(list)
+    for material_name, images in candidates.items():
+        type_name = material.get_material_type(material.get_material_properties(bpy.data.materials[material_name]))
+        width = max(image.size[0] for image in images.values())
+        height = max(image.size[1] for image in images.values())
+        groups[(type_name, tuple(sorted(images)))].append(AtlasEntry(material_name, images, width, height))
+
+    placements = {}
+    for (type_name, slot_names), group_entries in groups.items():
+        # Atlases larger than the slot budgets would only be downsampled again
+        atlas_size = get_atlas_size(type_name, slot_names, max_size)
+        entries = []
+        for entry in group_entries:
+            if max(entry.width, entry.height) + 2 * padding > atlas_size:
+                result.problems.append(f"'{entry.material_name}' has images larger than the atlas size {atlas_size}")
+            else:
+                entries.append(entry)
+        if len(entries) < 2:
+            continue
+        while entries:
+            width, height, entries_left = plan_atlas(entries, atlas_size, padding)
+            left_names = {entry.material_name for entry in entries_left}
+            placed = [entry for entry in entries if entry.material_name not in left_names]
+            entries = entries_left
+            base_name = get_atlas_name(type_name, output_dir)
+
+            atlas_paths = build_atlas_images(placed, width, height, padding, output_dir, base_name)
+            atlas_material, assigned = create_atlas_material(base_name, type_name, atlas_paths)
+            if assigned.problems:
+                # Remapping onto an atlas material missing some of its images would lose those textures
+                for slot_problems in assigned.problems.values():
+                    result.problems.extend(slot_problems)
+                result.problems.append(
+                    f"Atlas '{base_name}' not used for {', '.join(entry.material_name for entry in placed)}"
+                )
+                bpy.data.materials.remove(atlas_material)
+                continue
+            result.materials.append(atlas_material.name)
+            for entry in placed:
+                placements[entry.material_name] = (atlas_material.name, np.array([
+                    entry.width / width, entry.height / height, entry.x / width, entry.y / height
+                ], dtype=np.float32))
+
+    for mesh in meshes:
+        if remap_mesh(mesh, placements):
+            result.meshes += 1
+
+    LOGGER.info(f"Combined {len(placements)} materials into {len(result.materials)} atlases across {result.meshes} meshes")
+    return result
@@ -0,0 +1,221 @@
+import bpy
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
+from ..constants import MaterialConstants
+from .graph import build_adjacency
+from .jobs import run_steps
+from .node_groups import GROUP_NODE_TYPE, PROTOTYPE_PREFIX
+from .template import Template, TextureSlot
+
+LOGGER = logging.getLogger(__name__)
+
+STATUS_CONFORMING = 'CONFORMING'
+STATUS_REPAIRABLE = 'REPAIRABLE'
+STATUS_FOREIGN = 'FOREIGN'
+
+OUTPUT_NODE_TYPE = "ShaderNodeOutputMaterial"
+IMAGE_NODE_TYPE = "ShaderNodeTexImage"
+# Nodes which only organise the node editor
+LAYOUT_NODE_TYPES = {"NodeFrame", "NodeReroute"}
+
+# Results of matching a slot against a node tree
+SLOT_PRESENT = 'PRESENT'
+SLOT_MISSING = 'MISSING'
+SLOT_MISMATCH = 'MISMATCH'
+
+
+@dataclass
+class AuditResult():
+    material_name: str
+    status: str
+    material_type: str = ''
+    node_count: int = 0
+    extra_nodes: int = 0
+    missing_required: List[str] = field(default_factory=list)
+    missing_optional: List[str] = field(default_factory=list)
+    issues: List[str] = field(default_factory=list)
+
+
+def get_material_type_name(template: Template, material_name: str) -> str:
+    """ Classify a material name by the type suffixes of the template """
+    for name, mat_type in template.material_config.material_types.items():
+        if name != MaterialConstants.DEFAULT_TYPE and material_name.endswith(mat_type.suffix):
+            return name
+    return MaterialConstants.DEFAULT_TYPE
+
+
+def find_output_node(node_tree: bpy.types.NodeTree) -> Optional[str]:
+    """ Find the name of the active material output node """
+    outputs = [node for node in node_tree.nodes if node.bl_idname == OUTPUT_NODE_TYPE]
+    for node in outputs:
+        if node.is_active_output:
+            return node.name
+    return outputs[0].name if outputs else None
+
+
+def match_connection(adjacency: Dict, node_types: Dict[str, str], node_trees: Dict[str, str],
+                     shader_name: str, connection: List[List[str]]) -> Tuple[str, List[str]]:
+    """
+    Matches a template connection chain against the node tree, walking upstream from the shader input.
+
+    Args:
+        adjacency (Dict): The upstream adjacency map of the node tree.
+        node_types (Dict[str, str]): The node types keyed by node name.
+        node_trees (Dict[str, str]): The node group names of group nodes keyed by node name.
+        shader_name (str): The name of the shader node.
+        connection (List[List[str]]): The connection chain from the template.
+
+    Returns:
+        Tuple[str, List[str]]: The match result and the names of the matched nodes.
+    """
+    current = shader_name
+    matched = []
+    for output_attr, input_attr in reversed(connection):
+        input_socket = input_attr.split(".")[1]
+        output_type, output_socket = output_attr.split(".")
+
+        upstream = adjacency.get(current, {}).get(input_socket)
+        if not upstream:
+            return (SLOT_MISSING if current == shader_name else SLOT_MISMATCH), matched
+        from_node, from_socket = upstream[0]
+
+        # Chains built from a node group prototype skip straight from the group to the image node
+        if node_types[from_node] == GROUP_NODE_TYPE and node_trees.get(from_node, "").startswith(PROTOTYPE_PREFIX + "_"):
+            image_socket = connection[0][0].split(".")[1]
+            image_upstream = adjacency.get(from_node, {}).get(image_socket)
+            if image_upstream and node_types[image_upstream[0][0]] == IMAGE_NODE_TYPE:
+                return SLOT_PRESENT, matched + [from_node, image_upstream[0][0]]
+            return SLOT_MISMATCH, matched
+
+        if node_types[from_node] != output_type or from_socket != output_socket:
+            return SLOT_MISMATCH, matched
+        matched.append(from_node)
+        current = from_node
+
+    return SLOT_PRESENT, matched
+
+
+def match_slot(adjacency: Dict, node_types: Dict[str, str], node_trees: Dict[str, str],
+               shader_name: str, slot: TextureSlot) -> Tuple[str, List[str]]:
+    """ Matches every connection of the slot, the slot is only present if all of them are """
+    results = set()
+    matched = []
+    for connection in slot.connections:
+        result, nodes = match_connection(adjacency, node_types, node_trees, shader_name, connection)
+        results.add(result)
+        matched.extend(nodes)
+
+    if SLOT_MISMATCH in results:
+        return SLOT_MISMATCH, matched
+    if results == {SLOT_PRESENT}:
+        return SLOT_PRESENT, matched
+    # Missing and partially connected slots can both be completed from the template
+    return SLOT_MISSING, matched
+
+
+def audit_material(mat: bpy.types.Material, template: Template) -> AuditResult:
+    """
+    Classifies the material's node tree against the template as conforming, repairable or foreign.
+
+    Args:
+        mat (bpy.types.Material): The material to audit.
+        template (Template): The template to audit against.
+
+    Returns:
+        AuditResult: The classification and the issues found.
+    """
+    result = AuditResult(material_name=mat.name, status=STATUS_FOREIGN)
+    node_tree = mat.node_tree
+    if not mat.use_nodes or not node_tree:
+        result.issues.append("Material does not use nodes")
+        return result
+
+    result.material_type = get_material_type_name(template, mat.name)
+    result.node_count = len(node_tree.nodes)
+
+    node_types = {node.name: node.bl_idname for node in node_tree.nodes}
+    node_trees = {
+        node.name: node.node_tree.name for node in node_tree.nodes
+        if node.bl_idname == GROUP_NODE_TYPE and node.node_tree
+    }
+    adjacency = build_adjacency(node_tree)
+
+    output_name = find_output_node(node_tree)
+    surface = adjacency.get(output_name, {}).get("Surface") if output_name else None
+    if not surface:
+        result.issues.append("No shader connected to the material output")
+        return result
+    shader_name = surface[0][0]
+
+    material_type = template.material_config.material_types[result.material_type]
+    used_nodes = {output_name, shader_name}
+    foreign = False
+    for slots, missing in ((material_type.required_texture_slots, result.missing_required),
+                           (material_type.optional_texture_slots, result.missing_optional)):
+        for slot in slots:
+            slot_result, matched = match_slot(adjacency, node_types, node_trees, shader_name, slot)
+            used_nodes.update(matched)
+            if slot_result == SLOT_MISSING:
+                missing.append(slot.slot_name)
+            elif slot_result == SLOT_MISMATCH:
+                foreign = True
+                result.issues.append(f"Slot '{slot.slot_name}' is connected through nodes the template does not describe")
+
+    result.extra_nodes = sum(
+        1 for name, node_type in node_types.items() if name not in used_nodes and node_type not in LAYOUT_NODE_TYPES
+    )
+
+    if foreign:
+        result.status = STATUS_FOREIGN
+    elif result.missing_required or result.missing_optional or result.extra_nodes:
+        result.status = STATUS_REPAIRABLE
+    else:
+        result.status = STATUS_CONFORMING
+    return result
+
+
+def iter_audit_materials(material_names: List[str], template: Template) -> Generator[float, None, List[AuditResult]]:
+    """
+    Audits many materials against the template, as a job yielding after each material.
+    Nothing is changed until the job finishes, so cancelling needs no rollback.
+
+    Args:
+        material_names (List[str]): The names of the materials to audit.
+        template (Template): The template to audit against.
+
+    Yields:
+        float: The progress of the audit.
+
+    Returns:
+        List[AuditResult]: The results, in the order of the materials which still exist.
+    """
+    results = []
+    for index, name in enumerate(material_names):
+        # Materials are looked up by name after every yield, as they can be removed while the job runs
+        mat = bpy.data.materials.get(name)
+        if mat:
+            results.append(audit_material(mat, template))
+        yield (index + 1) / len(material_names)
+
+    LOGGER.info(
+        f"Audited {len(results)} materials: "
+        f"{sum(result.status == STATUS_CONFORMING for result in results)} conforming, "
+        f"{sum(result.status == STATUS_REPAIRABLE for result in results)} repairable, "
+        f"{sum(result.status == STATUS_FOREIGN for result in results)} foreign"
+    )
+    return results
+
+
+def audit_materials(materials: Iterable[bpy.types.Material], template: Template) -> List[AuditResult]:
+    """
+    Audits many materials against the template right away.
+
+    Args:
+        materials (Iterable[bpy.types.Material]): The materials to audit.
+        template (Template): The template to audit against.
+
+    Returns:
+        List[AuditResult]: The results, in the order of the materials.
+    """
+    return run_steps(iter_audit_materials([mat.name for mat in materials], template))
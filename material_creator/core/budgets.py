@@ -0,0 +1,221 @@
+import os
+import bpy
+import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from . import image_hash, image_scan, material
+from .packing import read_image_pixels, write_image
+from .utilities import get_cache_dir, load_image
+
+LOGGER = logging.getLogger(__name__)
+
+DOWNSAMPLE_CACHE_DIR = "downsampled"
+FILTER_TYPES = ('BOX', 'LANCZOS')
+LANCZOS_LOBES = 3
+
+
+@dataclass
+class BudgetViolation():
+    material_name: str
+    node_name: str
+    slot_name: str
+    path: str
+    width: int
+    height: int
+    budget: int
+    is_float: bool = False
+
+    @property
+    def target_size(self) -> Tuple[int, int]:
+        """ The largest size within the budget which keeps the aspect ratio """
+        scale = self.budget / max(self.width, self.height)
+        return max(1, round(self.width * scale)), max(1, round(self.height * scale))
+
+
+def get_resample_taps(source_size: int, target_size: int, filter_type: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the source indices and weights contributing to each target pixel along one axis.
+
+    Args:
+        source_size (int): The number of source pixels.
+        target_size (int): The number of target pixels.
+        filter_type (str): Either 'BOX' or 'LANCZOS'.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The (target_size, taps) indices and normalized weights.
+    """
+    scale = source_size / target_size
+    support = 0.5 * scale if filter_type == 'BOX' else LANCZOS_LOBES * max(scale, 1.0)
+    centers = (np.arange(target_size) + 0.5) * scale
+
+    first = np.floor(centers - support).astype(np.int64)
+    taps = int(np.ceil(2 * support)) + 2
+    indices = first[:, None] + np.arange(taps)[None, :]
+    positions = indices + 0.5
+
+    if filter_type == 'BOX':
+        # The overlap of each source pixel with the footprint of the target pixel
+        weights = np.minimum(positions + 0.5, centers[:, None] + support) - \
+            np.maximum(positions - 0.5, centers[:, None] - support)
+        weights = np.clip(weights, 0.0, None)
+    else:
+        distance = (positions - centers[:, None]) / max(scale, 1.0)
+        weights = np.sinc(distance) * np.sinc(distance / LANCZOS_LOBES) * (np.abs(distance) < LANCZOS_LOBES)
+
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.clip(indices, 0, source_size - 1), weights.astype(np.float32)
+
+
+def resample_axis(pixels: np.ndarray, target_size: int, filter_type: str, axis: int) -> np.ndarray:
+    """ Resamples the pixels along one axis, one vectorized pass per filter tap """
+    pixels = np.moveaxis(pixels, axis, 0)
+    indices, weights = get_resample_taps(pixels.shape[0], target_size, filter_type)
+    weight_shape = (-1,) + (1,) * (pixels.ndim - 1)
+
+    resampled = np.zeros((target_size,) + pixels.shape[1:], dtype=np.float32)
+    for tap in range(indices.shape[1]):
+        resampled += weights[:, tap].reshape(weight_shape) * pixels[indices[:, tap]]
+    return np.moveaxis(resampled, 0, axis)
+
+
+def resize_pixels(pixels: np.ndarray, width: int, height: int, filter_type: str = 'LANCZOS',
+                  clamp: bool = True) -> np.ndarray:
+    """
+    Resizes a (height, width, channels) array with a separable filter.
+
+    Args:
+        pixels (np.ndarray): The pixels to resize.
+        width (int): The target width.
+        height (int): The target height.
+        filter_type (str): Either 'BOX' or 'LANCZOS'.
+        clamp (bool): Clamp the values to [0, 1], removing the ringing of the Lanczos filter.
+
+    Returns:
+        np.ndarray: The resized pixels.
+    """
+    resized = resample_axis(pixels, height, filter_type, axis=0)
+    resized = resample_axis(resized, width, filter_type, axis=1)
+    return np.clip(resized, 0.0, 1.0 if clamp else None)
+
+
+def to_rgba(pixels: np.ndarray) -> np.ndarray:
+    """ Expand grayscale, grayscale alpha or RGB pixels to RGBA """
+    channels = pixels.shape[2]
+    if channels == 4:
+        return pixels
+    if channels == 2:
+        return pixels[:, :, [0, 0, 0, 1]]
+
+    rgba = np.ones(pixels.shape[:2] + (4,), dtype=np.float32)
+    rgba[:, :, :3] = pixels[:, :, [0, 0, 0]] if channels == 1 else pixels
+    return rgba
+
+
+def find_budget_violations(materials: Iterable[bpy.types.Material]) -> List[BudgetViolation]:
+    """
+    Finds the texture images larger than the budget of their material type and slot.
+
+    Image sizes are read from the file headers, so no image is loaded.
+
+    Args:
+        materials (Iterable[bpy.types.Material]): The materials to check.
+
+    Returns:
+        List[BudgetViolation]: The images over budget.
+    """
+    template = material.get_template()
+    candidates = []
+    for mat in materials:
+        properties = material.get_material_properties(mat)
+        material_type = template.material_config.material_types[material.get_material_type(properties)]
+        for slot in material.get_texture_slots(properties, optional=True):
+            budget = image_scan.get_slot_budget(material_type, slot)
+            if not budget:
+                continue
+            texture_nodes = material.get_texture_nodes(properties, slot.slot_name)
+            if isinstance(texture_nodes, ValueError):
+                continue
+            for node in texture_nodes:
+                if node.image and node.image.source == 'FILE':
+                    candidates.append((mat.name, node.name, slot.slot_name, bpy.path.abspath(node.image.filepath), budget))
+
+    image_infos = image_scan.scan_images(candidate[3] for candidate in candidates)
+    violations = []
+    for material_name, node_name, slot_name, path, budget in candidates:
+        info = image_infos[path]
+        if info.is_valid and max(info.width, info.height) > budget:
+            violations.append(BudgetViolation(
+                material_name, node_name, slot_name, path, info.width, info.height, budget, info.is_float
+            ))
+    return violations
+
+
+def get_downsampled_path(digest: str, size: Tuple[int, int], filter_type: str, is_float: bool) -> str:
+    """ Get the cache path of a downsampled copy, keyed by the source content hash """
+    extension = "exr" if is_float else "png"
+    file_name = f"{digest}_{size[0]}x{size[1]}_{filter_type.lower()}.{extension}"
+    return os.path.join(get_cache_dir(DOWNSAMPLE_CACHE_DIR), file_name)
+
+
+def enforce_budgets(materials: Iterable[bpy.types.Material], filter_type: str = 'LANCZOS',
+                    max_workers: Optional[int] = None) -> int:
+    """
+    Rewires the texture nodes with images over budget to downsampled copies.
+
+    Pixels are read and written on the main thread, while the resampling of several images runs on a thread pool.
+    Downsampled copies are cached on disk by the content hash of their source, so they are only computed once.
+
+    Args:
+        materials (Iterable[bpy.types.Material]): The materials to enforce the budgets of.
+        filter_type (str): Either 'BOX' or 'LANCZOS'.
+        max_workers (Optional[int]): The number of images resampled at once, defaults to the number of CPUs.
+
+    Returns:
+        int: The number of texture nodes rewired.
+    """
+    violations = find_budget_violations(materials)
+    if not violations:
+        return 0
+
+    digests = image_hash.hash_files(violation.path for violation in violations)
+    targets: Dict[str, Tuple[BudgetViolation, bpy.types.Image]] = {}
+    for violation in violations:
+        if not digests.get(violation.path):
+            LOGGER.warning(f"Unable to read '{violation.path}', skipping it")
+            continue
+        node = bpy.data.materials[violation.material_name].node_tree.nodes[violation.node_name]
+        cache_path = get_downsampled_path(digests[violation.path], violation.target_size, filter_type, violation.is_float)
+        targets.setdefault(cache_path, (violation, node.image))
+
+    pending = [cache_path for cache_path in targets if not os.path.exists(cache_path)]
+    batch_size = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=batch_size) as executor:
+        # Only keep the pixels of one batch of images in memory at a time
+        for start in range(0, len(pending), batch_size):
+            futures = {}
+            for cache_path in pending[start:start + batch_size]:
+                violation, image = targets[cache_path]
+                width, height = violation.target_size
+                pixels = read_image_pixels(image)
+                futures[cache_path] = executor.submit(
+                    resize_pixels, pixels, width, height, filter_type, not violation.is_float
+                )
+            for cache_path, future in futures.items():
+                file_format = 'OPEN_EXR' if cache_path.endswith(".exr") else 'PNG'
+                write_image(to_rgba(future.result()), cache_path, file_format)
+
+    rewired = 0
+    for violation in violations:
+        node = bpy.data.materials[violation.material_name].node_tree.nodes[violation.node_name]
+        if not digests.get(violation.path):
+            continue
+        cache_path = get_downsampled_path(digests[violation.path], violation.target_size, filter_type, violation.is_float)
+        reduced = load_image(cache_path)
+        reduced.colorspace_settings.name = node.image.colorspace_settings.name
+        node.image = reduced
+        rewired += 1
+
+    LOGGER.info(f"Rewired {rewired} texture nodes to downsampled images")
+    return rewired
@@ -0,0 +1,135 @@
+import bpy
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+# Viewport shading modes which compile the shaders of the materials in view
+SHADER_SHADING_TYPES = {'MATERIAL', 'RENDERED'}
+
+
+class BulkEdit():
+    """
+    Collects the materials changed during a bulk edit, so the add-on caches are invalidated and each material
+    is tagged for update once when the edit finishes.
+
+    Blender still sends an RNA update for every property written during the edit, the writes themselves are kept
+    down by utilities.apply_shader_properties, which skips values that are already set.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.materials: Dict[int, bpy.types.Material] = {}
+        self.shading: List[Tuple[bpy.types.View3DShading, str]] = []
+
+    @property
+    def is_active(self) -> bool:
+        return self.depth > 0
+
+    def touch(self, material: Optional[bpy.types.Material]) -> None:
+        """ Record that the material's node tree changed """
+        if material:
+            self.materials[material.session_uid] = material
+
+    def suspend_viewports(self) -> None:
+        """ Switch viewports showing material shaders to solid shading, so half built graphs are not compiled """
+        window_manager = bpy.context.window_manager
+        if not window_manager:
+            return
+        for window in window_manager.windows:
+            for area in window.screen.areas:
+                if area.type != 'VIEW_3D':
+                    continue
+                for space in area.spaces:
+                    if space.type == 'VIEW_3D' and space.shading.type in SHADER_SHADING_TYPES:
+                        self.shading.append((space.shading, space.shading.type))
+                        space.shading.type = 'SOLID'
+
+    def restore_viewports(self) -> None:
+        """ Restore the viewport shading switched off by suspend_viewports """
+        for shading, shading_type in self.shading:
+            try:
+                shading.type = shading_type
+            except ReferenceError:
+                # The area was closed during the edit
+                continue
+        self.shading.clear()
+
+    def flush(self) -> None:
+        """ Send a single update per changed material, and invalidate the add-on caches once """
+        # material_cache imports material, which imports this module
+        from . import material_cache  # pylint: disable=import-outside-toplevel
+
+        for material in self.materials.values():
+            try:
+                material.node_tree.update_tag()
+                material.update_tag()
+            except ReferenceError:
+                # The material was removed during the edit
+                continue
+        material_cache.mark_dirty(set(self.materials))
+        LOGGER.debug(f"Updated {len(self.materials)} materials after a bulk edit")
+        self.materials.clear()
+
+
+# The edit of the code running outside of jobs
+EDIT = BulkEdit()
+# The edit bulk_edit records into, the edit of a job while its steps run
+_ACTIVE = EDIT
+
+
+@contextmanager
+def activate(edit: BulkEdit) -> Iterator[BulkEdit]:
+    """
+    Makes bulk_edit record into the given edit, jobs activate their own edit while their steps run.
+    An edit spanning the yields of a job then only defers the updates of that job, edits made between
+    its steps, like operators run by the user, are flushed right away.
+
+    Args:
+        edit (BulkEdit): The edit to record into.
+
+    Yields:
+        BulkEdit: The edit.
+    """
+    global _ACTIVE
+    previous, _ACTIVE = _ACTIVE, edit
+    try:
+        yield edit
+    finally:
+        _ACTIVE = previous
+
+
+def get_active_edit() -> BulkEdit:
+    """ Get the edit bulk_edit records into """
+    return _ACTIVE
+
+
+@contextmanager
+def bulk_edit(suspend_viewports: bool = False) -> Iterator[BulkEdit]:
+    """
+    Groups node graph edits, so each changed material is tagged for update and invalidated in the add-on caches
+    once at the end. Nested bulk edits are part of the outermost one of the same job, see activate.
+
+    Viewports only redraw between edits when the edit gives control back to Blender, such as jobs yielding to
+    the job timer, so only those should suspend the viewports. Edits which run to completion without yielding,
+    including jobs run with jobs.run_steps, gain nothing from it and would only lose the viewport shading state.
+
+    Args:
+        suspend_viewports (bool): Switch viewports showing material shaders to solid shading during the edit,
+            so half built graphs are not compiled.
+
+    Yields:
+        BulkEdit: The bulk edit, the edited materials are recorded with touch.
+    """
+    edit = _ACTIVE
+    if not edit.is_active and suspend_viewports:
+        edit.suspend_viewports()
+    edit.depth += 1
+    try:
+        yield edit
+    finally:
+        edit.depth -= 1
+        if not edit.is_active:
+            edit.flush()
+            edit.restore_viewports()
@@ -0,0 +1,345 @@
+import os
+import sqlite3
+import logging
+import bpy
+from dataclasses import dataclass, field
+from typing import Any, Dict, Generator, List, Optional, Set, Tuple
+from . import jobs, material
+from .audit import get_material_type_name
+from .library import escape_like
+from .utilities import get_cache_dir, get_preferences, split_directories
+from .workers import run_in_workers
+
+LOGGER = logging.getLogger(__name__)
+
+CATALOG_FILE = "material_catalog.sqlite"
+SCHEMA_VERSION = 1
+# The number of blend files each worker process reads, amortizing the start up of Blender
+FILES_PER_PROCESS = 8
+SEARCH_LIMIT = 50
+# Separates the blend file from the material name in catalog entries, as in the paths Blender shows for library data
+ENTRY_SEPARATOR = os.sep + "Material" + os.sep
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS materials (
+    file TEXT NOT NULL,
+    name TEXT NOT NULL,
+    material_type TEXT NOT NULL,
+    PRIMARY KEY (file, name)
+);
+CREATE TABLE IF NOT EXISTS images (
+    file TEXT NOT NULL,
+    material TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS materials_type ON materials (material_type);
+CREATE INDEX IF NOT EXISTS images_material ON images (file, material);
+"""
+
+
+@dataclass
+class CatalogMaterial():
+    file: str
+    name: str
+    material_type: str
+    images: List[str] = field(default_factory=list)
+
+
+_CONNECTION: Optional[sqlite3.Connection] = None
+# Set once the catalog was refreshed in this session
+_REFRESHED = False
+
+
+def open_catalog(path: str) -> sqlite3.Connection:
+    """
+    Opens a catalog database, dropping the tables of an older schema version.
+
+    Args:
+        path (str): The path of the database file, or ':memory:'.
+
+    Returns:
+        sqlite3.Connection: The connection to the catalog.
+    """
+    connection = sqlite3.connect(path)
+    if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        connection.executescript(
+            "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS materials; "
+            "DROP TABLE IF EXISTS images; DROP TABLE IF EXISTS settings;"
+        )
+        connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def get_connection() -> sqlite3.Connection:
+    """ Get the connection to the catalog, creating it in the addon cache directory on first use """
+    global _CONNECTION
+    if _CONNECTION is None:
+        _CONNECTION = open_catalog(os.path.join(get_cache_dir(), CATALOG_FILE))
+    return _CONNECTION
+
+
+def get_catalog_roots() -> List[str]:
+    """ Get the existing material library directories from the addon preferences """
+    return split_directories(get_preferences().material_library_roots)
+
+
+def find_blend_files(roots: List[str]) -> Dict[str, int]:
+    """
+    Find the blend files below the library directories, on the job thread pool.
+
+    Args:
+        roots (List[str]): The library directories.
+
+    Returns:
+        Dict[str, int]: The modification times of the blend files keyed by path.
+    """
+    files = {}
+    for root in roots:
+        for directory, _directories, file_names in os.walk(root):
+            for file_name in file_names:
+                if file_name.lower().endswith(".blend"):
+                    path = os.path.join(directory, file_name)
+                    try:
+                        files[path] = os.stat(path).st_mtime_ns
+                    except OSError:
+                        continue
+    return files
+
+
+def get_tree_images(node_tree: bpy.types.NodeTree, images: Set[str], visited: Set[str]) -> None:
+    """
+    Collects the absolute paths of the file images of a node tree and the node groups it uses.
+
+    Args:
+        node_tree (bpy.types.NodeTree): The node tree.
+        images (Set[str]): The set the image paths are added to.
+        visited (Set[str]): The node groups already searched, shared groups are only searched once.
+    """
+    for node in node_tree.nodes:
+        image = getattr(node, "image", None)
+        if image and image.source == 'FILE' and image.filepath:
+            # Relative paths are relative to the library file
+            images.add(os.path.normpath(bpy.path.abspath(image.filepath, library=image.library)))
+        elif node.bl_idname == "ShaderNodeGroup" and node.node_tree and node.node_tree.name_full not in visited:
+            visited.add(node.node_tree.name_full)
+            get_tree_images(node.node_tree, images, visited)
+
+
+def list_blend_materials(payloads: List[Dict]) -> List[Dict]:
+    """
+    Lists the materials of blend files and the images they use, this is the function run by the worker processes.
+    Only the materials and the data they use are linked, the rest of each file is not read.
+
+    Args:
+        payloads (List[Dict]): The paths of the blend files.
+
+    Returns:
+        List[Dict]: The materials with their image paths, or the error of each file.
+    """
+    results = []
+    for payload in payloads:
+        path = payload["path"]
+        try:
+            with bpy.data.libraries.load(path, link=True) as (data_from, data_to):
+                data_to.materials = list(data_from.materials)
+
+            materials = []
+            for mat in data_to.materials:
+                if mat is None:
+                    continue
+                images = set()
+                if mat.use_nodes and mat.node_tree:
+                    get_tree_images(mat.node_tree, images, set())
+                materials.append({"name": mat.name, "images": sorted(images)})
+            results.append({"path": path, "materials": materials})
+        except (OSError, RuntimeError) as error:
+            results.append({"path": path, "error": str(error)})
+        # Free the linked data before reading the next file
+        bpy.ops.wm.read_factory_settings(use_empty=True)
+    return results
+
+
+def classify_materials(connection: sqlite3.Connection) -> None:
+    """ Classify every material of the catalog by the suffixes of the active template """
+    template = material.get_template()
+    connection.executemany(
+        "UPDATE materials SET material_type = ? WHERE file = ? AND name = ?",
+        [
+            (get_material_type_name(template, name), file, name)
+            for file, name in connection.execute("SELECT file, name FROM materials").fetchall()
+        ]
+    )
+    connection.execute(
+        "INSERT OR REPLACE INTO settings VALUES ('template_hash', ?)", (material.get_template_hash(),)
+    )
+
+
+def iter_refresh_catalog(roots: List[str], workers: int = 1, force: bool = False) -> Generator[Any, Any, int]:
+    """
+    Updates the catalog to match the blend files of the library directories, as a job.
+    Only the files whose modification time changed are read, by batches of background Blender processes.
+
+    Each batch is committed with its files, so a cancelled refresh keeps the batches already read and rolls back the rest.
+
+    Args:
+        roots (List[str]): The library directories.
+        workers (int): The number of worker processes.
+        force (bool): Read every file again.
+
+    Yields:
+        The progress of the refresh, or the futures of the work on the job thread pool.
+
+    Returns:
+        int: The number of blend files read.
+    """
+    global _REFRESHED
+    connection = get_connection()
+    known = dict(connection.execute("SELECT path, mtime_ns FROM files"))
+    template = material.get_template()
+    read = 0
+
+    try:
+        files = yield jobs.submit(find_blend_files, roots)
+
+        removed = [(path,) for path in known if path not in files]
+        for table, column in (("files", "path"), ("materials", "file"), ("images", "file")):
+            connection.executemany(f"DELETE FROM {table} WHERE {column} = ?", removed)
+        connection.commit()
+
+        stale = [{"path": path} for path, mtime_ns in files.items() if force or known.get(path) != mtime_ns]
+        batch_size = workers * FILES_PER_PROCESS
+        for start in range(0, len(stale), batch_size):
+            results = yield jobs.submit(run_in_workers, "catalog", "list_blend_materials", stale[start:start + batch_size], workers)
+            for result in results:
+                path = result["path"]
+                for table, column in (("materials", "file"), ("images", "file")):
+                    connection.execute(f"DELETE FROM {table} WHERE {column} = ?", (path,))
+                if "error" in result:
+                    LOGGER.error(f"Unable to read the materials of '{path}': {result['error']}")
+                    continue
+                connection.executemany(
+                    "INSERT OR REPLACE INTO materials VALUES (?, ?, ?)",
+                    [(path, entry["name"], get_material_type_name(template, entry["name"])) for entry in result["materials"]]
+                )
+                connection.executemany(
+                    "INSERT INTO images VALUES (?, ?, ?)",
+                    [(path, entry["name"], image) for entry in result["materials"] for image in entry["images"]]
+                )
+                # Files are only recorded once their materials are, so an interrupted refresh reads them again
+                connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (path, files[path]))
+                read += 1
+            connection.commit()
+            yield min(start + batch_size, len(stale)) / len(stale)
+
+        # Materials read with another template, or an earlier version of the template, are classified again
+        current = connection.execute("SELECT value FROM settings WHERE key = 'template_hash'").fetchone()
+        if current is None or current[0] != material.get_template_hash():
+            classify_materials(connection)
+    except BaseException:
+        connection.rollback()
+        raise
+
+    connection.commit()
+    _REFRESHED = True
+    LOGGER.info(f"Read the materials of {read} of {len(stale)} changed blend files")
+    return read
+
+
+def is_refreshed() -> bool:
+    """ Whether the catalog was refreshed in this session """
+    return _REFRESHED
+
+
+def refresh_catalog(force: bool = False) -> int:
+    """
+    Updates the catalog right away, see iter_refresh_catalog.
+
+    Args:
+        force (bool): Read every file again.
+
+    Returns:
+        int: The number of blend files read.
+    """
+    return jobs.run_steps(iter_refresh_catalog(get_catalog_roots(), get_preferences().worker_processes, force))
+
+
+def get_entry(file: str, name: str) -> str:
+    """ Get the catalog entry of a material, e.g. '/library/props.blend/Material/Crate_M' """
+    return file + ENTRY_SEPARATOR + name
+
+
+def parse_entry(entry: str) -> Tuple[str, str]:
+    """ Get the blend file and the material name of a catalog entry """
+    file, _separator, name = entry.rpartition(ENTRY_SEPARATOR)
+    return file, name
+
+
+def search_catalog(text: str, material_type: Optional[str] = None, limit: int = SEARCH_LIMIT,
+                   connection: Optional[sqlite3.Connection] = None) -> List[CatalogMaterial]:
+    """
+    Searches the catalog by material name, listing the names starting with the text before the names containing it.
+
+    Args:
+        text (str): The text to search for, case insensitive.
+        material_type (Optional[str]): Only list the materials of this type.
+        limit (int): The maximum number of results.
+        connection (Optional[sqlite3.Connection]): The catalog to search, defaults to the catalog of the addon.
+
+    Returns:
+        List[CatalogMaterial]: The matching materials, with the images they use.
+    """
+    pattern = escape_like(text.strip())
+    conditions = ["name LIKE ? ESCAPE '\\'"]
+    parameters: List[Any] = [f"%{pattern}%"]
+    if material_type:
+        conditions.append("material_type = ?")
+        parameters.append(material_type)
+
+    connection = connection or get_connection()
+    query = (
+        f"SELECT file, name, material_type FROM materials WHERE {' AND '.join(conditions)} "
+        f"ORDER BY name LIKE ? ESCAPE '\\' DESC, name LIMIT ?"
+    )
+    results = [CatalogMaterial(*row) for row in connection.execute(query, parameters + [f"{pattern}%", limit])]
+    for result in results:
+        result.images = [
+            row[0] for row in
+            connection.execute("SELECT path FROM images WHERE file = ? AND material = ?", (result.file, result.name))
+        ]
+    return results
+
+
+def import_material(file: str, name: str, link: bool = False) -> Optional[bpy.types.Material]:
+    """
+    Links or appends a single material from a blend file, with only the data it uses.
+
+    Args:
+        file (str): The path of the blend file.
+        name (str): The name of the material.
+        link (bool): Link the material instead of appending it.
+
+    Returns:
+        Optional[bpy.types.Material]: The imported material, or None if the file has no material with the name.
+    """
+    with bpy.data.libraries.load(file, link=link) as (data_from, data_to):
+        data_to.materials = [name] if name in data_from.materials else []
+    return data_to.materials[0] if data_to.materials else None
+
+
+def unregister():
+    """
+    Closes the catalog.
+    """
+    global _CONNECTION
+    if _CONNECTION is not None:
+        _CONNECTION.close()
+        _CONNECTION = None
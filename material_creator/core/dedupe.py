@@ -0,0 +1,98 @@
+import re
+import bpy
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List
+from . import image_hash, material
+from .audit import get_material_type_name
+from .graph import hash_material_graph
+
+LOGGER = logging.getLogger(__name__)
+
+# The suffix Blender adds to names which are already taken, e.g. 'Wood.001'
+DUPLICATE_SUFFIX = re.compile(r"\.\d{3,}$")
+
+
+def get_image_content_identity(digests: Dict[str, str]) -> Callable[[bpy.types.Image], str]:
+    """
+    Get a function identifying images by the hash of their file contents, so copies of a file in
+    different directories are treated as the same image.
+
+    Args:
+        digests (Dict[str, str]): The content hashes keyed by absolute file path.
+
+    Returns:
+        Callable[[bpy.types.Image], str]: The image identity function.
+    """
+    def image_identity(image: bpy.types.Image) -> str:
+        if image.source == 'FILE' and image.filepath:
+            digest = digests.get(bpy.path.abspath(image.filepath))
+            if digest:
+                return digest
+        # Packed, generated and unreadable images are only identical to themselves
+        return image.name_full
+    return image_identity
+
+
+def get_material_settings(mat: bpy.types.Material) -> tuple:
+    """
+    The material settings outside of the node tree which change how the material renders in the engine.
+    The type is classified without the numbered suffix of copies, so 'Wood_PBR.001' has the type of 'Wood_PBR'.
+    """
+    return (
+        get_material_type_name(material.get_template(), DUPLICATE_SUFFIX.sub("", mat.name)),
+        mat.blend_method, mat.use_backface_culling, round(mat.alpha_threshold, 5),
+    )
+
+
+def get_survivor_key(mat: bpy.types.Material) -> tuple:
+    """ Prefer keeping the material with the original name over its numbered copies """
+    return bool(DUPLICATE_SUFFIX.search(mat.name)), len(mat.name), mat.name
+
+
+def find_duplicate_materials(materials: Iterable[bpy.types.Material]) -> List[List[bpy.types.Material]]:
+    """
+    Groups materials with identical node graphs, images and settings.
+
+    Args:
+        materials (Iterable[bpy.types.Material]): The materials to compare.
+
+    Returns:
+        List[List[bpy.types.Material]]: The groups of identical materials, the material to keep first.
+    """
+    materials = [mat for mat in materials if mat.use_nodes and mat.node_tree and not mat.library]
+    image_paths = {
+        bpy.path.abspath(node.image.filepath)
+        for mat in materials for node in mat.node_tree.nodes
+        if node.bl_idname == "ShaderNodeTexImage" and node.image and node.image.source == 'FILE'
+    }
+    image_identity = get_image_content_identity(image_hash.hash_files(image_paths))
+
+    groups = defaultdict(list)
+    for mat in materials:
+        digest = hash_material_graph(mat, extra=get_material_settings(mat), image_identity=image_identity)
+        groups[digest].append(mat)
+
+    return [sorted(group, key=get_survivor_key) for group in groups.values() if len(group) > 1]
+
+
+def merge_duplicate_materials(materials: Iterable[bpy.types.Material]) -> int:
+    """
+    Remaps every user of a duplicate material to the material kept from its group, then removes the duplicates.
+
+    Args:
+        materials (Iterable[bpy.types.Material]): The materials to deduplicate.
+
+    Returns:
+        int: The number of materials removed.
+    """
+    duplicates = []
+    for survivor, *copies in find_duplicate_materials(materials):
+        for copy in copies:
+            copy.user_remap(survivor)
+        duplicates.extend(copies)
+        LOGGER.info(f"Merging {', '.join(copy.name for copy in copies)} into '{survivor.name}'")
+
+    if duplicates:
+        bpy.data.batch_remove(ids=duplicates)
+    return len(duplicates)
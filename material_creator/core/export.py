@@ -0,0 +1,217 @@
+import os
+import re
+import bpy
+import json
+import hashlib
+import logging
+from concurrent.futures import Future, wait
+from dataclasses import dataclass
+from typing import Any, Dict, Generator, Iterator, List, Optional
+from . import jobs, material
+from .graph import hash_material_graph
+from .template import Template
+
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.jsonl"
+DESCRIPTOR_DIR = "materials"
+EXPORT_VERSION = 1
+# The number of hex digits of the material name hash appended to the descriptor file names
+NAME_HASH_LENGTH = 8
+TEMP_SUFFIX = ".tmp"
+
+
+@dataclass
+class ExportResult():
+    exported: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+
+def get_descriptor_file_name(material_name: str) -> str:
+    """
+    Get a file system safe descriptor file name for the material, e.g. 'Crate/M' -> 'Crate_M_fd0dd8c7.json'.
+    Replacing the unsafe characters maps several names to the same file, so a hash of the name keeps them apart.
+    """
+    name_hash = hashlib.sha1(material_name.encode("utf-8")).hexdigest()[:NAME_HASH_LENGTH]
+    safe_name = re.sub(r'[^\w\-. ]', '_', material_name)
+    return f"{safe_name}_{name_hash}.json"
+
+
+def get_managed_materials() -> Iterator[bpy.types.Material]:
+    """ Iterate over the node based materials of the file, which the template classifies by their suffix """
+    for mat in bpy.data.materials:
+        if mat.use_nodes and mat.node_tree and not mat.library:
+            yield mat
+
+
+def get_material_descriptor(mat: bpy.types.Material, template: Template) -> Dict:
+    """
+    Describes the material for the engine: its type, the textures of each slot and the shader input values.
+
+    Args:
+        mat (bpy.types.Material): The material to describe.
+        template (Template): The active template.
+
+    Returns:
+        Dict: The material descriptor.
+    """
+    properties = material.get_material_properties(mat)
+    type_name = material.get_material_type(properties)
+    shader_node = material.get_shader_node(properties)
+
+    slots = {}
+    for slot in material.get_texture_slots(properties, optional=True):
+        texture_nodes = material.get_texture_nodes(properties, slot.slot_name)
+        if isinstance(texture_nodes, ValueError):
+            continue
+        images = [node.image for node in texture_nodes if node.image]
+        if images:
+            slots[slot.slot_name] = {
+                "path": bpy.path.abspath(images[0].filepath),
+                "colorspace": images[0].colorspace_settings.name,
+            }
+
+    shader_properties = {}
+    if shader_node:
+        for socket in shader_node.inputs:
+            if socket.is_linked or not hasattr(socket, "default_value"):
+                continue
+            value = socket.default_value
+            shader_properties[socket.name] = value if isinstance(value, (int, float)) else list(value)
+
+    return {
+        "version": EXPORT_VERSION,
+        "name": mat.name,
+        "type": type_name,
+        "suffix": template.material_config.material_types[type_name].suffix,
+        "shader": shader_node.bl_idname if shader_node else None,
+        "slots": slots,
+        "properties": shader_properties,
+    }
+
+
+def read_manifest(path: str) -> Dict[str, Dict]:
+    """ Read the entries of a previous export manifest keyed by material name """
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry["name"]] = entry
+    return entries
+
+
+def write_descriptor(path: str, descriptor: Dict) -> None:
+    """ Write a descriptor file, called from the job thread pool """
+    with open(path, 'w') as f:
+        json.dump(descriptor, f, indent=2)
+
+
+def iter_export_materials(directory: str, force: bool = False,
+                          template: Optional[Template] = None) -> Generator[Any, Any, ExportResult]:
+    """
+    Exports a descriptor per material and a manifest, only writing the materials which changed since the last export.
+    Runs as a job, yielding after each material.
+
+    Descriptors are built on the main thread and written to temporary files by the job thread pool, the manifest
+    entries are written as each material is processed. The temporary files only replace the previous export once
+    every material is processed, so a cancelled or failed export leaves the previous export untouched.
+
+    Args:
+        directory (str): The directory to export to.
+        force (bool): Re-export every material, even if it did not change.
+        template (Optional[Template]): The template to classify the materials with, defaults to the active template.
+
+    Yields:
+        The progress of the export, or the futures of the descriptor writes.
+
+    Returns:
+        ExportResult: The number of exported, unchanged and removed materials.
+    """
+    template = template or material.get_template()
+    # Changing the template can reclassify every material
+    template_version = (material.get_template_name(), os.path.getmtime(material.get_template_path()))
+    descriptor_dir = os.path.join(directory, DESCRIPTOR_DIR)
+    os.makedirs(descriptor_dir, exist_ok=True)
+
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    previous_entries = read_manifest(manifest_path)
+    result = ExportResult()
+    # Materials are looked up by name after every yield, as they can be removed while the job runs
+    material_names = [mat.name for mat in get_managed_materials()]
+    written: List[str] = []
+    writes: List[Future] = []
+    renamed: List[str] = []
+
+    temp_manifest_path = manifest_path + TEMP_SUFFIX
+    try:
+        with open(temp_manifest_path, 'w') as manifest:
+            for index, name in enumerate(material_names):
+                mat = bpy.data.materials.get(name)
+                if not mat or not mat.node_tree:
+                    continue
+                material_hash = hash_material_graph(mat, extra=(template_version, EXPORT_VERSION, mat.name))
+                file_name = get_descriptor_file_name(mat.name)
+                descriptor_path = os.path.join(descriptor_dir, file_name)
+
+                previous = previous_entries.pop(mat.name, None)
+                if previous and previous["file"] != file_name:
+                    # Exported with an earlier file name, the descriptor is removed with those of removed materials
+                    renamed.append(previous["file"])
+                if not force and previous and previous["hash"] == material_hash and os.path.exists(descriptor_path):
+                    result.unchanged += 1
+                else:
+                    written.append(descriptor_path)
+                    writes.append(jobs.submit(write_descriptor, descriptor_path + TEMP_SUFFIX,
+                                              get_material_descriptor(mat, template)))
+                    result.exported += 1
+
+                manifest.write(json.dumps({"name": mat.name, "file": file_name, "hash": material_hash}) + "\n")
+                yield (index + 1) / len(material_names)
+
+        for future in writes:
+            yield future
+    except BaseException:
+        # Roll back, the writes still running must finish before their files can be removed
+        wait(writes)
+        for path in [path + TEMP_SUFFIX for path in written] + [temp_manifest_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    for path in written:
+        os.replace(path + TEMP_SUFFIX, path)
+
+    # Remove the descriptors of materials which no longer exist
+    for entry in previous_entries.values():
+        descriptor_path = os.path.join(descriptor_dir, entry["file"])
+        if os.path.exists(descriptor_path):
+            os.remove(descriptor_path)
+        result.removed += 1
+    for file_name in renamed:
+        descriptor_path = os.path.join(descriptor_dir, file_name)
+        if os.path.exists(descriptor_path):
+            os.remove(descriptor_path)
+
+    os.replace(temp_manifest_path, manifest_path)
+    LOGGER.info(f"Exported {result.exported} materials, {result.unchanged} unchanged, {result.removed} removed")
+    return result
+
+
+def export_materials(directory: str, force: bool = False, template: Optional[Template] = None) -> ExportResult:
+    """
+    Exports the materials right away, see iter_export_materials.
+
+    Args:
+        directory (str): The directory to export to.
+        force (bool): Re-export every material, even if it did not change.
+        template (Optional[Template]): The template to classify the materials with, defaults to the active template.
+
+    Returns:
+        ExportResult: The number of exported, unchanged and removed materials.
+    """
+    return jobs.run_steps(iter_export_materials(directory, force, template))
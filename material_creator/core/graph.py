@@ -0,0 +1,186 @@
+import os
+import bpy
+import hashlib
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+# Node properties which only affect how the node is drawn in the editor
+IGNORED_NODE_PROPERTIES = {
+    "rna_type", "name", "label", "location", "width", "width_hidden", "height", "dimensions", "parent", "select",
+    "show_options", "show_preview", "show_texture", "hide", "mute", "use_custom_color", "color", "bl_idname",
+    "bl_label", "bl_description", "bl_icon", "bl_static_type", "bl_width_default", "bl_width_min", "bl_width_max",
+    "bl_height_default", "bl_height_min", "bl_height_max", "type", "internal_links", "inputs", "outputs",
+    "image_user", "warning_propagation",
+}
+FLOAT_PRECISION = 5
+
+
+def get_image_path_identity(image: bpy.types.Image) -> str:
+    """ Identify an image by its absolute file path and modification time """
+    path = bpy.path.abspath(image.filepath)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = 0
+    return f"{path}:{mtime}"
+
+
+def get_value_identity(value: Any, image_identity: Callable[[bpy.types.Image], str]) -> Any:
+    """ Convert a property value into a hashable, canonical representation """
+    if isinstance(value, float):
+        return round(value, FLOAT_PRECISION)
+    if isinstance(value, bpy.types.Image):
+        return image_identity(value)
+    if isinstance(value, bpy.types.ID):
+        return value.name_full
+    if isinstance(value, (str, int, bool)) or value is None:
+        return value
+    try:
+        return tuple(get_value_identity(item, image_identity) for item in value)
+    except TypeError:
+        return str(value)
+
+
+def get_node_signature(node: bpy.types.Node, image_identity: Callable[[bpy.types.Image], str]) -> tuple:
+    """
+    Describes a node by its type, its properties and the values of its unlinked inputs, ignoring its name.
+
+    Args:
+        node (bpy.types.Node): The node to describe.
+        image_identity (Callable): Converts an image into the value used to identify it.
+
+    Returns:
+        tuple: The node signature.
+    """
+    properties = []
+    for prop in node.bl_rna.properties:
+        if prop.identifier in IGNORED_NODE_PROPERTIES or prop.type == 'COLLECTION':
+            continue
+        value = getattr(node, prop.identifier, None)
+        if prop.type == 'POINTER' and not isinstance(value, bpy.types.ID):
+            # Nested structs, such as the color mapping of image nodes, are not compared
+            continue
+        properties.append((prop.identifier, get_value_identity(value, image_identity)))
+
+    if node.bl_idname == "ShaderNodeTexImage" and node.image:
+        properties.append(("colorspace", node.image.colorspace_settings.name))
+    elif node.bl_idname == "ShaderNodeGroup" and node.node_tree:
+        properties.append(("group", get_graph_description(node.node_tree, image_identity)))
+
+    inputs = []
+    for socket in node.inputs:
+        if not socket.is_linked and hasattr(socket, "default_value"):
+            inputs.append((socket.identifier, get_value_identity(socket.default_value, image_identity)))
+
+    return (node.bl_idname, tuple(properties), tuple(inputs))
+
+
+def get_graph_description(node_tree: bpy.types.NodeTree,
+                          image_identity: Callable[[bpy.types.Image], str] = get_image_path_identity) -> tuple:
+    """
+    Builds a description of the node tree which does not depend on node names or the order of nodes.
+
+    Args:
+        node_tree (bpy.types.NodeTree): The node tree to describe.
+        image_identity (Callable): Converts an image into the value used to identify it.
+
+    Returns:
+        tuple: The sorted node and link descriptions.
+    """
+    signatures = {node.name: get_node_signature(node, image_identity) for node in node_tree.nodes}
+
+    links = []
+    for link in node_tree.links:
+        if not link.is_valid or link.is_muted:
+            continue
+        links.append((
+            signatures[link.from_node.name], link.from_socket.identifier,
+            signatures[link.to_node.name], link.to_socket.identifier,
+        ))
+
+    nodes: List[tuple] = sorted(signatures.values(), key=repr)
+    return tuple(nodes), tuple(sorted(links, key=repr))
+
+
+def hash_material_graph(material: bpy.types.Material, extra: Optional[tuple] = None,
+                        image_identity: Callable[[bpy.types.Image], str] = get_image_path_identity) -> str:
+    """
+    Computes a canonical hash of the material's node graph and the images it references.
+
+    Args:
+        material (bpy.types.Material): The material to hash.
+        extra (Optional[tuple]): Additional values to include in the hash.
+        image_identity (Callable): Converts an image into the value used to identify it.
+
+    Returns:
+        str: The hex digest.
+    """
+    description = (material.node_tree and get_graph_description(material.node_tree, image_identity), extra)
+    return hashlib.sha1(repr(description).encode("utf-8")).hexdigest()
+
+
+def get_tree_dependencies(node_tree: bpy.types.NodeTree, dependencies: Optional[Set[int]] = None) -> Set[int]:
+    """
+    Get the session uids of the node tree, the node groups it uses and the images of their nodes.
+    Depsgraph updates of any of these IDs can change a material using the node tree.
+
+    Args:
+        node_tree (bpy.types.NodeTree): The node tree.
+        dependencies (Optional[Set[int]]): The set the session uids are added to, used by the recursion.
+
+    Returns:
+        Set[int]: The session uids.
+    """
+    if dependencies is None:
+        dependencies = set()
+    dependencies.add(node_tree.session_uid)
+    for node in node_tree.nodes:
+        image = getattr(node, "image", None)
+        if isinstance(image, bpy.types.Image):
+            dependencies.add(image.session_uid)
+        elif node.bl_idname == "ShaderNodeGroup" and node.node_tree and node.node_tree.session_uid not in dependencies:
+            get_tree_dependencies(node.node_tree, dependencies)
+    return dependencies
+
+
+def get_updated_materials(depsgraph: bpy.types.Depsgraph, dependencies: Dict[int, Set[int]]) -> Set[int]:
+    """
+    Get the materials changed by a depsgraph update, either directly or through a node tree or image they use.
+
+    Args:
+        depsgraph (bpy.types.Depsgraph): The depsgraph of the update.
+        dependencies (Dict[int, Set[int]]): The tree dependencies of the cached materials, keyed by material session uid.
+
+    Returns:
+        Set[int]: The session uids of the changed materials.
+    """
+    changed = set()
+    updated = set()
+    for update in depsgraph.updates:
+        data = update.id
+        if isinstance(data, bpy.types.Material):
+            changed.add(data.original.session_uid)
+        elif isinstance(data, (bpy.types.NodeTree, bpy.types.Image)):
+            updated.add(data.original.session_uid)
+    if updated:
+        changed.update(key for key, uids in dependencies.items() if not uids.isdisjoint(updated))
+    return changed
+
+
+def build_adjacency(node_tree: bpy.types.NodeTree) -> Dict[str, Dict[str, List[Tuple[str, str]]]]:
+    """
+    Maps every linked input of the node tree to the nodes and sockets linked into it, in a single pass over the links.
+
+    Args:
+        node_tree (bpy.types.NodeTree): The node tree.
+
+    Returns:
+        Dict[str, Dict[str, List[Tuple[str, str]]]]: (from node name, from socket name) pairs keyed by
+        node name and input socket name.
+    """
+    adjacency: Dict[str, Dict[str, List[Tuple[str, str]]]] = {}
+    for link in node_tree.links:
+        if not link.is_valid or link.is_muted:
+            continue
+        inputs = adjacency.setdefault(link.to_node.name, {})
+        inputs.setdefault(link.to_socket.name, []).append((link.from_node.name, link.from_socket.name))
+    return adjacency
@@ -0,0 +1,174 @@
+import os
+import bpy
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+from .utilities import get_cache_dir, load_image
+
+LOGGER = logging.getLogger(__name__)
+
+HASH_CACHE_FILE = "image_hashes.json"
+HASH_PROPERTY = "material_creator_hash"
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> Optional[str]:
+    """
+    Hash the contents of a file, reading it in chunks.
+
+    Args:
+        path (str): The absolute path of the file.
+
+    Returns:
+        Optional[str]: The hex digest, or None if the file could not be read.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    try:
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError as error:
+        LOGGER.warning(f"Unable to hash '{path}': {error}")
+        return None
+    return digest.hexdigest()
+
+
+class HashCache():
+    """ A persistent (mtime, size) -> content hash cache keyed by file path """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, list] = {}
+        self.modified = False
+        try:
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[str]:
+        """ Get the cached hash of the file if it has not changed since it was hashed """
+        entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        return None
+
+    def set(self, path: str, stat: os.stat_result, digest: str) -> None:
+        """ Cache the hash of the file """
+        self.entries[path] = [stat.st_mtime_ns, stat.st_size, digest]
+        self.modified = True
+
+    def save(self) -> None:
+        """ Write the cache to disk if it was modified """
+        if not self.modified:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.path)
+        self.modified = False
+
+
+_HASH_CACHE: Optional[HashCache] = None
+
+
+def get_hash_cache() -> HashCache:
+    """ Get the hash cache, loading it from the addon cache directory on first use """
+    global _HASH_CACHE
+    if _HASH_CACHE is None:
+        _HASH_CACHE = HashCache(os.path.join(get_cache_dir(), HASH_CACHE_FILE))
+    return _HASH_CACHE
+
+
+def hash_files(paths: Iterable[str], max_workers: Optional[int] = None) -> Dict[str, Optional[str]]:
+    """
+    Get the content hashes of many files, hashing the files which changed since they were cached in parallel.
+
+    Args:
+        paths (Iterable[str]): The absolute paths of the files.
+        max_workers (Optional[int]): The number of threads, defaults to the executor default.
+
+    Returns:
+        Dict[str, Optional[str]]: The hex digests keyed by path, None for files which could not be read.
+    """
+    cache = get_hash_cache()
+    digests = {}
+    stats = {}
+    for path in dict.fromkeys(paths):
+        try:
+            stats[path] = os.stat(path)
+        except OSError:
+            digests[path] = None
+            continue
+        digests[path] = cache.get(path, stats[path])
+
+    stale_paths = [path for path, digest in digests.items() if digest is None and path in stats]
+    if stale_paths:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for path, digest in zip(stale_paths, executor.map(hash_file, stale_paths)):
+                digests[path] = digest
+                if digest:
+                    cache.set(path, stats[path], digest)
+        cache.save()
+
+    return digests
+
+
+def get_content_index() -> Dict[str, Dict[str, bpy.types.Image]]:
+    """
+    Get the file images of the current file keyed by content hash and colorspace.
+    Building the index stats every image, so callers loading many images build it once and pass it on.
+
+    Returns:
+        Dict[str, Dict[str, bpy.types.Image]]: The images keyed by colorspace name, keyed by content hash.
+    """
+    images = [image for image in bpy.data.images if image.source == 'FILE' and image.filepath and not image.library]
+    # Unchanged files are only stat'ed, so hashing every image keeps the tags current cheaply
+    digests = hash_files(bpy.path.abspath(image.filepath) for image in images)
+
+    index = {}
+    for image in images:
+        digest = digests.get(bpy.path.abspath(image.filepath))
+        if not digest:
+            continue
+        if image.get(HASH_PROPERTY) != digest:
+            image[HASH_PROPERTY] = digest
+        index.setdefault(digest, {}).setdefault(image.colorspace_settings.name, image)
+    return index
+
+
+def load_image_by_content(path: str, colorspace: Optional[str] = None,
+                          index: Optional[Dict[str, Dict[str, bpy.types.Image]]] = None) -> bpy.types.Image:
+    """
+    Load an image, reusing an existing image with identical file contents and colorspace if there is one.
+
+    Args:
+        path (str): The file path of the image to load.
+        colorspace (Optional[str]): The colorspace the image is used with, None reuses an image in any colorspace.
+            Newly loaded images are given the colorspace.
+        index (Optional[Dict[str, Dict[str, bpy.types.Image]]]): The content index from get_content_index,
+            which newly loaded images are added to. Built for this call when not given.
+
+    Returns:
+        bpy.types.Image: The loaded or reused image.
+    """
+    digest = hash_files([bpy.path.abspath(path)]).get(bpy.path.abspath(path))
+    if digest:
+        if index is None:
+            index = get_content_index()
+        images = index.get(digest, {})
+        image = images.get(colorspace) if colorspace else next(iter(images.values()), None)
+        if image:
+            LOGGER.info(f"Reusing image '{image.name}' with the same contents as '{path}'")
+            return image
+
+    image = load_image(path)
+    if colorspace:
+        image.colorspace_settings.name = colorspace
+    if digest:
+        image[HASH_PROPERTY] = digest
+        if index is not None:
+            index.setdefault(digest, {}).setdefault(image.colorspace_settings.name, image)
+    return image
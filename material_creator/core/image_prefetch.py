@@ -0,0 +1,144 @@
+import bpy
+import time
+import logging
+from collections import OrderedDict
+from typing import Iterable, List
+
+LOGGER = logging.getLogger(__name__)
+
+IMAGE_NODE_TYPE = "ShaderNodeTexImage"
+# Seconds of main thread time a single prefetch tick may spend loading images
+TICK_BUDGET = 0.01
+TICK_INTERVAL = 0.05
+
+
+def get_material_images(material: bpy.types.Material) -> List[bpy.types.Image]:
+    """ Get the images referenced by the image texture nodes of the material """
+    if not material or not material.node_tree:
+        return []
+    return [node.image for node in material.node_tree.nodes if node.bl_idname == IMAGE_NODE_TYPE and node.image]
+
+
+def get_image_memory(image: bpy.types.Image) -> int:
+    """ Estimate the memory in bytes of a loaded image buffer """
+    width, height = image.size
+    bytes_per_channel = 4 if image.is_float else 1
+    return width * height * max(image.channels, 1) * bytes_per_channel
+
+
+class ImagePrefetcher():
+    """
+    Loads image buffers on the main thread in small time slices, keeping the loaded images within a memory budget.
+
+    Images are requested in priority order and evicted least recently requested first. The requested images count
+    towards the budget too, once they fill it the rest of the queue is not loaded.
+    """
+
+    def __init__(self):
+        self.queue: List[str] = []
+        self.loaded: "OrderedDict[str, int]" = OrderedDict()
+        self.pinned = set()
+        self.budget = 0
+        # Timers are identified by the function object, so keep a single bound method
+        self.timer = self.tick
+
+    def request(self, images: Iterable[bpy.types.Image], budget_mb: int) -> None:
+        """
+        Replaces the prefetch queue with the given images.
+
+        Args:
+            images (Iterable[bpy.types.Image]): The images to load, most important first.
+            budget_mb (int): The memory budget of the prefetched images in megabytes.
+        """
+        self.budget = budget_mb * 1024 * 1024
+        self.queue = list(dict.fromkeys(image.name for image in images))
+        self.pinned = set(self.queue)
+
+        for name in self.queue:
+            if name in self.loaded:
+                self.loaded.move_to_end(name)
+
+        if self.queue and not bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.register(self.timer, first_interval=TICK_INTERVAL)
+
+    def tick(self):
+        """ Load queued images until the tick budget is spent """
+        start = time.perf_counter()
+        while self.queue and time.perf_counter() - start < TICK_BUDGET:
+            image = bpy.data.images.get(self.queue.pop(0))
+            if not image or image.source != 'FILE':
+                continue
+
+            was_loaded = image.has_data
+            if not was_loaded:
+                try:
+                    image.update()
+                except RuntimeError as error:
+                    LOGGER.warning(f"Unable to prefetch image '{image.name}': {error}")
+                    continue
+
+            self.loaded[image.name] = get_image_memory(image)
+            self.loaded.move_to_end(image.name)
+            if not self.evict():
+                # The queue is in priority order, so the images after this one are not loaded either
+                LOGGER.debug(f"Prefetch budget filled by the requested images, stopping at '{image.name}'")
+                if not was_loaded:
+                    self.free(image.name)
+                self.queue.clear()
+
+        return TICK_INTERVAL if self.queue else None
+
+    def free(self, name: str) -> None:
+        """ Free the buffer of a prefetched image """
+        self.loaded.pop(name, None)
+        image = bpy.data.images.get(name)
+        if image and image.has_data:
+            image.buffers_free()
+
+    def evict(self) -> bool:
+        """
+        Free the least recently requested image buffers until the loaded images fit the budget.
+
+        Returns:
+            bool: Whether the loaded images fit the budget, requested images are never evicted.
+        """
+        used = sum(self.loaded.values())
+        for name in list(self.loaded):
+            if used <= self.budget:
+                break
+            if name in self.pinned:
+                continue
+
+            used -= self.loaded[name]
+            self.free(name)
+        return used <= self.budget
+
+    def stop(self) -> None:
+        """ Stop prefetching """
+        self.queue.clear()
+        if bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.unregister(self.timer)
+
+
+PREFETCHER = ImagePrefetcher()
+
+
+def prefetch_material_neighbours(material_index: int, neighbours: int, budget_mb: int) -> None:
+    """
+    Prefetches the images of the material at the given index and its neighbours in the material list.
+
+    Args:
+        material_index (int): The index of the selected material in the scene's materials.
+        neighbours (int): The number of materials before and after the selected material to prefetch.
+        budget_mb (int): The memory budget of the prefetched images in megabytes.
+    """
+    materials = bpy.data.materials
+    indices = [material_index]
+    for offset in range(1, neighbours + 1):
+        indices.extend([material_index + offset, material_index - offset])
+
+    images = []
+    for index in indices:
+        if 0 <= index < len(materials):
+            images.extend(get_material_images(materials[index]))
+    PREFETCHER.request(images, budget_mb)
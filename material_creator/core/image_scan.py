@@ -0,0 +1,322 @@
+import os
+import struct
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterable, List, Optional
+from .template import MaterialType, TextureSlot
+
+LOGGER = logging.getLogger(__name__)
+
+IMAGE_NODE_TYPE = "ShaderNodeTexImage"
+COLORSPACE_PROPERTY = "image.colorspace_settings.name"
+DEFAULT_COLORSPACE = "sRGB"
+FLOAT_COLORSPACE = "Linear Rec.709"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SIGNATURE = b"\xff\xd8"
+EXR_SIGNATURE = b"\x76\x2f\x31\x01"
+TGA_EXTENSIONS = (".tga", ".targa")
+
+# PNG color type -> channel count
+PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+# JPEG start of frame markers, excluding DHT (C4), JPG (C8) and DAC (CC)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# EXR pixel type -> bits per channel
+EXR_BIT_DEPTHS = {0: 32, 1: 16, 2: 32}
+# TGA image types which store grayscale pixels
+TGA_GRAYSCALE_TYPES = (3, 11)
+
+
+@dataclass
+class ImageInfo():
+    path: str
+    format: Optional[str] = None
+    width: int = 0
+    height: int = 0
+    channels: int = 0
+    bit_depth: int = 0
+    is_float: bool = False
+    mtime: float = 0.0
+    size: int = 0
+    problems: List[str] = field(default_factory=list)
+    # Problems which do not keep the image from being assigned, like exceeding the slot budget
+    warnings: List[str] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        """ Whether no problems were found with the image """
+        return not self.problems
+
+
+def read_png_header(file: BinaryIO, info: ImageInfo) -> None:
+    """ Read the dimensions, channels and bit depth from the IHDR chunk of a PNG file """
+    file.seek(len(PNG_SIGNATURE))
+    _length, chunk_type = struct.unpack(">I4s", file.read(8))
+    if chunk_type != b"IHDR":
+        raise ValueError("Missing IHDR chunk")
+
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", file.read(10))
+    if color_type not in PNG_CHANNELS:
+        raise ValueError(f"Unknown PNG color type {color_type}")
+
+    info.format = "PNG"
+    info.width, info.height = width, height
+    info.channels = PNG_CHANNELS[color_type]
+    info.bit_depth = bit_depth
+
+    # A transparency chunk before the image data adds an alpha channel
+    file.seek(4 + 3, os.SEEK_CUR)
+    while color_type in (0, 2, 3):
+        chunk_header = file.read(8)
+        if len(chunk_header) < 8:
+            break
+        length, chunk_type = struct.unpack(">I4s", chunk_header)
+        if chunk_type == b"tRNS":
+            info.channels = 4 if color_type == 3 else info.channels + 1
+            break
+        if chunk_type == b"IDAT":
+            break
+        file.seek(length + 4, os.SEEK_CUR)
+
+
+def read_jpeg_header(file: BinaryIO, info: ImageInfo) -> None:
+    """ Walk the JPEG markers until the start of frame segment holding the dimensions """
+    file.seek(len(JPEG_SIGNATURE))
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("Start of frame marker not found")
+
+        # Skip fill bytes
+        while marker[1] == 0xFF:
+            marker = marker[1:] + file.read(1)
+
+        length_bytes = file.read(2)
+        if len(length_bytes) < 2:
+            raise ValueError("Truncated JPEG segment")
+        length = struct.unpack(">H", length_bytes)[0]
+
+        if marker[1] in JPEG_SOF_MARKERS:
+            bit_depth, height, width, channels = struct.unpack(">BHHB", file.read(6))
+            info.format = "JPEG"
+            info.width, info.height = width, height
+            info.channels = channels
+            info.bit_depth = bit_depth
+            return
+
+        file.seek(length - 2, os.SEEK_CUR)
+
+
+def read_tga_header(file: BinaryIO, info: ImageInfo) -> None:
+    """ Read the fixed 18 byte TGA header """
+    header = file.read(18)
+    if len(header) < 18:
+        raise ValueError("Truncated TGA header")
+
+    image_type = header[2]
+    width, height, pixel_depth, descriptor = struct.unpack("<HHBB", header[12:18])
+    if image_type not in (1, 2, 3, 9, 10, 11):
+        raise ValueError(f"Unknown TGA image type {image_type}")
+
+    alpha_bits = descriptor & 0x0F
+    if image_type in TGA_GRAYSCALE_TYPES:
+        channels = 2 if alpha_bits else 1
+    else:
+        channels = 4 if alpha_bits or pixel_depth == 32 else 3
+
+    info.format = "TARGA"
+    info.width, info.height = width, height
+    info.channels = channels
+    info.bit_depth = 8
+
+
+def read_null_terminated(file: BinaryIO) -> bytes:
+    """ Read bytes until the next null byte """
+    data = bytearray()
+    while True:
+        byte = file.read(1)
+        if not byte:
+            raise ValueError("Unexpected end of file")
+        if byte == b"\0":
+            return bytes(data)
+        data += byte
+
+
+def read_exr_header(file: BinaryIO, info: ImageInfo) -> None:
+    """ Read the channel list and data window attributes from an OpenEXR header """
+    file.seek(len(EXR_SIGNATURE) + 4)
+    channels = []
+    data_window = None
+
+    while True:
+        name = read_null_terminated(file)
+        if not name:
+            break
+        attribute_type = read_null_terminated(file)
+        size = struct.unpack("<i", file.read(4))[0]
+        value = file.read(size)
+        if len(value) < size:
+            raise ValueError("Truncated EXR attribute")
+
+        if name == b"channels" and attribute_type == b"chlist":
+            offset = 0
+            while value[offset:offset + 1] not in (b"", b"\0"):
+                end = value.index(b"\0", offset)
+                pixel_type = struct.unpack("<i", value[end + 1:end + 5])[0]
+                channels.append(pixel_type)
+                # name, null, pixel type, pLinear + reserved, x and y sampling
+                offset = end + 1 + 4 + 4 + 8
+        elif name == b"dataWindow" and attribute_type == b"box2i":
+            data_window = struct.unpack("<iiii", value)
+
+    if not channels or not data_window:
+        raise ValueError("Missing EXR channels or data window")
+
+    x_min, y_min, x_max, y_max = data_window
+    info.format = "OPEN_EXR"
+    info.width, info.height = x_max - x_min + 1, y_max - y_min + 1
+    info.channels = len(channels)
+    info.bit_depth = max(EXR_BIT_DEPTHS.get(pixel_type, 32) for pixel_type in channels)
+    info.is_float = True
+
+
+def read_image_header(path: str) -> ImageInfo:
+    """
+    Reads the header of an image file without decoding any pixels.
+
+    Args:
+        path (str): The absolute path of the image file.
+
+    Returns:
+        ImageInfo: The image information, with any problems found while reading it.
+    """
+    info = ImageInfo(path=path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        info.problems.append(f"File not found: {path}")
+        return info
+
+    info.mtime, info.size = stat.st_mtime, stat.st_size
+    if info.size == 0:
+        info.problems.append(f"File is empty: {path}")
+        return info
+
+    try:
+        with open(path, 'rb') as file:
+            signature = file.read(len(PNG_SIGNATURE))
+            file.seek(0)
+            if signature.startswith(PNG_SIGNATURE):
+                read_png_header(file, info)
+            elif signature.startswith(JPEG_SIGNATURE):
+                read_jpeg_header(file, info)
+            elif signature.startswith(EXR_SIGNATURE):
+                read_exr_header(file, info)
+            elif path.lower().endswith(TGA_EXTENSIONS):
+                read_tga_header(file, info)
+            else:
+                # Other formats are left for Blender to read
+                LOGGER.debug(f"Unable to read header of '{path}', format is not supported")
+                return info
+    except (OSError, ValueError, struct.error) as error:
+        info.problems.append(f"Corrupt image '{path}': {error}")
+        return info
+
+    if info.width <= 0 or info.height <= 0:
+        info.problems.append(f"Image '{path}' has invalid dimensions {info.width}x{info.height}")
+
+    return info
+
+
+def scan_images(paths: Iterable[str], max_workers: Optional[int] = None) -> Dict[str, ImageInfo]:
+    """
+    Reads the headers of many image files in parallel.
+
+    Args:
+        paths (Iterable[str]): The absolute paths of the image files.
+        max_workers (Optional[int]): The number of threads, defaults to the executor default.
+
+    Returns:
+        Dict[str, ImageInfo]: The image information keyed by path.
+    """
+    unique_paths = list(dict.fromkeys(paths))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(unique_paths, executor.map(read_image_header, unique_paths)))
+
+
+def get_slot_colorspace(slot: TextureSlot, info: Optional[ImageInfo] = None) -> str:
+    """
+    Get the colorspace an image should use in the given slot.
+
+    Args:
+        slot (TextureSlot): The texture slot the image is assigned to.
+        info (Optional[ImageInfo]): The image information, used when the template does not define a colorspace.
+
+    Returns:
+        str: The colorspace name.
+    """
+    colorspace = slot.properties.get(IMAGE_NODE_TYPE, {}).get(COLORSPACE_PROPERTY)
+    if colorspace:
+        return colorspace
+    if info and info.is_float:
+        return FLOAT_COLORSPACE
+    return DEFAULT_COLORSPACE
+
+
+def get_slot_budget(material_type: MaterialType, slot: TextureSlot) -> Optional[int]:
+    """
+    Get the largest width or height allowed for images in the slot.
+
+    Args:
+        material_type (MaterialType): The material type the slot belongs to.
+        slot (TextureSlot): The texture slot.
+
+    Returns:
+        Optional[int]: The smallest of the slot and type budgets, or None if neither defines one.
+    """
+    budgets = [budget for budget in (material_type.max_resolution, slot.max_resolution) if budget]
+    return min(budgets) if budgets else None
+
+
+def get_slot_problems(info: ImageInfo, slot: TextureSlot) -> List[str]:
+    """
+    Checks the image against the requirements of the slot it is assigned to.
+
+    Args:
+        info (ImageInfo): The image information.
+        slot (TextureSlot): The texture slot the image is assigned to.
+
+    Returns:
+        List[str]: The problems found, including those found while reading the header.
+    """
+    problems = list(info.problems)
+    if problems or not info.format:
+        return problems
+
+    uses_alpha = any(connection[0][0].split(".")[1] == "Alpha" for connection in slot.connections)
+    if uses_alpha and info.channels not in (2, 4):
+        problems.append(f"Image '{info.path}' has no alpha channel required by slot '{slot.slot_name}'")
+
+    return problems
+
+
+def get_slot_warnings(info: ImageInfo, slot: TextureSlot, max_resolution: Optional[int] = None) -> List[str]:
+    """
+    Checks the image against the budget of the slot it is assigned to.
+    Images over the budget are still assigned, as the budgets are enforced by downsampling them.
+
+    Args:
+        info (ImageInfo): The image information.
+        slot (TextureSlot): The texture slot the image is assigned to.
+        max_resolution (Optional[int]): The largest allowed width or height.
+
+    Returns:
+        List[str]: The warnings found.
+    """
+    if info.problems or not info.format or not max_resolution or max(info.width, info.height) <= max_resolution:
+        return []
+    return [
+        f"Image '{info.path}' is {info.width}x{info.height}, slot '{slot.slot_name}' allows at most "
+        f"{max_resolution}, run Enforce Texture Budgets to downsample it"
+    ]
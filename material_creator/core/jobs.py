@@ -0,0 +1,292 @@
+import time
+import logging
+import itertools
+import bpy
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Generator, List, Optional, Set
+from .bulk_edit import BulkEdit, activate, get_active_edit
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds of job work per timer tick, short enough to keep the viewport interactive
+TIME_BUDGET = 0.02
+TIMER_INTERVAL = 0.01
+# The number of finished jobs kept for the panel and the monitor operator to report
+FINISHED_HISTORY = 10
+
+STATUS_QUEUED = 'QUEUED'
+STATUS_RUNNING = 'RUNNING'
+STATUS_FINISHED = 'FINISHED'
+STATUS_CANCELLED = 'CANCELLED'
+STATUS_FAILED = 'FAILED'
+
+_IDS = itertools.count(1)
+
+
+class Job():
+    """
+    A long operation split into steps by a generator, which is resumed on the main thread until its time budget runs out.
+
+    The generator yields a float between 0 and 1 to report its progress, or a Future of work offloaded with submit,
+    in which case it is resumed with the result once the future is done.
+    The value it returns is the result of the job.
+
+    Cancelling closes the generator, raising GeneratorExit at the yield it is paused at,
+    so jobs roll back their changes in except or finally blocks.
+
+    Each job records its bulk edits into its own edit, so a bulk edit spanning its yields does not defer
+    the updates of edits made while it is paused.
+    """
+
+    def __init__(self, name: str, steps: Generator, on_finish: Optional[Callable[[Any], str]] = None,
+                 edit: Optional[BulkEdit] = None):
+        self.id = next(_IDS)
+        self.name = name
+        self.steps = steps
+        self.on_finish = on_finish
+        self.status = STATUS_QUEUED
+        self.progress = 0.0
+        self.message = ''
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiting: Optional[Future] = None
+        self.edit = edit or BulkEdit()
+
+    @property
+    def is_done(self) -> bool:
+        return self.status in (STATUS_FINISHED, STATUS_CANCELLED, STATUS_FAILED)
+
+    @property
+    def is_waiting(self) -> bool:
+        """ The job is waiting for offloaded work which is not done yet """
+        return self.waiting is not None and not self.waiting.done()
+
+    def advance(self) -> None:
+        """ Run the generator until its next yield """
+        self.status = STATUS_RUNNING
+        future, self.waiting = self.waiting, None
+        try:
+            with activate(self.edit):
+                if future is None:
+                    yielded = next(self.steps)
+                elif future.exception():
+                    yielded = self.steps.throw(future.exception())
+                else:
+                    yielded = self.steps.send(future.result())
+        except StopIteration as stop:
+            self.finish(stop.value)
+            return
+        except Exception as error:
+            LOGGER.exception(f"Job '{self.name}' failed")
+            self.error = error
+            self.status = STATUS_FAILED
+            self.message = str(error)
+            return
+
+        if isinstance(yielded, Future):
+            self.waiting = yielded
+        elif yielded is not None:
+            self.progress = min(max(float(yielded), 0.0), 1.0)
+
+    def finish(self, result: Any) -> None:
+        """ Store the result and build the message reported to the user """
+        self.result = result
+        self.progress = 1.0
+        self.status = STATUS_FINISHED
+        try:
+            self.message = self.on_finish(result) if self.on_finish else f"{self.name} finished"
+        except Exception as error:
+            LOGGER.exception(f"Applying the result of job '{self.name}' failed")
+            self.error = error
+            self.status = STATUS_FAILED
+            self.message = str(error)
+
+    def cancel(self) -> None:
+        """ Stop the job and roll back its changes """
+        if self.is_done:
+            return
+        if self.waiting:
+            self.waiting.cancel()
+            self.waiting = None
+        try:
+            with activate(self.edit):
+                self.steps.close()
+        except Exception:
+            LOGGER.exception(f"Rolling back job '{self.name}' failed")
+        self.status = STATUS_CANCELLED
+        self.message = f"{self.name} cancelled"
+
+
+class JobRunner():
+    """
+    Runs the queued jobs one at a time from a timer, so Blender handles events and redraws between the steps.
+    """
+
+    def __init__(self):
+        self.jobs: List[Job] = []
+        self.finished: List[Job] = []
+        self.executor: Optional[ThreadPoolExecutor] = None
+        # The offloaded work which is not done yet, cancelled when the runner stops
+        self.futures: Set[Future] = set()
+        # Set while the monitor operator reports the finished jobs and listens for cancellation
+        self.is_monitored = False
+        # Timers are identified by the function object, so keep a single bound method
+        self.timer = self.tick
+
+    @property
+    def active(self) -> Optional[Job]:
+        return self.jobs[0] if self.jobs else None
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        """ The pool for work which does not touch Blender data, created when it is first used """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(thread_name_prefix="MaterialCreatorJob")
+        return self.executor
+
+    def offload(self, function: Callable, *args) -> Future:
+        """ Run the function on the pool, keeping its future until it is done """
+        future = self.get_executor().submit(function, *args)
+        self.futures.add(future)
+        future.add_done_callback(self.futures.discard)
+        return future
+
+    def submit(self, job: Job) -> Job:
+        """ Queue the job, background sessions have no event loop to run timers so the job runs to completion """
+        self.jobs.append(job)
+        if bpy.app.background:
+            self.run_until_done()
+        elif not bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.register(self.timer, first_interval=TIMER_INTERVAL)
+        return job
+
+    def complete(self, job: Job) -> None:
+        """ Move a done job to the finished jobs """
+        self.jobs.remove(job)
+        self.finished.append(job)
+        del self.finished[:-FINISHED_HISTORY]
+        LOGGER.info(f"Job '{job.name}' {job.status.lower()}: {job.message}")
+
+    def step(self) -> None:
+        """ Advance the active job by one step """
+        job = self.active
+        job.advance()
+        if job.is_done:
+            self.complete(job)
+
+    def tick(self) -> Optional[float]:
+        """ Advance the jobs until the time budget runs out """
+        deadline = time.perf_counter() + TIME_BUDGET
+        while self.jobs and time.perf_counter() < deadline and not self.active.is_waiting:
+            self.step()
+        self.redraw()
+        return TIMER_INTERVAL if self.jobs else None
+
+    def run_until_done(self) -> None:
+        """ Run every queued job to completion, blocking on offloaded work """
+        while self.jobs:
+            if self.active.waiting:
+                wait([self.active.waiting])
+            self.step()
+
+    def cancel(self, job_id: Optional[int] = None) -> None:
+        """
+        Cancel a queued or running job.
+
+        Args:
+            job_id (Optional[int]): The id of the job, defaults to the active job.
+        """
+        for job in list(self.jobs):
+            if job_id is None or job.id == job_id:
+                job.cancel()
+                self.complete(job)
+                break
+        self.redraw()
+
+    def stop(self) -> None:
+        """ Cancel every job, stop the timer and the pool """
+        while self.jobs:
+            self.cancel()
+        if bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.unregister(self.timer)
+        if self.executor:
+            # shutdown only cancels the queued work itself from Python 3.9
+            for future in list(self.futures):
+                future.cancel()
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    @staticmethod
+    def redraw() -> None:
+        """ Redraw the panel showing the job progress """
+        window_manager = bpy.context.window_manager
+        if not window_manager:
+            return
+        for window in window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+
+
+RUNNER = JobRunner()
+
+
+def submit(function: Callable, *args) -> Future:
+    """
+    Offload work which does not touch Blender data, like file scans, hashing and pixel math, to the job thread pool.
+    Work in background Blender processes can be offloaded by submitting workers.run_in_workers.
+
+    Args:
+        function (Callable): The function to call.
+        *args: The arguments of the function.
+
+    Returns:
+        Future: The future of the result, jobs yield it to wait for the result without blocking Blender.
+    """
+    return RUNNER.offload(function, *args)
+
+
+def run_steps(steps: Generator) -> Any:
+    """
+    Run the steps of a job to completion on the calling thread, for callers which need the result right away.
+
+    Args:
+        steps (Generator): The job generator.
+
+    Returns:
+        Any: The value returned by the generator.
+    """
+    # The steps run to completion, so they are part of the bulk edit of the caller
+    job = Job(getattr(steps, "__name__", ""), steps, edit=get_active_edit())
+    while not job.is_done:
+        if job.waiting:
+            wait([job.waiting])
+        job.advance()
+    if job.error:
+        raise job.error
+    return job.result
+
+
+def start_job(name: str, steps: Generator, on_finish: Optional[Callable[[Any], str]] = None) -> Job:
+    """
+    Queue a job and start the operator which reports its result and cancels it on escape.
+
+    Args:
+        name (str): The name shown in the panel.
+        steps (Generator): The job generator.
+        on_finish (Optional[Callable[[Any], str]]): Applies the result of the job on the main thread and returns
+            the message reported to the user.
+
+    Returns:
+        Job: The queued job.
+    """
+    job = RUNNER.submit(Job(name, steps, on_finish))
+    if not job.is_done and not RUNNER.is_monitored and bpy.context.window:
+        bpy.ops.material_creator.monitor_jobs('INVOKE_DEFAULT')
+    return job
+
+
+def unregister():
+    """
+    Cancels the running jobs.
+    """
+    RUNNER.stop()
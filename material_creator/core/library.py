@@ -0,0 +1,278 @@
+import os
+import sqlite3
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Generator, List, Optional, Tuple
+from . import image_scan, jobs
+from .utilities import get_cache_dir, get_preferences, split_directories
+
+LOGGER = logging.getLogger(__name__)
+
+LIBRARY_FILE = "texture_library.sqlite"
+SCHEMA_VERSION = 1
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tga", ".targa", ".exr", ".tif", ".tiff")
+# The number of headers read by each job pool task
+SCAN_BATCH_SIZE = 256
+SEARCH_LIMIT = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS textures (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    stem TEXT NOT NULL,
+    suffix TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    channels INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS textures_directory ON textures (directory);
+CREATE INDEX IF NOT EXISTS textures_suffix ON textures (suffix);
+CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent);
+"""
+
+
+@dataclass
+class LibraryTexture():
+    path: str
+    width: int
+    height: int
+    channels: int
+
+
+@dataclass
+class WalkResult():
+    # Modification time and sub directories of every directory found, keyed by path
+    directories: Dict[str, Tuple[int, List[str]]]
+    # The image files of the directories which changed since the last refresh, as (path, mtime_ns, size)
+    changed: Dict[str, List[Tuple[str, int, int]]]
+
+
+_CONNECTION: Optional[sqlite3.Connection] = None
+# Set once the index was refreshed in this session
+_REFRESHED = False
+
+
+def get_connection() -> sqlite3.Connection:
+    """ Get the connection to the library index, creating the index in the addon cache directory on first use """
+    global _CONNECTION
+    if _CONNECTION is None:
+        _CONNECTION = sqlite3.connect(os.path.join(get_cache_dir(), LIBRARY_FILE))
+        if _CONNECTION.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            _CONNECTION.executescript("DROP TABLE IF EXISTS directories; DROP TABLE IF EXISTS textures;")
+            _CONNECTION.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        _CONNECTION.executescript(SCHEMA)
+    return _CONNECTION
+
+
+def get_library_roots() -> List[str]:
+    """ Get the existing texture library directories from the addon preferences """
+    return split_directories(get_preferences().texture_library_roots)
+
+
+def get_suffix(file_name: str) -> str:
+    """ Get the lower case suffix of a file name, which names its texture slot, e.g. 'Crate_Mask.png' -> 'mask' """
+    return os.path.splitext(os.path.basename(file_name))[0].lower().rsplit("_", 1)[-1]
+
+
+def walk_library(roots: List[str], known: Dict[str, Tuple[int, List[str]]], force: bool = False) -> WalkResult:
+    """
+    Walks the library directories, only listing the directories whose modification time changed since they were indexed.
+    Runs on the job thread pool.
+
+    A directory's modification time changes when files are added, removed or renamed in it, so files which are
+    overwritten in place are only picked up by a forced refresh.
+
+    Args:
+        roots (List[str]): The library directories.
+        known (Dict[str, Tuple[int, List[str]]]): The modification time and sub directories of the indexed directories.
+        force (bool): List every directory, even if it did not change.
+
+    Returns:
+        WalkResult: The directories found and the image files of the changed directories.
+    """
+    result = WalkResult(directories={}, changed={})
+    stack = list(roots)
+    while stack:
+        directory = stack.pop()
+        if directory in result.directories:
+            continue
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            continue
+
+        previous = known.get(directory)
+        if not force and previous and previous[0] == mtime_ns:
+            result.directories[directory] = previous
+            stack.extend(previous[1])
+            continue
+
+        children = []
+        files = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        children.append(entry.path)
+                    elif entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                        stat = entry.stat()
+                        files.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        except OSError as error:
+            LOGGER.warning(f"Unable to list '{directory}': {error}")
+            continue
+
+        result.directories[directory] = (mtime_ns, children)
+        result.changed[directory] = files
+        stack.extend(children)
+    return result
+
+
+def read_headers(paths: List[str]) -> List[image_scan.ImageInfo]:
+    """ Read the headers of a batch of images, on the job thread pool """
+    return [image_scan.read_image_header(path) for path in paths]
+
+
+def iter_refresh_library(roots: List[str], force: bool = False) -> Generator[Any, Any, int]:
+    """
+    Updates the library index to match the library directories, as a job.
+    The directories are walked and the headers of new and changed images are read on the job thread pool,
+    while the index is written on the main thread. Cancelling rolls back the index to its previous state.
+
+    Args:
+        roots (List[str]): The library directories.
+        force (bool): Read every directory and image again.
+
+    Yields:
+        The progress of the refresh, or the futures of the work on the job thread pool.
+
+    Returns:
+        int: The number of images indexed.
+    """
+    global _REFRESHED
+    connection = get_connection()
+    children = defaultdict(list)
+    mtimes = {}
+    for path, parent, mtime_ns in connection.execute("SELECT path, parent, mtime_ns FROM directories"):
+        mtimes[path] = mtime_ns
+        children[parent].append(path)
+    known = {path: (mtime_ns, children[path]) for path, mtime_ns in mtimes.items()}
+
+    try:
+        walk = yield jobs.submit(walk_library, roots, known, force)
+
+        # Directories which were removed, or are no longer below a library directory
+        removed = [(path,) for path in known if path not in walk.directories]
+        connection.executemany("DELETE FROM textures WHERE directory = ?", removed)
+        connection.executemany("DELETE FROM directories WHERE path = ?", removed)
+
+        stale = []
+        for directory, files in walk.changed.items():
+            indexed = {
+                path: (mtime_ns, size) for path, mtime_ns, size in
+                connection.execute("SELECT path, mtime_ns, size FROM textures WHERE directory = ?", (directory,))
+            }
+            present = {path for path, _mtime_ns, _size in files}
+            connection.executemany(
+                "DELETE FROM textures WHERE path = ?", [(path,) for path in indexed if path not in present]
+            )
+            stale.extend(file for file in files if indexed.get(file[0]) != file[1:])
+
+        batches = [stale[start:start + SCAN_BATCH_SIZE] for start in range(0, len(stale), SCAN_BATCH_SIZE)]
+        futures = [jobs.submit(read_headers, [path for path, _mtime_ns, _size in batch]) for batch in batches]
+        for index, (batch, future) in enumerate(zip(batches, futures)):
+            infos = yield future
+            connection.executemany(
+                "INSERT OR REPLACE INTO textures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (path, os.path.dirname(path), os.path.basename(path),
+                     os.path.splitext(os.path.basename(path))[0].lower(), get_suffix(path),
+                     mtime_ns, size, info.width, info.height, info.channels)
+                    for (path, mtime_ns, size), info in zip(batch, infos)
+                ]
+            )
+            yield (index + 1) / len(batches)
+
+        # Directories are only recorded once their files are indexed, so an interrupted refresh lists them again
+        connection.executemany(
+            "INSERT OR REPLACE INTO directories VALUES (?, ?, ?)",
+            [(path, os.path.dirname(path) if path not in roots else None, walk.directories[path][0])
+             for path in walk.changed]
+        )
+    except BaseException:
+        connection.rollback()
+        raise
+
+    connection.commit()
+    _REFRESHED = True
+    LOGGER.info(f"Indexed {len(stale)} library images in {len(walk.changed)} changed directories")
+    return len(stale)
+
+
+def is_refreshed() -> bool:
+    """ Whether the index was refreshed in this session """
+    return _REFRESHED
+
+
+def refresh_library(force: bool = False) -> int:
+    """
+    Updates the library index right away, see iter_refresh_library.
+
+    Args:
+        force (bool): Read every directory and image again.
+
+    Returns:
+        int: The number of images indexed.
+    """
+    return jobs.run_steps(iter_refresh_library(get_library_roots(), force))
+
+
+def escape_like(text: str) -> str:
+    """ Escape the wildcards of a LIKE pattern """
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_textures(text: str, slot_name: Optional[str] = None, limit: int = SEARCH_LIMIT) -> List[LibraryTexture]:
+    """
+    Searches the library index by file name, listing the names starting with the text before the names containing it.
+
+    Args:
+        text (str): The text to search for, case insensitive.
+        slot_name (Optional[str]): Only list the images whose file name suffix names this slot.
+        limit (int): The maximum number of results.
+
+    Returns:
+        List[LibraryTexture]: The matching images.
+    """
+    pattern = escape_like(text.strip())
+    conditions = ["name LIKE ? ESCAPE '\\'"]
+    parameters: List[Any] = [f"%{pattern}%"]
+    if slot_name:
+        # The suffix column is indexed, the stem check matches slot names which contain underscores
+        conditions.append("suffix = ? AND stem LIKE ? ESCAPE '\\'")
+        parameters.extend([get_suffix(slot_name), f"%\\_{escape_like(slot_name.lower())}"])
+
+    query = (
+        f"SELECT path, width, height, channels FROM textures WHERE {' AND '.join(conditions)} "
+        f"ORDER BY name LIKE ? ESCAPE '\\' DESC, name LIMIT ?"
+    )
+    rows = get_connection().execute(query, parameters + [f"{pattern}%", limit])
+    return [LibraryTexture(*row) for row in rows]
+
+
+def unregister():
+    """
+    Closes the library index.
+    """
+    global _CONNECTION
+    if _CONNECTION is not None:
+        _CONNECTION.close()
+        _CONNECTION = None
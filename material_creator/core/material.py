@@ -1,22 +1,80 @@
 import os
+import hashlib
 from .template import Template, TextureSlot
 import bpy
 import logging
-from typing import List, Optional, Any
-from .utilities import apply_shader_properties, find_node, load_image, get_material_index, find_all_nodes, join_relative_path, delete_node_recursive
-from ..constants import ToolInfo, MaterialConstants
+from dataclasses import dataclass, field, replace
+from types import SimpleNamespace
+from typing import Dict, Generator, List, Optional, Any, Tuple
+from . import image_hash, image_prefetch, image_scan, node_groups
+from .bulk_edit import bulk_edit
+from .jobs import run_steps
+from .watcher import WATCHER
+from .utilities import apply_shader_properties, find_node, load_image, get_material_index, find_all_nodes, join_relative_path, delete_node_recursive, get_preferences
+from ..constants import MaterialConstants
 
 LOGGER = logging.getLogger(__name__)
 
 
-def get_template():
-    """ Get the template from the addon preferences """
-    addon = bpy.context.preferences.addons.get(ToolInfo.NAME.value)
-    template_name = addon.preferences.template_path
+@dataclass
+class TextureMapResult():
+    # The problems of the texture maps which were not assigned, keyed by slot name
+    problems: Dict[str, List[str]] = field(default_factory=dict)
+    # The warnings of the texture maps which were assigned, keyed by slot name
+    warnings: Dict[str, List[str]] = field(default_factory=dict)
+
+
+def get_template_name() -> str:
+    """ Get the template file name from the addon preferences """
+    return get_preferences().template_path
 
+
+def get_template_path() -> str:
+    """ Get the path of the template selected in the addon preferences """
     template_dir = os.path.dirname(join_relative_path(MaterialConstants.DEFAULT_TEMPLATE_PATH))
-    template_path = os.path.join(template_dir, template_name)
-    return Template.from_json(template_path)
+    return os.path.join(template_dir, get_template_name())
+
+
+# Loaded templates keyed by path, with the modification time they were loaded at and the hash of the file
+_TEMPLATE_CACHE: Dict[str, Tuple[float, Template, str]] = {}
+
+
+def get_template_entry() -> Tuple[float, Template, str]:
+    """ Get the cached template entry, reloading the template only when the file changed """
+    template_path = get_template_path()
+    mtime = os.path.getmtime(template_path)
+
+    cached = _TEMPLATE_CACHE.get(template_path)
+    if not cached or cached[0] != mtime:
+        with open(template_path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        cached = (mtime, Template.from_json(template_path), digest)
+        _TEMPLATE_CACHE[template_path] = cached
+    return cached
+
+
+def get_template():
+    """ Get the template from the addon preferences, reloading it only when the file changed """
+    return get_template_entry()[1]
+
+
+def get_template_hash() -> str:
+    """ Get the hash of the template file's contents, which changes whenever the template is edited """
+    return get_template_entry()[2]
+
+
+def get_material_properties(material: bpy.types.Material) -> SimpleNamespace:
+    """
+    Builds material properties for any material, so it can be passed to the functions which
+    otherwise work on the material selected in the panel.
+
+    Args:
+        material (bpy.types.Material): The material.
+
+    Returns:
+        SimpleNamespace: The material properties.
+    """
+    return SimpleNamespace(source_material=material, node_tree=material.node_tree, material_type='')
 
 
 def get_material_type(properties) -> str:
@@ -86,6 +144,15 @@ def create_texture_node(properties, slot: Any) -> None:
     Args:
         slot (Any): The texture slot for which a texture node will be created.
     """
+    if get_preferences().use_node_group_prototypes:
+        prototype = node_groups.get_prototype(get_template_name(), get_material_type(properties), slot)
+        if prototype:
+            shader_node = get_shader_node(properties)
+            if not shader_node:
+                LOGGER.error("Failed to create texture node: Shader node not found.")
+                return
+            return node_groups.create_prototype_instance(properties.node_tree, shader_node, slot, prototype)
+
     new_inputs = []
 
     for connection in slot.connections:
@@ -149,7 +216,8 @@ def get_texture_slots(properties, optional: bool = False) -> List[Optional['Text
         List[Optional[TextureSlot]]: A list of texture slots, including optional ones if specified.
     """
     material_type = get_template().material_config.material_types[get_material_type(properties)]
-    required_slots = material_type.required_texture_slots
+    # Copy the list, the template is cached and must not be modified
+    required_slots = list(material_type.required_texture_slots)
     optional_slots = material_type.optional_texture_slots if optional else []
 
     if optional_slots:
@@ -170,6 +238,77 @@ def change_material_type(properties, new_type):
     create_material_nodes(properties)
 
 
+def iter_change_materials_type(
+    material_names: List[str], new_type: str, suspend_viewports: bool = True
+) -> Generator[float, None, int]:
+    """
+    Changes the type of many materials in a single bulk edit, so each material is only tagged for update once.
+    Runs as a job yielding after each material, so the viewports are suspended until the job ends.
+
+    Changing the type removes the nodes of the slots the new type does not have, so a copy of each material is
+    kept until the job ends. Cancelling, or an error, swaps the copies back in with the textures they were using.
+
+    Args:
+        material_names (List[str]): The names of the materials to change.
+        new_type (str): The new material type.
+        suspend_viewports (bool): Switch viewports to solid shading while the job runs, only useful when
+            the job yields to the job timer.
+
+    Yields:
+        float: The progress of the change.
+
+    Returns:
+        int: The number of materials changed.
+    """
+    # The changed materials and the copies taken before changing them, as (changed name, original name, copy name)
+    snapshots: List[Tuple[str, str, str]] = []
+    with bulk_edit(suspend_viewports=suspend_viewports):
+        try:
+            for index, name in enumerate(material_names):
+                # Materials are looked up by name after every yield, as they can be removed while the job runs
+                material = bpy.data.materials.get(name)
+                if material and material.use_nodes and material.node_tree and not material.library:
+                    properties = get_material_properties(material)
+                    if get_material_type(properties) != new_type:
+                        snapshot = material.copy()
+                        change_material_type(properties, new_type)
+                        # Changing the type renames the material
+                        snapshots.append((material.name, name, snapshot.name))
+                yield (index + 1) / len(material_names)
+        except BaseException:
+            # Cancelling raises GeneratorExit, a failing change rolls back the materials changed before it
+            for changed_name, original_name, snapshot_name in reversed(snapshots):
+                changed = bpy.data.materials.get(changed_name)
+                snapshot = bpy.data.materials.get(snapshot_name)
+                if changed and snapshot:
+                    changed.user_remap(snapshot)
+                    bpy.data.materials.remove(changed)
+                    snapshot.name = original_name
+            raise
+
+    for _changed_name, _original_name, snapshot_name in snapshots:
+        snapshot = bpy.data.materials.get(snapshot_name)
+        if snapshot:
+            bpy.data.materials.remove(snapshot)
+    return len(snapshots)
+
+
+def change_materials_type(materials: List[bpy.types.Material], new_type: str) -> int:
+    """
+    Changes the type of many materials right away, see iter_change_materials_type.
+    The viewports are not suspended, as they cannot redraw before the change is done.
+
+    Args:
+        materials (List[bpy.types.Material]): The materials to change.
+        new_type (str): The new material type.
+
+    Returns:
+        int: The number of materials changed.
+    """
+    names = [material.name for material in materials]
+    return run_steps(iter_change_materials_type(names, new_type, suspend_viewports=False))
+
+
 def change_material(properties, material) -> str:
     """
     Determines the material type based on the material name suffix.
@@ -188,6 +327,14 @@ def change_material(properties, material) -> str:
     properties.material_type = material_type or MaterialConstants.DEFAULT_TYPE
     properties.node_tree = properties.source_material.node_tree
 
+    preferences = get_preferences()
+    if preferences.defer_image_loading:
+        image_prefetch.prefetch_material_neighbours(
+            properties.scene_material_index,
+            preferences.prefetch_neighbours,
+            preferences.prefetch_budget
+        )
+
 
 def create_new_material(properties, material_name: str, type_name: str) -> None:
     """
@@ -206,16 +353,21 @@ def create_material_nodes(properties) -> None:
     """
     Iterates over all texture slots and creates texture nodes for each slot.
     """
-    new_inputs = []
-    for slot in get_texture_slots(properties):
-        new_inputs.extend(create_texture_node(properties, slot))
-    
-    input_node = get_shader_node(properties)
-    
-    # Remove the old links
-    deletable_inputs = [socket for socket in input_node.inputs if socket.is_linked and socket.name not in new_inputs]
-    for socket in deletable_inputs:
-        delete_node_recursive(properties.node_tree, socket.links[0].from_node)
+    with bulk_edit() as edit:
+        edit.touch(properties.source_material)
+        new_inputs = []
+        for slot in get_texture_slots(properties):
+            new_inputs.extend(create_texture_node(properties, slot))
+
+        input_node = get_shader_node(properties)
+
+        # Remove the old links
+        deletable_inputs = [socket for socket in input_node.inputs if socket.is_linked and socket.name not in new_inputs]
+        for socket in deletable_inputs:
+            # Shared nodes (such as prototype group nodes) may already have been removed through another socket
+            if not socket.is_linked:
+                continue
+            delete_node_recursive(properties.node_tree, socket.links[0].from_node)
 
 
 def rename_material(properties, new_name: str) -> None:
@@ -239,9 +391,11 @@ def create_texture_slot(properties, slot_type: str) -> None:
     Args:
         slot_type (str): The type of texture slot to create.
     """
-    for slot in get_texture_slots(properties, optional=True):
-        if slot.slot_name == slot_type:
-            create_texture_node(properties, slot)
+    with bulk_edit() as edit:
+        edit.touch(properties.source_material)
+        for slot in get_texture_slots(properties, optional=True):
+            if slot.slot_name == slot_type:
+                create_texture_node(properties, slot)
 
 
 def get_texture_nodes(properties, slot_name: str) -> Optional[bpy.types.Node]:
@@ -279,13 +433,96 @@ def get_texture_nodes(properties, slot_name: str) -> Optional[bpy.types.Node]:
     return texture_nodes
 
 
-def set_texture_map(properties, slot_name: str, path: str) -> None:
+def validate_texture_maps(properties, texture_maps: Dict[str, str]) -> Dict[str, image_scan.ImageInfo]:
+    """
+    Reads the headers of the given texture maps in parallel and checks them against their slots,
+    without loading any images into Blender.
+
+    Args:
+        texture_maps (Dict[str, str]): The file paths of the texture maps keyed by slot name.
+
+    Returns:
+        Dict[str, ImageInfo]: The image information keyed by slot name, with the problems and warnings found
+        for that slot. Images over the slot budget only get a warning.
+    """
+    slots = {slot.slot_name: slot for slot in get_texture_slots(properties, optional=True)}
+    material_type = get_template().material_config.material_types[get_material_type(properties)]
+    image_infos = image_scan.scan_images(bpy.path.abspath(path) for path in texture_maps.values())
+
+    results = {}
+    for slot_name, path in texture_maps.items():
+        info = image_infos[bpy.path.abspath(path)]
+        slot = slots.get(slot_name)
+        if slot:
+            problems = image_scan.get_slot_problems(info, slot)
+            warnings = image_scan.get_slot_warnings(info, slot, image_scan.get_slot_budget(material_type, slot))
+        else:
+            problems = info.problems + [f"Material has no texture slot '{slot_name}'"]
+            warnings = []
+        results[slot_name] = replace(info, problems=problems, warnings=warnings)
+    return results
+
+
+def set_texture_maps(properties, texture_maps: Dict[str, str]) -> TextureMapResult:
+    """
+    Validates the given texture maps and assigns the valid ones to their slots.
+
+    Args:
+        texture_maps (Dict[str, str]): The file paths of the texture maps keyed by slot name.
+
+    Returns:
+        TextureMapResult: The problems of the texture maps which were not assigned,
+        and the warnings of those which were.
+    """
+    slots = {slot.slot_name: slot for slot in get_texture_slots(properties, optional=True)}
+    content_index = None
+    if get_preferences().deduplicate_images:
+        # Warm the hash cache in parallel before the images are loaded one by one
+        image_hash.hash_files(bpy.path.abspath(path) for path in texture_maps.values())
+        content_index = image_hash.get_content_index()
+
+    result = TextureMapResult()
+    with bulk_edit() as edit:
+        edit.touch(properties.source_material)
+        for slot_name, info in validate_texture_maps(properties, texture_maps).items():
+            if not info.is_valid:
+                result.problems[slot_name] = info.problems
+                continue
+            if info.warnings:
+                result.warnings[slot_name] = info.warnings
+            colorspace = image_scan.get_slot_colorspace(slots[slot_name], info)
+            set_texture_map(
+                properties, slot_name, texture_maps[slot_name], colorspace=colorspace, content_index=content_index
+            )
+
+    for slot_problems in result.problems.values():
+        for problem in slot_problems:
+            LOGGER.error(problem)
+    for slot_warnings in result.warnings.values():
+        for warning in slot_warnings:
+            LOGGER.warning(warning)
+    return result
+
+
+def get_slot_image_colorspace(properties, slot_name: str, colorspace: Optional[str] = None) -> Optional[str]:
+    """ Get the colorspace the images of a slot end up with, the slot properties override the given colorspace """
+    for slot in get_texture_slots(properties, optional=True):
+        if slot.slot_name == slot_name:
+            return slot.properties.get(image_scan.IMAGE_NODE_TYPE, {}).get(image_scan.COLORSPACE_PROPERTY, colorspace)
+    return colorspace
+
+
+def set_texture_map(properties, slot_name: str, path: str, colorspace: Optional[str] = None,
+                    content_index: Optional[Dict] = None) -> None:
     """
     Sets the texture map for the given slot name by loading an image from the specified path.
 
     Args:
         slot_name (str): The name of the texture slot to apply the texture map to.
         path (str): The file path of the image to load.
+        colorspace (Optional[str]): The colorspace to give the image, before the slot properties are applied.
+        content_index (Optional[Dict]): The image content index when deduplicating images, shared by the
+            texture maps assigned together so it is only built once.
     """
     texture_nodes = get_texture_nodes(properties, slot_name)
     if len(texture_nodes) == 0:
@@ -293,8 +530,17 @@ def set_texture_map(properties, slot_name: str, path: str) -> None:
         create_texture_slot(properties, slot_name)
         texture_nodes = get_texture_nodes(properties, slot_name)
 
-    for texture_node in texture_nodes:
+    if get_preferences().deduplicate_images:
+        # Images are only shared with the same colorspace, as the slot properties change the colorspace of the image
+        image = image_hash.load_image_by_content(
+            path, get_slot_image_colorspace(properties, slot_name, colorspace), content_index
+        )
+    else:
         image = load_image(path)
+        if colorspace:
+            image.colorspace_settings.name = colorspace
+
+    for texture_node in texture_nodes:
         apply_shader_properties(texture_node, {"image": image})
 
         for slot in get_texture_slots(properties, optional=True):
@@ -303,7 +549,9 @@ def set_texture_map(properties, slot_name: str, path: str) -> None:
                 if props:
                     apply_shader_properties(texture_node, props)
 
-        create_texture_preview(properties, slot_name, texture_node)
+        # Creating the preview loads the image pixels, the panel creates it on demand when deferring
+        if not get_preferences().defer_image_loading:
+            create_texture_preview(properties, slot_name, texture_node)
 
 
 def create_texture_preview(properties, slot_name: str, texture_node=None) -> None:
@@ -320,14 +568,21 @@ def create_texture_preview(properties, slot_name: str, texture_node=None) -> Non
             LOGGER.info(f"No texture node found for slot '{slot_name}', creating a new one.")
             create_texture_slot(properties, slot_name)
             texture_nodes = get_texture_nodes(properties, slot_name)
-    
+
+    # material_cache imports this module
+    from . import material_cache  # pylint: disable=import-outside-toplevel
+
     texture_node = texture_node or texture_nodes[0]
     texture = bpy.data.textures.get(slot_name)
     if not texture:
         texture = bpy.data.textures.new(slot_name, type="IMAGE")
     texture.image = texture_node.image
+    # Preview textures are shared by the slots with the same name, so every panel state may show a stale image
+    material_cache.mark_previews_dirty()
+    # While the texture watcher runs, only files changed since the image was last reloaded are read again
+    if WATCHER.needs_reload(texture.image):
+        texture.image.reload()
     texture.image.update()
-    texture.image.reload()
 
 
 def assign_to_selection(properties) -> None:
@@ -0,0 +1,327 @@
+import bpy
+import json
+import hashlib
+import logging
+from bpy.app.handlers import persistent
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from . import material
+from .export import get_managed_materials
+from .graph import get_tree_dependencies, get_updated_materials
+from .template import TextureSlot
+
+LOGGER = logging.getLogger(__name__)
+
+# Owner of the message bus subscriptions, so they can be cleared together
+MSGBUS_OWNER = object()
+
+# The ID property holding the persisted state of a material, and the version of its layout
+RECORD_PROPERTY = "material_creator_record"
+RECORD_VERSION = 2
+
+
+@dataclass
+class MaterialState():
+    material_type: str
+    suffix: str
+    slots: List[TextureSlot]
+    texture_nodes: Dict[str, List[str]] = field(default_factory=dict)
+    packed_slots: Set[str] = field(default_factory=set)
+    # The state was read from, or written to, the material's record
+    is_persisted: bool = False
+    # Session uids of the node tree and the node groups and images it uses, see graph.get_tree_dependencies
+    dependencies: Set[int] = field(default_factory=set)
+    # The preview texture of each slot and whether it shows the image of the slot's texture node
+    previews: Dict[str, Tuple[Optional[bpy.types.Texture], bool]] = field(default_factory=dict)
+
+    def get_texture_node(self, node_tree: bpy.types.NodeTree, slot_name: str) -> Optional[bpy.types.Node]:
+        """
+        Get the first texture node of the slot that still exists in the node tree.
+
+        Args:
+            node_tree (bpy.types.NodeTree): The node tree of the material.
+            slot_name (str): The name of the texture slot.
+
+        Returns:
+            Optional[bpy.types.Node]: The texture node, or None if the slot has none.
+        """
+        for node_name in self.texture_nodes.get(slot_name, []):
+            node = node_tree.nodes.get(node_name)
+            if node:
+                return node
+        return None
+
+    def get_preview(self, slot_name: str, texture_node: bpy.types.Node) -> Tuple[Optional[bpy.types.Texture], bool]:
+        """
+        Get the preview texture of the slot, which is shared by the slots with the same name in every material.
+
+        Args:
+            slot_name (str): The name of the texture slot.
+            texture_node (bpy.types.Node): The texture node of the slot.
+
+        Returns:
+            Tuple[Optional[bpy.types.Texture], bool]: The texture, or None if it does not exist yet,
+            and whether it shows the image of the texture node.
+        """
+        preview = self.previews.get(slot_name)
+        if preview is None:
+            texture = bpy.data.textures.get(slot_name)
+            preview = self.previews[slot_name] = (texture, bool(texture) and texture.image == texture_node.image)
+        return preview
+
+
+_STATES: Dict[int, MaterialState] = {}
+# Session uids of the materials edited since the file was loaded, their records are not trusted, as
+# relinking nodes keeps the node and link counts the record key checks
+_EDITED: Set[int] = set()
+
+
+def get_tree_fingerprint(node_tree: bpy.types.NodeTree) -> Dict:
+    """
+    Get the node and link counts and the node names of the node tree, which the texture nodes of a state are
+    derived from. Only the names are read, the links and sockets are never walked.
+    """
+    names = "\0".join(sorted(node.name for node in node_tree.nodes))
+    return {
+        "nodes": len(node_tree.nodes),
+        "links": len(node_tree.links),
+        "names": hashlib.sha1(names.encode("utf-8")).hexdigest(),
+    }
+
+
+def get_record_key(mat: bpy.types.Material) -> Dict:
+    """ The values a record was written for, it is only trusted while all of them still match """
+    return {
+        "version": RECORD_VERSION,
+        "template": material.get_template_name(),
+        "template_hash": material.get_template_hash(),
+        "material": mat.name,
+        "fingerprint": get_tree_fingerprint(mat.node_tree),
+    }
+
+
+def read_record(mat: bpy.types.Material) -> Optional[MaterialState]:
+    """
+    Read the persisted state of the material.
+
+    The record holds the material type and slots derived from the template, so a trusted record costs a pass
+    over the node names instead of the texture node search through the links of every slot.
+    The template hash and the material name in the key keep the derived type and slots valid.
+
+    Args:
+        mat (bpy.types.Material): The material.
+
+    Returns:
+        Optional[MaterialState]: The state, or None if the material has no record or it is out of date.
+    """
+    raw = mat.get(RECORD_PROPERTY)
+    if not isinstance(raw, str) or not mat.node_tree:
+        return None
+    try:
+        record = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or record.get("key") != get_record_key(mat):
+        return None
+
+    material_type = material.get_template().material_config.material_types.get(record.get("material_type"))
+    if material_type is None:
+        return None
+    slots = {
+        slot.slot_name: slot
+        for slot in material_type.required_texture_slots + material_type.optional_texture_slots
+    }
+    slot_names = record.get("slots", [])
+    if any(slot_name not in slots for slot_name in slot_names):
+        return None
+    return MaterialState(
+        material_type=record["material_type"],
+        suffix=material_type.suffix,
+        slots=[slots[slot_name] for slot_name in slot_names],
+        texture_nodes={slot_name: list(names) for slot_name, names in record.get("texture_nodes", {}).items()},
+        packed_slots=set(record.get("packed_slots", [])),
+        is_persisted=True
+    )
+
+
+def write_record(mat: bpy.types.Material, state: MaterialState) -> None:
+    """
+    Persist the state of the material as a JSON ID property, which is saved with the file.
+
+    Args:
+        mat (bpy.types.Material): The material.
+        state (MaterialState): The current state of the material.
+    """
+    mat[RECORD_PROPERTY] = json.dumps({
+        "key": get_record_key(mat),
+        "material_type": state.material_type,
+        "slots": [slot.slot_name for slot in state.slots],
+        "texture_nodes": state.texture_nodes,
+        "packed_slots": sorted(state.packed_slots),
+    }, separators=(",", ":"))
+    state.is_persisted = True
+
+
+def build_material_state(properties) -> MaterialState:
+    """ Derive the material type, texture slots and texture nodes of the current material, trusting a valid record """
+    # packing imports numpy, which is only loaded once a material is shown
+    from . import packing  # pylint: disable=import-outside-toplevel
+
+    if properties.node_tree and properties.source_material.session_uid not in _EDITED:
+        state = read_record(properties.source_material)
+        if state:
+            return state
+
+    material_type = material.get_material_type(properties)
+    template = material.get_template()
+    state = MaterialState(
+        material_type=material_type,
+        suffix=template.material_config.material_types[material_type].suffix,
+        slots=material.get_texture_slots(properties, optional=True)
+    )
+
+    for slot in state.slots:
+        if len(packing.get_channel_layout(slot)) > 1:
+            state.packed_slots.add(slot.slot_name)
+
+        texture_nodes = material.get_texture_nodes(properties, slot.slot_name)
+        if isinstance(texture_nodes, ValueError):
+            continue
+        state.texture_nodes[slot.slot_name] = [node.name for node in texture_nodes]
+    return state
+
+
+def get_material_state(properties) -> MaterialState:
+    """
+    Get the cached state of the current material, rebuilding it if the material changed since it was cached.
+
+    Args:
+        properties (MaterialProperties): The material properties.
+
+    Returns:
+        MaterialState: The state of the material.
+    """
+    key = properties.source_material.session_uid
+    state = _STATES.get(key)
+    if state is None:
+        state = build_material_state(properties)
+        if properties.node_tree:
+            state.dependencies = get_tree_dependencies(properties.node_tree)
+        _STATES[key] = state
+    return state
+
+
+def mark_dirty(materials: Optional[Set[int]] = None) -> None:
+    """
+    Mark materials as changed so their state is rebuilt the next time it is needed.
+
+    Args:
+        materials (Optional[Set[int]]): The session uids of the changed materials, or None for all materials.
+    """
+    if materials is None:
+        _STATES.clear()
+        return
+    for key in materials:
+        _STATES.pop(key, None)
+    _EDITED.update(materials)
+
+
+def mark_all_dirty(*args) -> None:
+    """ Mark every material as changed """
+    mark_dirty()
+
+
+def mark_previews_dirty() -> None:
+    """ Forget the preview textures of every material, as they are shared by all materials """
+    for state in _STATES.values():
+        state.previews.clear()
+
+
+@persistent
+def on_depsgraph_update(scene, depsgraph) -> None:
+    """ Mark the materials changed by a depsgraph update """
+    if not _STATES:
+        return
+
+    if any(isinstance(update.id, bpy.types.Texture) for update in depsgraph.updates):
+        mark_previews_dirty()
+    # Node groups and images only change the materials whose node tree uses them
+    changed = get_updated_materials(depsgraph, {key: state.dependencies for key, state in _STATES.items()})
+    if changed:
+        mark_dirty(changed)
+
+
+def subscribe() -> None:
+    """ Subscribe to the properties which change the state of every material """
+    bpy.msgbus.clear_by_owner(MSGBUS_OWNER)
+    for key in ((bpy.types.Material, "name"), (bpy.types.Image, "filepath")):
+        bpy.msgbus.subscribe_rna(key=key, owner=MSGBUS_OWNER, args=(), notify=mark_all_dirty)
+
+
+@persistent
+def on_save_pre(*args) -> None:
+    """
+    Write the records of the managed materials which have none, or an out of date one, so every material
+    starts warm when the file is opened again. ID properties cannot be written while drawing.
+    """
+    written = 0
+    for mat in get_managed_materials():
+        state = _STATES.get(mat.session_uid)
+        if state and state.is_persisted:
+            continue
+        if state is None:
+            if mat.session_uid not in _EDITED and read_record(mat):
+                continue
+            state = build_material_state(material.get_material_properties(mat))
+        write_record(mat, state)
+        written += 1
+    LOGGER.debug(f"Persisted the state of {written} materials")
+
+
+@persistent
+def on_undo_post(*args) -> None:
+    """ Undo reloads the data, so the preview textures held by the states are no longer valid """
+    mark_previews_dirty()
+
+
+@persistent
+def on_load_post(*args) -> None:
+    """ Message bus subscriptions are cleared when a file is loaded, so subscribe again """
+    mark_dirty()
+    # Session uids are only unique within a file
+    _EDITED.clear()
+    subscribe()
+
+
+def register():
+    """
+    Registers the handlers which keep the material states up to date.
+    """
+    subscribe()
+    if on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    if on_load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load_post)
+    if on_save_pre not in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.append(on_save_pre)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if on_undo_post not in handlers:
+            handlers.append(on_undo_post)
+
+
+def unregister():
+    """
+    Unregisters the handlers and clears the cached material states.
+    """
+    bpy.msgbus.clear_by_owner(MSGBUS_OWNER)
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    if on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load_post)
+    if on_save_pre in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.remove(on_save_pre)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if on_undo_post in handlers:
+            handlers.remove(on_undo_post)
+    mark_dirty()
+    _EDITED.clear()
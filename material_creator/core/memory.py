@@ -0,0 +1,324 @@
+import os
+import csv
+import bpy
+import logging
+from bpy.app.handlers import persistent
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from . import image_scan, material, material_cache
+from .export import get_managed_materials
+from .graph import get_tree_dependencies, get_updated_materials
+from .template import MaterialType, TextureSlot
+
+LOGGER = logging.getLogger(__name__)
+
+# A full mip chain adds a third of the size of the top level
+MIP_OVERHEAD = 4 / 3
+MEGABYTE = 1024 * 1024
+
+# Owner of the message bus subscriptions, so they can be cleared together
+MSGBUS_OWNER = object()
+
+
+@dataclass
+class MaterialMemory():
+    material_name: str
+    material_type: str
+    slots: Dict[str, int] = field(default_factory=dict)
+    # The slots with images whose memory could not be estimated, they are left out of the total
+    unknown: List[str] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        """ The estimated memory of every slot image in bytes """
+        return sum(self.slots.values())
+
+
+@dataclass
+class SceneMemory():
+    # The estimates of the managed materials, largest first
+    report: List[MaterialMemory]
+    total: int
+    by_type: Dict[str, int]
+    unknown: int
+    # The number of materials in the file when the report was made, adding or removing materials makes it stale
+    material_count: int
+
+
+# Header information keyed by absolute file path, with the modification time and size it was read at
+_IMAGE_INFOS: Dict[str, Tuple[Tuple[int, int], image_scan.ImageInfo]] = {}
+# Memory estimates keyed by material session uid
+_MATERIALS: Dict[int, MaterialMemory] = {}
+# The tree dependencies of the estimated materials keyed by material session uid, see graph.get_tree_dependencies
+_DEPENDENCIES: Dict[int, Set[int]] = {}
+# The report of the managed materials shown in the panel
+_SCENE: Optional[SceneMemory] = None
+
+
+def get_compression_ratio(material_type: MaterialType, slot: TextureSlot) -> float:
+    """ Get the fraction of the uncompressed size the engine stores the slot in, the slot overrides the type """
+    for ratio in (slot.compression_ratio, material_type.compression_ratio):
+        if ratio:
+            return ratio
+    return 1.0
+
+
+def estimate_image_memory(info: image_scan.ImageInfo, compression_ratio: float = 1.0, mipmaps: bool = True) -> int:
+    """
+    Estimates the GPU memory of an image from its header.
+
+    Args:
+        info (ImageInfo): The header information of the image.
+        compression_ratio (float): The fraction of the uncompressed size the engine stores the image in.
+        mipmaps (bool): Include the memory of the mip chain.
+
+    Returns:
+        int: The estimated memory in bytes.
+    """
+    if not info.is_valid:
+        return 0
+    # GPUs have no three channel formats, so RGB images are stored with an unused fourth channel
+    channels = 4 if info.channels == 3 else info.channels
+    size = info.width * info.height * channels * max(info.bit_depth, 8) / 8
+    if mipmaps:
+        size *= MIP_OVERHEAD
+    return int(size * compression_ratio)
+
+
+def estimate_loaded_image_memory(image: bpy.types.Image, compression_ratio: float = 1.0, mipmaps: bool = True) -> int:
+    """ Estimates the GPU memory of an image Blender already loaded, for formats whose headers are not read """
+    width, height = image.size
+    if not image.channels:
+        return 0
+    channels = 4 if image.channels == 3 else image.channels
+    size = width * height * channels * max(image.depth // image.channels, 8) / 8
+    if mipmaps:
+        size *= MIP_OVERHEAD
+    return int(size * compression_ratio)
+
+
+def get_image_infos(paths: Iterable[str]) -> Dict[str, image_scan.ImageInfo]:
+    """
+    Get the header information of the images, only reading the headers of files which changed since they were read.
+
+    Args:
+        paths (Iterable[str]): The absolute file paths of the images.
+
+    Returns:
+        Dict[str, ImageInfo]: The header information keyed by path.
+    """
+    infos = {}
+    stale = []
+    for path in set(paths):
+        try:
+            stat = os.stat(path)
+            key = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            key = None
+        cached = _IMAGE_INFOS.get(path)
+        if cached and cached[0] == key:
+            infos[path] = cached[1]
+        else:
+            stale.append((path, key))
+
+    scanned = image_scan.scan_images(path for path, _key in stale)
+    for path, key in stale:
+        _IMAGE_INFOS[path] = (key, scanned[path])
+        infos[path] = scanned[path]
+    return infos
+
+
+def get_material_images(mat: bpy.types.Material) -> Dict[str, Dict[str, bpy.types.Image]]:
+    """ Get the file images of each texture slot of the material, keyed by absolute file path """
+    properties = material.get_material_properties(mat)
+    state = material_cache.get_material_state(properties)
+    slot_images = {}
+    for slot in state.slots:
+        images = {}
+        for node_name in state.texture_nodes.get(slot.slot_name, []):
+            node = mat.node_tree.nodes.get(node_name)
+            if node and node.image and node.image.source == 'FILE' and node.image.filepath:
+                images.setdefault(bpy.path.abspath(node.image.filepath), node.image)
+        if images:
+            slot_images[slot.slot_name] = images
+    return slot_images
+
+
+def get_memory_report(materials: Iterable[bpy.types.Material]) -> List[MaterialMemory]:
+    """
+    Estimates the texture memory of the materials, reusing the estimates of materials which did not change.
+    The headers of the images of changed materials are read in parallel. Images in formats whose headers are not
+    read are estimated from Blender when it already loaded them, otherwise their slot is flagged as unknown.
+
+    Args:
+        materials (Iterable[bpy.types.Material]): The materials to estimate.
+
+    Returns:
+        List[MaterialMemory]: The estimates, in the order of the materials.
+    """
+    materials = list(materials)
+    pending = {mat.session_uid: get_material_images(mat) for mat in materials if mat.session_uid not in _MATERIALS}
+    infos = get_image_infos(path for slots in pending.values() for paths in slots.values() for path in paths)
+
+    template = material.get_template()
+    for mat in materials:
+        if mat.session_uid not in pending:
+            continue
+        type_name = material.get_material_type(material.get_material_properties(mat))
+        material_type = template.material_config.material_types[type_name]
+        slots = {slot.slot_name: slot for slot in material_type.required_texture_slots + material_type.optional_texture_slots}
+
+        memory = MaterialMemory(mat.name, type_name)
+        for slot_name, images in pending[mat.session_uid].items():
+            ratio = get_compression_ratio(material_type, slots[slot_name])
+            memory.slots[slot_name] = 0
+            for path, image in images.items():
+                info = infos[path]
+                if info.is_valid and info.format is None:
+                    if not image.has_data:
+                        memory.unknown.append(slot_name)
+                        continue
+                    memory.slots[slot_name] += estimate_loaded_image_memory(image, ratio)
+                else:
+                    memory.slots[slot_name] += estimate_image_memory(info, ratio)
+        _MATERIALS[mat.session_uid] = memory
+        _DEPENDENCIES[mat.session_uid] = get_tree_dependencies(mat.node_tree)
+
+    return [_MATERIALS[mat.session_uid] for mat in materials]
+
+
+def get_material_memory(mat: bpy.types.Material) -> MaterialMemory:
+    """ Get the texture memory estimate of a single material """
+    return get_memory_report([mat])[0]
+
+
+def get_scene_memory() -> SceneMemory:
+    """
+    Get the report of the managed materials, which is kept until a material changes or materials are added or removed.
+
+    Returns:
+        SceneMemory: The estimates of the materials and their totals.
+    """
+    global _SCENE
+    if _SCENE is None or _SCENE.material_count != len(bpy.data.materials):
+        report = sorted(get_memory_report(get_managed_materials()), key=lambda memory: memory.total, reverse=True)
+        _SCENE = SceneMemory(
+            report=report,
+            total=sum(memory.total for memory in report),
+            by_type=aggregate_by_type(report),
+            unknown=sum(1 for memory in report if memory.unknown),
+            material_count=len(bpy.data.materials)
+        )
+    return _SCENE
+
+
+def aggregate_by_type(report: Iterable[MaterialMemory]) -> Dict[str, int]:
+    """ Sum the estimates per material type """
+    totals = defaultdict(int)
+    for memory in report:
+        totals[memory.material_type] += memory.total
+    return dict(totals)
+
+
+def get_over_budget(report: Iterable[MaterialMemory], budget_mb: float) -> List[MaterialMemory]:
+    """ Get the materials over the budget, largest first """
+    return sorted(
+        (memory for memory in report if memory.total > budget_mb * MEGABYTE),
+        key=lambda memory: memory.total, reverse=True
+    )
+
+
+def export_memory_csv(path: str, report: List[MaterialMemory], budget_mb: Optional[float] = None) -> None:
+    """
+    Writes the estimates to a CSV file, with a column per texture slot.
+
+    Args:
+        path (str): The file path of the CSV file.
+        report (List[MaterialMemory]): The estimates to write.
+        budget_mb (Optional[float]): The budget materials are flagged against.
+    """
+    slot_names = sorted({slot_name for memory in report for slot_name in memory.slots})
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["material", "type", "total_mb", "over_budget", "unknown_slots"] +
+            [f"{slot_name}_mb" for slot_name in slot_names]
+        )
+        for memory in sorted(report, key=lambda memory: memory.total, reverse=True):
+            over_budget = budget_mb is not None and memory.total > budget_mb * MEGABYTE
+            writer.writerow(
+                [memory.material_name, memory.material_type, f"{memory.total / MEGABYTE:.2f}", over_budget,
+                 " ".join(sorted(set(memory.unknown)))] +
+                [f"{memory.slots.get(slot_name, 0) / MEGABYTE:.2f}" for slot_name in slot_names]
+            )
+
+
+def mark_dirty(materials: Optional[Iterable[int]] = None) -> None:
+    """
+    Mark material estimates as changed.
+
+    Args:
+        materials (Optional[Iterable[int]]): The session uids of the changed materials, or None for all materials.
+    """
+    global _SCENE
+    _SCENE = None
+    if materials is None:
+        _MATERIALS.clear()
+        _DEPENDENCIES.clear()
+        return
+    for key in materials:
+        _MATERIALS.pop(key, None)
+        _DEPENDENCIES.pop(key, None)
+
+
+def mark_all_dirty(*args) -> None:
+    """ Mark every estimate as changed """
+    mark_dirty()
+
+
+@persistent
+def on_depsgraph_update(scene, depsgraph) -> None:
+    """ Mark the estimates of changed materials, images are checked against their file when estimated again """
+    if not _MATERIALS:
+        return
+    # Node groups and images only change the estimates of the materials whose node tree uses them
+    changed = get_updated_materials(depsgraph, _DEPENDENCIES)
+    if changed:
+        mark_dirty(changed)
+
+
+def subscribe() -> None:
+    """ Estimates hold the material names, so renaming a material marks them as changed """
+    bpy.msgbus.clear_by_owner(MSGBUS_OWNER)
+    bpy.msgbus.subscribe_rna(key=(bpy.types.Material, "name"), owner=MSGBUS_OWNER, args=(), notify=mark_all_dirty)
+
+
+@persistent
+def on_load_post(*args) -> None:
+    """ Session uids are only unique within a file, and message bus subscriptions are cleared by loading it """
+    mark_dirty()
+    subscribe()
+
+
+def register():
+    """
+    Registers the handlers which keep the estimates up to date.
+    """
+    subscribe()
+    if on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    if on_load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load_post)
+
+
+def unregister():
+    """
+    Unregisters the handlers and clears the estimates.
+    """
+    bpy.msgbus.clear_by_owner(MSGBUS_OWNER)
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    if on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load_post)
+    mark_dirty()
@@ -0,0 +1,214 @@
+import os
+import bpy
+import json
+import hashlib
+import logging
+from typing import List, Optional
+from .template import TextureSlot
+from .utilities import apply_shader_properties, find_node
+
+LOGGER = logging.getLogger(__name__)
+
+PROTOTYPE_PREFIX = "MC"
+IMAGE_NODE_TYPE = "ShaderNodeTexImage"
+GROUP_NODE_TYPE = "ShaderNodeGroup"
+SHADER_PLACEHOLDER = "{SHADER}"
+# The number of hex digits of the slot hash in the prototype names
+SLOT_HASH_LENGTH = 8
+
+SOCKET_TYPES = {
+    'RGBA': 'NodeSocketColor',
+    'VALUE': 'NodeSocketFloat',
+    'INT': 'NodeSocketInt',
+    'BOOLEAN': 'NodeSocketBool',
+    'VECTOR': 'NodeSocketVector',
+    'SHADER': 'NodeSocketShader',
+}
+
+
+def get_slot_hash(slot: TextureSlot) -> str:
+    """ Get a short hash of the connections and node properties of the slot, which the prototype is built from """
+    description = json.dumps([slot.connections, slot.properties], sort_keys=True)
+    return hashlib.sha1(description.encode("utf-8")).hexdigest()[:SLOT_HASH_LENGTH]
+
+
+def get_prototype_name(template_name: str, type_name: str, slot: TextureSlot) -> str:
+    """
+    Builds the node group name of the prototype for a template, material type and slot.
+    The name ends with the slot hash, so editing the slot in the template builds a new prototype
+    instead of reusing the group built from the previous connections.
+
+    Args:
+        template_name (str): The template file name.
+        type_name (str): The material type name.
+        slot (TextureSlot): The texture slot.
+
+    Returns:
+        str: The node group name.
+    """
+    return f"{PROTOTYPE_PREFIX}_{os.path.splitext(template_name)[0]}_{type_name}_{slot.slot_name}_{get_slot_hash(slot)}"
+
+
+def is_group_connection(connection: List[List[str]]) -> bool:
+    """ Whether the connection has nodes between the image node and the shader node """
+    return len(connection) > 1
+
+
+def get_socket_type(socket: bpy.types.NodeSocket) -> str:
+    """ Get the interface socket type matching the given node socket """
+    return SOCKET_TYPES.get(socket.type, 'NodeSocketFloat')
+
+
+def ensure_interface_socket(group: bpy.types.NodeTree, name: str, in_out: str, socket_type: str):
+    """
+    Gets the interface socket with the given name, creating it if it does not exist.
+
+    Args:
+        group (bpy.types.NodeTree): The node group to add the socket to.
+        name (str): The socket name.
+        in_out (str): Either 'INPUT' or 'OUTPUT'.
+        socket_type (str): The socket type used when creating the socket.
+    """
+    for item in group.interface.items_tree:
+        if item.item_type == 'SOCKET' and item.in_out == in_out and item.name == name:
+            return item
+    return group.interface.new_socket(name, in_out=in_out, socket_type=socket_type)
+
+
+def build_prototype(name: str, slot: TextureSlot) -> Optional[bpy.types.ShaderNodeTree]:
+    """
+    Compiles the non-image part of the slot connections into a shader node group.
+
+    The group inputs are named after the image node outputs, and the group outputs after the shader inputs.
+    Nodes of the same type at the same depth of the chain are shared between connections.
+
+    Args:
+        name (str): The name of the node group to create.
+        slot (TextureSlot): The texture slot to compile.
+
+    Returns:
+        Optional[bpy.types.ShaderNodeTree]: The node group, or None if the slot connects the image node directly.
+    """
+    connections = [connection for connection in slot.connections if is_group_connection(connection)]
+    if not connections:
+        return None
+
+    group = bpy.data.node_groups.new(name, 'ShaderNodeTree')
+    group_input = group.nodes.new('NodeGroupInput')
+    group_output = group.nodes.new('NodeGroupOutput')
+
+    shared_nodes = {}
+    max_depth = 0
+    for connection in connections:
+        previous_node = group_input
+        for depth, (output_attr, input_attr) in enumerate(connection):
+            output_socket = output_attr.split(".")[1]
+            input_type, input_socket = input_attr.split(".")
+
+            if input_type == SHADER_PLACEHOLDER:
+                source = previous_node.outputs[output_socket]
+                ensure_interface_socket(group, input_socket, 'OUTPUT', get_socket_type(source))
+                group.links.new(source, group_output.inputs[input_socket])
+                break
+
+            node = shared_nodes.get((depth, input_type))
+            if not node:
+                node = group.nodes.new(type=input_type)
+                node.location = (250 * depth, 0)
+                shared_nodes[(depth, input_type)] = node
+
+                properties = slot.properties.get(input_type)
+                if properties:
+                    apply_shader_properties(node, properties)
+
+            target = node.inputs[input_socket]
+            if previous_node is group_input:
+                ensure_interface_socket(group, output_socket, 'INPUT', get_socket_type(target))
+            group.links.new(previous_node.outputs[output_socket], target)
+
+            previous_node = node
+            max_depth = max(max_depth, depth)
+
+    group_input.location = (-250, 0)
+    group_output.location = (250 * (max_depth + 1), 0)
+    LOGGER.info(f"Created node group prototype '{name}'")
+    return group
+
+
+def get_prototype(template_name: str, type_name: str, slot: TextureSlot) -> Optional[bpy.types.ShaderNodeTree]:
+    """
+    Gets the shared node group prototype for the slot, building it on first use.
+
+    Args:
+        template_name (str): The template file name.
+        type_name (str): The material type name.
+        slot (TextureSlot): The texture slot.
+
+    Returns:
+        Optional[bpy.types.ShaderNodeTree]: The node group, or None if the slot has no nodes to group.
+    """
+    name = get_prototype_name(template_name, type_name, slot)
+    prototype = bpy.data.node_groups.get(name)
+    if prototype is None:
+        prototype = build_prototype(name, slot)
+    return prototype
+
+
+def find_prototype_instance(shader_node: bpy.types.Node, prototype: bpy.types.ShaderNodeTree) -> Optional[bpy.types.Node]:
+    """ Find a group node instancing the prototype which is connected to the shader node """
+    for item in prototype.interface.items_tree:
+        if item.item_type != 'SOCKET' or item.in_out != 'OUTPUT':
+            continue
+        shader_input = shader_node.inputs.get(item.name)
+        if shader_input and shader_input.is_linked:
+            linked_node = shader_input.links[0].from_node
+            if linked_node.bl_idname == GROUP_NODE_TYPE and linked_node.node_tree == prototype:
+                return linked_node
+    return None
+
+
+def create_prototype_instance(node_tree: bpy.types.NodeTree, shader_node: bpy.types.Node, slot: TextureSlot,
+                              prototype: bpy.types.ShaderNodeTree) -> List[str]:
+    """
+    Instances the prototype in the node tree and connects it between a texture node and the shader node.
+
+    Args:
+        node_tree (bpy.types.NodeTree): The material node tree.
+        shader_node (bpy.types.Node): The shader node of the material.
+        slot (TextureSlot): The texture slot the prototype was built from.
+        prototype (bpy.types.ShaderNodeTree): The node group prototype.
+
+    Returns:
+        List[str]: The names of the shader inputs connected for this slot.
+    """
+    new_inputs = []
+
+    group_node = find_prototype_instance(shader_node, prototype)
+    if not group_node:
+        group_node = node_tree.nodes.new(type=GROUP_NODE_TYPE)
+        group_node.node_tree = prototype
+
+    image_node = find_node(group_node, IMAGE_NODE_TYPE)
+    if not image_node:
+        image_node = node_tree.nodes.new(type=IMAGE_NODE_TYPE)
+
+    for connection in slot.connections:
+        output_socket = connection[0][0].split(".")[1]
+        shader_socket = connection[-1][1].split(".")[1]
+
+        if is_group_connection(connection):
+            node_tree.links.new(image_node.outputs[output_socket], group_node.inputs[output_socket])
+            node_tree.links.new(group_node.outputs[shader_socket], shader_node.inputs[shader_socket])
+        else:
+            node_tree.links.new(image_node.outputs[output_socket], shader_node.inputs[shader_socket])
+        new_inputs.append(shader_socket)
+
+    image_properties = slot.properties.get(IMAGE_NODE_TYPE)
+    if image_properties:
+        apply_shader_properties(image_node, image_properties)
+
+    shader_properties = slot.properties.get(shader_node.bl_idname)
+    if shader_properties:
+        apply_shader_properties(shader_node, shader_properties)
+
+    return new_inputs
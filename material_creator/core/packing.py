@@ -0,0 +1,214 @@
+import os
+import bpy
+import logging
+import numpy as np
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+from .template import TextureSlot
+from .workers import run_in_workers
+
+LOGGER = logging.getLogger(__name__)
+
+SEPARATE_NODE_TYPE = "ShaderNodeSeparateColor"
+IMAGE_NODE_TYPE = "ShaderNodeTexImage"
+CHANNEL_INDICES = {"Red": 0, "Green": 1, "Blue": 2, "Alpha": 3}
+# Values of the channels which have no source map
+CHANNEL_DEFAULTS = (0.0, 0.0, 0.0, 1.0)
+
+
+@dataclass
+class PackJob():
+    sources: Dict[str, str]
+    output_path: str
+
+
+def get_channel_layout(slot: TextureSlot) -> Dict[str, str]:
+    """
+    Reads which shader input each channel of the slot's image is connected to.
+
+    Args:
+        slot (TextureSlot): The texture slot.
+
+    Returns:
+        Dict[str, str]: The shader input names keyed by channel name, e.g. {'Red': 'Roughness'}.
+    """
+    layout = {}
+    for connection in slot.connections:
+        shader_input = connection[-1][1].split(".")[1]
+        for output_attr, _input_attr in connection:
+            node_type, output_socket = output_attr.split(".")
+            if node_type == SEPARATE_NODE_TYPE and output_socket in CHANNEL_INDICES:
+                layout[output_socket] = shader_input
+            elif node_type == IMAGE_NODE_TYPE and output_socket == "Alpha":
+                layout["Alpha"] = shader_input
+    return layout
+
+
+def read_image_pixels(image: bpy.types.Image) -> np.ndarray:
+    """
+    Reads the pixels of an image into a (height, width, channels) array.
+
+    Args:
+        image (bpy.types.Image): The image to read.
+
+    Returns:
+        np.ndarray: The pixel values.
+    """
+    width, height = image.size
+    pixels = np.empty(width * height * image.channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, image.channels)
+
+
+def read_image_channel(image: bpy.types.Image, channel: int = 0) -> np.ndarray:
+    """
+    Reads one channel of an image into a (height, width) array.
+
+    Args:
+        image (bpy.types.Image): The image to read.
+        channel (int): The channel index, the first channel is used for grayscale maps.
+
+    Returns:
+        np.ndarray: The channel values.
+    """
+    return read_image_pixels(image)[:, :, min(channel, image.channels - 1)]
+
+
+def pack_arrays(channels: Dict[int, np.ndarray], shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Combines grayscale arrays into the channels of an RGBA array.
+
+    Args:
+        channels (Dict[int, np.ndarray]): The grayscale arrays keyed by channel index.
+        shape (Tuple[int, int]): The height and width of the arrays.
+
+    Returns:
+        np.ndarray: The (height, width, 4) packed array.
+    """
+    packed = np.empty((shape[0], shape[1], 4), dtype=np.float32)
+    packed[...] = CHANNEL_DEFAULTS
+    for index, values in channels.items():
+        packed[:, :, index] = values
+    return packed
+
+
+def write_image(pixels: np.ndarray, output_path: str, file_format: str = 'PNG') -> None:
+    """ Writes an RGBA array to an image file through a temporary image """
+    height, width = pixels.shape[:2]
+    image = bpy.data.images.new(
+        os.path.basename(output_path), width, height, alpha=True,
+        float_buffer=file_format == 'OPEN_EXR', is_data=True
+    )
+    try:
+        image.pixels.foreach_set(pixels.ravel())
+        image.filepath_raw = output_path
+        image.file_format = file_format
+        image.save()
+    finally:
+        bpy.data.images.remove(image)
+
+
+def pack_channels(sources: Dict[str, str], output_path: str) -> str:
+    """
+    Packs grayscale maps into the channels of a single image.
+
+    Args:
+        sources (Dict[str, str]): The file paths of the grayscale maps keyed by channel name, e.g. {'Red': path}.
+        output_path (str): The file path of the packed image.
+
+    Returns:
+        str: The file path of the packed image.
+    """
+    existing_images = set(bpy.data.images)
+    loaded_images = []
+    try:
+        channels = {}
+        shape = None
+        for channel_name, path in sources.items():
+            image = bpy.data.images.load(path, check_existing=True)
+            if image not in existing_images:
+                image.colorspace_settings.name = 'Non-Color'
+                loaded_images.append(image)
+
+            image_shape = (image.size[1], image.size[0])
+            if shape and image_shape != shape:
+                raise ValueError(f"'{path}' is {image_shape[1]}x{image_shape[0]}, expected {shape[1]}x{shape[0]}")
+            shape = image_shape
+            channels[CHANNEL_INDICES[channel_name]] = read_image_channel(image)
+
+        if not shape:
+            raise ValueError("No source maps to pack")
+        write_image(pack_arrays(channels, shape), output_path)
+    finally:
+        for image in loaded_images:
+            bpy.data.images.remove(image)
+
+    LOGGER.info(f"Packed {len(sources)} maps into '{output_path}'")
+    return output_path
+
+
+def pack_jobs(payloads: List[Dict]) -> List[Dict]:
+    """
+    Runs pack jobs one after another, this is the function run by the worker processes.
+
+    Args:
+        payloads (List[Dict]): The pack jobs as dictionaries.
+
+    Returns:
+        List[Dict]: The output path or the error of each job.
+    """
+    results = []
+    for payload in payloads:
+        job = PackJob(**payload)
+        try:
+            results.append({"output_path": pack_channels(job.sources, job.output_path)})
+        except (RuntimeError, ValueError) as error:
+            results.append({"error": str(error)})
+    return results
+
+
+def pack_texture_sets(jobs: List[PackJob], workers: int = 1) -> List[Dict]:
+    """
+    Packs many texture sets, in a pool of background Blender processes when more than one worker is used.
+
+    Args:
+        jobs (List[PackJob]): The texture sets to pack.
+        workers (int): The number of worker processes.
+
+    Returns:
+        List[Dict]: The output path or the error of each job.
+    """
+    payloads = [asdict(job) for job in jobs]
+    if workers <= 1 or len(jobs) <= 1:
+        return pack_jobs(payloads)
+    return run_in_workers("packing", "pack_jobs", payloads, workers)
+
+
+def find_source_maps(directory: str, layout: Dict[str, str]) -> Dict[str, str]:
+    """
+    Finds the grayscale maps of a directory named after the shader inputs of the layout, e.g. 'Crate_Roughness.png'.
+
+    Args:
+        directory (str): The directory to search.
+        layout (Dict[str, str]): The shader input names keyed by channel name.
+
+    Returns:
+        Dict[str, str]: The file paths keyed by channel name.
+    """
+    suffixes = {"_" + shader_input.replace(" ", "").lower(): channel for channel, shader_input in layout.items()}
+    sources = {}
+    for file_name in sorted(os.listdir(directory)):
+        stem = os.path.splitext(file_name)[0].lower()
+        for suffix, channel in suffixes.items():
+            if stem.endswith(suffix) and channel not in sources:
+                sources[channel] = os.path.join(directory, file_name)
+    return sources
+
+
+def get_slot_layout(slots: List[TextureSlot], slot_name: str) -> Optional[Dict[str, str]]:
+    """ Get the channel layout of the named slot, if it packs more than one channel """
+    for slot in slots:
+        if slot.slot_name == slot_name:
+            layout = get_channel_layout(slot)
+            return layout if len(layout) > 1 else None
+    return None
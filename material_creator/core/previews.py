@@ -0,0 +1,297 @@
+import os
+import math
+import shutil
+import tempfile
+import logging
+import bpy
+import bpy.utils.previews
+from bpy.app.handlers import persistent
+from typing import Any, Dict, Generator, List, Optional, Set
+from . import jobs
+from .graph import get_tree_dependencies, get_updated_materials, hash_material_graph
+from .utilities import get_cache_dir
+from .workers import run_in_workers
+
+LOGGER = logging.getLogger(__name__)
+
+PREVIEW_CACHE_DIR = "material_previews"
+# Changing the preview scene or render settings must change the version, so the cached previews are rendered again
+PREVIEW_VERSION = 1
+PREVIEW_SIZE = 128
+PREVIEW_SAMPLES = 16
+# The number of previews each worker process renders, amortizing the start up of Blender
+RENDERS_PER_PROCESS = 16
+
+# Preview hashes keyed by material session uid
+_HASHES: Dict[int, str] = {}
+# The tree dependencies of the hashed materials keyed by material session uid, see graph.get_tree_dependencies
+_DEPENDENCIES: Dict[int, Set[int]] = {}
+# Preview hashes known to have no rendered preview
+_MISSING: Set[str] = set()
+_PREVIEWS: Optional[bpy.utils.previews.ImagePreviewCollection] = None
+
+
+def get_preview_hash(mat: bpy.types.Material) -> str:
+    """ Get the hash identifying the preview of the material, from its node graph and the modification times of its images """
+    key = mat.session_uid
+    if key not in _HASHES:
+        _HASHES[key] = hash_material_graph(mat, extra=(PREVIEW_VERSION, PREVIEW_SIZE, PREVIEW_SAMPLES))
+        if mat.node_tree:
+            _DEPENDENCIES[key] = get_tree_dependencies(mat.node_tree)
+    return _HASHES[key]
+
+
+def get_preview_path(preview_hash: str) -> str:
+    """ Get the path of the cached preview image with the hash """
+    return os.path.join(get_cache_dir(PREVIEW_CACHE_DIR), preview_hash + ".png")
+
+
+def get_material_icon(mat: bpy.types.Material) -> int:
+    """
+    Get the icon of the rendered preview of the material.
+
+    Args:
+        mat (bpy.types.Material): The material.
+
+    Returns:
+        int: The icon id, or 0 if the material has no preview rendered for its current node graph.
+    """
+    global _PREVIEWS
+    if not mat.use_nodes or not mat.node_tree:
+        return 0
+    preview_hash = get_preview_hash(mat)
+    if _PREVIEWS is None:
+        _PREVIEWS = bpy.utils.previews.new()
+    preview = _PREVIEWS.get(preview_hash)
+    if preview is None:
+        if preview_hash in _MISSING:
+            return 0
+        path = get_preview_path(preview_hash)
+        if not os.path.exists(path):
+            _MISSING.add(preview_hash)
+            return 0
+        preview = _PREVIEWS.load(preview_hash, path, 'IMAGE')
+    return preview.icon_id
+
+
+def create_preview_scene(scene: bpy.types.Scene) -> bpy.types.Object:
+    """
+    Replaces the objects of the scene with a sphere, an orthographic camera and a sun, and sets up CPU Cycles.
+
+    Args:
+        scene (bpy.types.Scene): The scene of the worker process.
+
+    Returns:
+        bpy.types.Object: The sphere the materials are previewed on.
+    """
+    import bmesh
+
+    for obj in list(scene.objects):
+        bpy.data.objects.remove(obj)
+
+    mesh = bpy.data.meshes.new("PreviewSphere")
+    bm = bmesh.new()
+    bm.loops.layers.uv.new("UVMap")
+    bmesh.ops.create_uvsphere(bm, u_segments=48, v_segments=24, radius=1.0, calc_uvs=True)
+    bm.to_mesh(mesh)
+    bm.free()
+    mesh.polygons.foreach_set("use_smooth", [True] * len(mesh.polygons))
+    sphere = bpy.data.objects.new("PreviewSphere", mesh)
+    scene.collection.objects.link(sphere)
+
+    camera_data = bpy.data.cameras.new("PreviewCamera")
+    camera_data.type = 'ORTHO'
+    camera_data.ortho_scale = 2.2
+    camera = bpy.data.objects.new("PreviewCamera", camera_data)
+    camera.location = (0.0, -5.0, 0.0)
+    camera.rotation_euler = (math.pi / 2, 0.0, 0.0)
+    scene.collection.objects.link(camera)
+    scene.camera = camera
+
+    sun = bpy.data.objects.new("PreviewSun", bpy.data.lights.new("PreviewSun", 'SUN'))
+    sun.data.energy = 3.0
+    sun.rotation_euler = (math.radians(50), 0.0, math.radians(-30))
+    scene.collection.objects.link(sun)
+
+    world = scene.world or bpy.data.worlds.new("PreviewWorld")
+    scene.world = world
+    world.use_nodes = True
+    world.node_tree.nodes["Background"].inputs["Color"].default_value = (0.2, 0.2, 0.2, 1.0)
+
+    scene.render.engine = 'CYCLES'
+    scene.cycles.device = 'CPU'
+    scene.cycles.use_denoising = True
+    scene.render.resolution_x = scene.render.resolution_y = PREVIEW_SIZE
+    scene.render.resolution_percentage = 100
+    scene.render.film_transparent = True
+    scene.render.image_settings.file_format = 'PNG'
+    scene.render.image_settings.color_mode = 'RGBA'
+    return sphere
+
+
+def render_previews(payloads: List[Dict]) -> List[Dict]:
+    """
+    Renders material previews one after another, this is the function run by the worker processes.
+
+    Args:
+        payloads (List[Dict]): The blend file holding the material, its name and the output path of its preview.
+
+    Returns:
+        List[Dict]: The output path or the error of each preview.
+    """
+    scene = bpy.context.scene
+    sphere = create_preview_scene(scene)
+    results = []
+    for payload in payloads:
+        try:
+            with bpy.data.libraries.load(payload["blend_path"]) as (data_from, data_to):
+                if payload["material"] not in data_from.materials:
+                    raise RuntimeError(f"Material '{payload['material']}' not found in '{payload['blend_path']}'")
+                data_to.materials = [payload["material"]]
+
+            sphere.data.materials.clear()
+            sphere.data.materials.append(data_to.materials[0])
+            scene.cycles.samples = payload["samples"]
+            # Render to a temporary file, so an interrupted render never leaves a partial preview in the cache
+            scene.render.filepath = payload["output_path"] + ".tmp.png"
+            bpy.ops.render.render(write_still=True)
+            os.replace(scene.render.filepath, payload["output_path"])
+            results.append({"output_path": payload["output_path"]})
+        except (OSError, RuntimeError) as error:
+            results.append({"error": str(error)})
+    return results
+
+
+def get_stale_previews(material_names: List[str], force: bool = False) -> Dict[str, bpy.types.Material]:
+    """
+    Get the materials which have no preview for their current node graph.
+
+    Args:
+        material_names (List[str]): The names of the materials.
+        force (bool): Render every preview again.
+
+    Returns:
+        Dict[str, bpy.types.Material]: The material to render each preview from, keyed by the output path.
+        Materials with the same graph share a preview, so only the first of them is rendered.
+    """
+    stale = {}
+    for name in material_names:
+        mat = bpy.data.materials.get(name)
+        if mat and mat.use_nodes and mat.node_tree:
+            output_path = get_preview_path(get_preview_hash(mat))
+            if force or not os.path.exists(output_path):
+                stale.setdefault(output_path, mat)
+    return stale
+
+
+def iter_render_previews(material_names: List[str], workers: int = 1, force: bool = False) -> Generator[Any, Any, int]:
+    """
+    Renders the previews of the materials which have no preview for their current node graph, as a job.
+    The materials are written to a temporary blend file which batches of background Blender processes render from.
+
+    Cancelling removes the temporary blend file, so the running batch stops at its next material.
+    The previews rendered until then stay cached, as they match the materials.
+
+    Args:
+        material_names (List[str]): The names of the materials.
+        workers (int): The number of worker processes.
+        force (bool): Render every preview again.
+
+    Yields:
+        The progress of the job, or the futures of the batches.
+
+    Returns:
+        int: The number of previews rendered.
+    """
+    stale = get_stale_previews(material_names, force)
+    if not stale:
+        return 0
+
+    temp_dir = tempfile.mkdtemp(prefix="material_previews_")
+    rendered = 0
+    try:
+        blend_path = os.path.join(temp_dir, "materials.blend")
+        bpy.data.libraries.write(blend_path, set(stale.values()), path_remap='ABSOLUTE', fake_user=True)
+        payloads = [
+            {"blend_path": blend_path, "material": mat.name, "output_path": output_path, "samples": PREVIEW_SAMPLES}
+            for output_path, mat in stale.items()
+        ]
+
+        batch_size = workers * RENDERS_PER_PROCESS
+        for start in range(0, len(payloads), batch_size):
+            results = yield jobs.submit(run_in_workers, "previews", "render_previews", payloads[start:start + batch_size], workers)
+            for result in results:
+                if "error" in result:
+                    LOGGER.error(f"Unable to render material preview: {result['error']}")
+                else:
+                    rendered += 1
+                    # Icons which were already loaded show the previous render until reloaded
+                    preview_hash = os.path.splitext(os.path.basename(result["output_path"]))[0]
+                    if _PREVIEWS is not None and preview_hash in _PREVIEWS:
+                        _PREVIEWS[preview_hash].reload()
+            _MISSING.clear()
+            yield min(start + batch_size, len(payloads)) / len(payloads)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    LOGGER.info(f"Rendered {rendered} of {len(payloads)} material previews")
+    return rendered
+
+
+def mark_dirty(materials: Optional[Set[int]] = None) -> None:
+    """
+    Mark material preview hashes as changed.
+
+    Args:
+        materials (Optional[Set[int]]): The session uids of the changed materials, or None for all materials.
+    """
+    if materials is None:
+        _HASHES.clear()
+        _DEPENDENCIES.clear()
+        return
+    for key in materials:
+        _HASHES.pop(key, None)
+        _DEPENDENCIES.pop(key, None)
+
+
+@persistent
+def on_depsgraph_update(scene, depsgraph) -> None:
+    """ Mark the preview hashes of changed materials """
+    if not _HASHES:
+        return
+    # Node groups and images only change the hashes of the materials whose node tree uses them
+    changed = get_updated_materials(depsgraph, _DEPENDENCIES)
+    if changed:
+        mark_dirty(changed)
+
+
+@persistent
+def on_load_post(*args) -> None:
+    """ Session uids are only unique within a file """
+    mark_dirty()
+
+
+def register():
+    """
+    Registers the handlers which keep the preview hashes up to date.
+    """
+    if on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    if on_load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load_post)
+
+
+def unregister():
+    """
+    Unregisters the handlers and frees the preview icons.
+    """
+    global _PREVIEWS
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    if on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load_post)
+    if _PREVIEWS is not None:
+        bpy.utils.previews.remove(_PREVIEWS)
+        _PREVIEWS = None
+    mark_dirty()
+    _MISSING.clear()
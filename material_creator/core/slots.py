@@ -0,0 +1,89 @@
+import bpy
+import logging
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Iterable, List, Set
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class CompactionResult():
+    meshes: int = 0
+    removed_slots: int = 0
+    skipped: List[str] = field(default_factory=list)
+
+
+def get_object_linked_meshes() -> Set[int]:
+    """ Get the meshes of objects which override a slot with their own material, which compaction would break """
+    return {
+        obj.data.session_uid for obj in bpy.data.objects
+        if obj.type == 'MESH' and any(slot.link == 'OBJECT' for slot in obj.material_slots)
+    }
+
+
+def compact_mesh_slots(mesh: bpy.types.Mesh) -> int:
+    """
+    Removes the material slots no face uses and merges the slots holding the same material, remapping the
+    face material indices with a lookup table in a single bulk read and write.
+
+    Args:
+        mesh (bpy.types.Mesh): The mesh to compact, which must not be in edit mode.
+
+    Returns:
+        int: The number of slots removed.
+    """
+    slot_count = len(mesh.materials)
+    if slot_count == 0 or len(mesh.polygons) == 0:
+        return 0
+
+    face_materials = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", face_materials)
+    # Faces with an index past the last slot are drawn with the last slot
+    np.minimum(face_materials, slot_count - 1, out=face_materials)
+
+    materials = list(mesh.materials)
+    new_materials = []
+    new_indices = {}
+    lookup = np.zeros(slot_count, dtype=np.int32)
+    for index in np.unique(face_materials):
+        key = materials[index].session_uid if materials[index] else None
+        if key not in new_indices:
+            new_indices[key] = len(new_materials)
+            new_materials.append(materials[index])
+        lookup[index] = new_indices[key]
+
+    if new_materials == materials and np.array_equal(lookup, np.arange(slot_count)):
+        return 0
+
+    mesh.materials.clear()
+    for mat in new_materials:
+        mesh.materials.append(mat)
+    mesh.polygons.foreach_set("material_index", lookup[face_materials])
+    mesh.update()
+    return slot_count - len(new_materials)
+
+
+def compact_slots(meshes: Iterable[bpy.types.Mesh]) -> CompactionResult:
+    """
+    Compacts the material slots of many meshes.
+
+    Args:
+        meshes (Iterable[bpy.types.Mesh]): The meshes to compact.
+
+    Returns:
+        CompactionResult: The number of meshes changed and slots removed, and the meshes which were skipped.
+    """
+    result = CompactionResult()
+    object_linked = get_object_linked_meshes()
+    for mesh in meshes:
+        if mesh.library or mesh.session_uid in object_linked:
+            result.skipped.append(mesh.name)
+            continue
+        removed = compact_mesh_slots(mesh)
+        if removed:
+            result.meshes += 1
+            result.removed_slots += removed
+
+    LOGGER.info(f"Removed {result.removed_slots} material slots from {result.meshes} meshes")
+    return result
@@ -9,6 +9,8 @@ class TextureSlot():
     description: str
     properties: t.Dict[str, t.Dict[str, str]]
     connections: t.List[t.List[str]]
+    max_resolution: t.Optional[int] = None
+    compression_ratio: t.Optional[float] = None
 
     @classmethod
     def from_dict(cls: t.Type["TextureSlot"], obj: t.Dict):
@@ -16,7 +18,9 @@ class TextureSlot():
             slot_name=obj["slot_name"],
             description=obj["description"],
             properties=obj["properties"],
-            connections=obj["connections"]
+            connections=obj["connections"],
+            max_resolution=obj.get("max_resolution"),
+            compression_ratio=obj.get("compression_ratio")
         )
 
     def dict(self):
@@ -28,13 +32,17 @@ class MaterialType():
     suffix: str
     required_texture_slots: t.List[TextureSlot]
     optional_texture_slots: t.List[TextureSlot]
+    max_resolution: t.Optional[int] = None
+    compression_ratio: t.Optional[float] = None
 
     @classmethod
     def from_dict(cls: t.Type["MaterialType"], obj: t.Dict):
         return cls(
             suffix=obj["suffix"],
             required_texture_slots=[TextureSlot.from_dict(item) for item in obj["required_texture_slots"]],
-            optional_texture_slots=[TextureSlot.from_dict(item) for item in obj["optional_texture_slots"]]
+            optional_texture_slots=[TextureSlot.from_dict(item) for item in obj["optional_texture_slots"]],
+            max_resolution=obj.get("max_resolution"),
+            compression_ratio=obj.get("compression_ratio")
         )
 
     def dict(self):
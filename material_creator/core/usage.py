@@ -0,0 +1,167 @@
+import bpy
+import logging
+import numpy as np
+from bpy.app.handlers import persistent
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class MaterialUsage():
+    faces: int = 0
+    objects: Set[str] = field(default_factory=set)
+    meshes: Set[str] = field(default_factory=set)
+
+
+# Face counts per material index keyed by mesh session uid, kept until the mesh geometry changes
+_MESH_COUNTS: Dict[int, np.ndarray] = {}
+# Usage keyed by material session uid, rebuilt when any object or mesh changes
+_INDEX: Optional[Dict[int, MaterialUsage]] = None
+
+
+def get_mesh_face_counts(mesh: bpy.types.Mesh) -> np.ndarray:
+    """
+    Get the number of faces using each material index of the mesh.
+
+    Args:
+        mesh (bpy.types.Mesh): The mesh to count.
+
+    Returns:
+        np.ndarray: The face counts indexed by material index.
+    """
+    counts = _MESH_COUNTS.get(mesh.session_uid)
+    if counts is None:
+        indices = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("material_index", indices)
+        counts = np.bincount(indices, minlength=1)
+        _MESH_COUNTS[mesh.session_uid] = counts
+    return counts
+
+
+def build_usage_index() -> Dict[int, MaterialUsage]:
+    """
+    Records the objects, meshes and faces using each material in a single pass over the mesh objects.
+
+    Returns:
+        Dict[int, MaterialUsage]: The usage keyed by material session uid.
+    """
+    index: Dict[int, MaterialUsage] = {}
+    seen_meshes = set()
+    for obj in bpy.data.objects:
+        if obj.type != 'MESH' or not obj.material_slots:
+            continue
+        mesh = obj.data
+        seen_meshes.add(mesh.session_uid)
+        counts = get_mesh_face_counts(mesh)
+
+        # Faces with an index past the last slot are drawn with the last slot
+        slot_count = len(obj.material_slots)
+        slot_counts = np.zeros(slot_count, dtype=np.int64)
+        used = min(slot_count, len(counts))
+        slot_counts[:used] = counts[:used]
+        slot_counts[-1] += counts[slot_count:].sum()
+
+        for slot, faces in zip(obj.material_slots, slot_counts):
+            if not slot.material:
+                continue
+            usage = index.setdefault(slot.material.session_uid, MaterialUsage())
+            usage.faces += int(faces)
+            usage.objects.add(obj.name)
+            usage.meshes.add(mesh.name)
+
+    # Drop the counts of meshes which no longer exist
+    for key in set(_MESH_COUNTS) - seen_meshes:
+        del _MESH_COUNTS[key]
+    LOGGER.debug(f"Indexed the usage of {len(index)} materials across {len(seen_meshes)} meshes")
+    return index
+
+
+def get_usage_index() -> Dict[int, MaterialUsage]:
+    """ Get the usage of every material, rebuilding the index if the scene changed since it was built """
+    global _INDEX
+    if _INDEX is None:
+        # The handlers are only needed once there is an index to invalidate
+        register()
+        _INDEX = build_usage_index()
+    return _INDEX
+
+
+def get_material_usage(material: bpy.types.Material) -> MaterialUsage:
+    """
+    Get where a material is used in the file.
+
+    Args:
+        material (bpy.types.Material): The material to look up.
+
+    Returns:
+        MaterialUsage: The objects, meshes and number of faces using the material.
+    """
+    return get_usage_index().get(material.session_uid, MaterialUsage())
+
+
+def mark_dirty(meshes: Optional[Set[int]] = None) -> None:
+    """
+    Mark the usage index as changed, and the face counts of the given meshes.
+
+    Args:
+        meshes (Optional[Set[int]]): The session uids of the changed meshes, or None for all meshes.
+    """
+    global _INDEX
+    _INDEX = None
+    if meshes is None:
+        _MESH_COUNTS.clear()
+        return
+    for key in meshes:
+        _MESH_COUNTS.pop(key, None)
+
+
+@persistent
+def on_depsgraph_update(scene, depsgraph) -> None:
+    """ Mark the index changed when objects or mesh geometry change """
+    if _INDEX is None and not _MESH_COUNTS:
+        return
+
+    changed_meshes = set()
+    changed = False
+    for update in depsgraph.updates:
+        data = update.id
+        if isinstance(data, bpy.types.Mesh):
+            # Material slots live on the mesh, so any mesh update can change the index
+            changed = True
+            if update.is_updated_geometry:
+                changed_meshes.add(data.original.session_uid)
+        elif isinstance(data, bpy.types.Object) and not (update.is_updated_transform and not update.is_updated_geometry):
+            # Material slots and object data can change without a mesh geometry update
+            changed = True
+
+    if changed:
+        mark_dirty(changed_meshes)
+
+
+@persistent
+def on_load_post(*args) -> None:
+    """ Session uids are only unique within a file """
+    mark_dirty()
+
+
+def register():
+    """
+    Registers the handlers which keep the usage index up to date, this is done when the index is first built.
+    """
+    if on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    if on_load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load_post)
+
+
+def unregister():
+    """
+    Unregisters the handlers and clears the index.
+    """
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    if on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load_post)
+    mark_dirty()
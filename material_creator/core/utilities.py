@@ -1,28 +1,75 @@
 import bpy
 import os
-from typing import Dict, Any, Optional
+import math
+from functools import lru_cache
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from ..constants import ToolInfo
+
+
+@lru_cache(maxsize=None)
+def compile_property_path(path: str) -> Tuple[Callable[[Any], Optional[Any]], str]:
+    """
+    Compiles a dotted property path, such as 'image.colorspace_settings.name', into a function
+    returning the object which owns the final property. Paths are only split once per template.
+
+    Args:
+        path (str): The dotted property path.
+
+    Returns:
+        Tuple[Callable[[Any], Optional[Any]], str]: The function resolving the owner from a node, which returns
+        None if part of the path is unset, and the name of the final property.
+    """
+    *chain, name = path.split(".")
+
+    def resolve(node: Any) -> Optional[Any]:
+        owner = node
+        for prop in chain:
+            if not owner:
+                return None
+            owner = getattr(owner, prop)
+        return owner
+    return resolve, name
+
+
+def is_same_value(current: Any, value: Any) -> bool:
+    """ Compare a property value with the value to set, allowing for float precision and RNA arrays """
+    if isinstance(value, float) and isinstance(current, (int, float)):
+        return math.isclose(current, value, rel_tol=1e-6, abs_tol=1e-7)
+    if isinstance(value, (list, tuple)):
+        try:
+            return len(current) == len(value) and all(is_same_value(a, b) for a, b in zip(current, value))
+        except TypeError:
+            return False
+    return current == value
 
 
 # TODO: Extract Indices so we can access import shader variables such as "input[0]"
-def apply_shader_properties(node: bpy.types.Node, shader_property_block: Dict[str, Any]) -> None:
+def apply_shader_properties(node: bpy.types.Node, shader_property_block: Dict[str, Any]) -> int:
     """
     Applies shader properties from the given property block to the specified node.
 
+    Values which are already set are not written again, as every write triggers RNA updates and
+    can cause the material's shader to be recompiled.
+
     Args:
         node (bpy.types.Node): The shader node to which properties will be applied.
         shader_property_block (Dict[str, Any]): A dictionary containing shader properties and their values.
+
+    Returns:
+        int: The number of properties which changed.
     """
+    changed = 0
     for props, value in shader_property_block.items():
-        current_property = node
+        resolve, name = compile_property_path(props)
+        owner = resolve(node)
+        if not owner:
+            continue
 
-        # Traverse through the property chain, excluding the last one
-        for prop in props.split(".")[:-1]:
-            if not current_property:
-                return None
-            current_property = getattr(current_property, prop)
-
-        # Set the final property value
-        setattr(current_property, props.split(".")[-1], value)
+        if is_same_value(getattr(owner, name), value):
+            continue
+        setattr(owner, name, value)
+        changed += 1
+    return changed
 
 
 def find_node(current_node: bpy.types.Node, node_type: str) -> Optional[bpy.types.Node]:
@@ -84,7 +131,7 @@ def find_all_nodes(current_node: bpy.types.Node, node_type: str) -> Optional[bpy
                     # Recursive search if the node isn't a direct match
                     result_nodes = find_all_nodes(next_node, node_type)
                     if result_nodes:
-                        nodes.append(result_nodes)
+                        nodes.extend(result_nodes)
 
     return nodes
 
@@ -111,15 +158,77 @@ def delete_node_recursive (node_tree, node: bpy.types.Node) -> None:
     node_tree.nodes.remove(node)
 
 def load_image(path):
-    """ Load an image from the given path """
+    """
+    Load an image from the given path.
+
+    Blender only reads the pixels of a loaded image once they are first needed, so the
+    image is not accessed here to keep deferred loading possible.
+    """
     for image in bpy.data.images:
         if image.filepath == path:
             return image
 
-    image = bpy.data.images.load(path)
+    image = bpy.data.images.load(path, check_existing=True)
     return image
 
 
+def infer_slot_name(file_name: str, slot_names) -> Optional[str]:
+    """
+    Infers the texture slot of an image from its file name suffix, e.g. 'Crate_Mask.png' -> 'Mask'.
+
+    Args:
+        file_name (str): The image file name.
+        slot_names (Iterable[str]): The slot names to match against.
+
+    Returns:
+        Optional[str]: The matching slot name, or None if no suffix matches.
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0].lower()
+    for slot_name in sorted(slot_names, key=len, reverse=True):
+        if stem.endswith("_" + slot_name.lower()):
+            return slot_name
+    return None
+
+
+def get_preferences():
+    """ Get the addon preferences """
+    return bpy.context.preferences.addons[ToolInfo.NAME.value].preferences
+
+
+def split_directories(value: str) -> List[str]:
+    """
+    Split a preference holding directories separated by semicolons, keeping the directories which exist.
+
+    Args:
+        value (str): The preference value.
+
+    Returns:
+        List[str]: The normalized absolute paths of the directories, without duplicates.
+    """
+    directories = []
+    for directory in value.split(";"):
+        directory = directory.strip()
+        if not directory:
+            continue
+        directory = os.path.normpath(os.path.abspath(os.path.expanduser(directory)))
+        if os.path.isdir(directory) and directory not in directories:
+            directories.append(directory)
+    return directories
+
+
+def get_cache_dir(*parts: str) -> str:
+    """
+    Get a directory inside the addon's user cache directory, creating it if needed.
+
+    Args:
+        parts (str): The path components of the directory below the cache directory.
+
+    Returns:
+        str: The absolute path of the directory.
+    """
+    return bpy.utils.user_resource('CONFIG', path=os.path.join(ToolInfo.NAME.value, *parts), create=True)
+
+
 def get_material_index(material):
     """ Get the index of the given material in the scenes materials """
     material_index = -1
@@ -0,0 +1,165 @@
+import os
+import csv
+import bpy
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List
+from . import image_hash, image_scan, material
+from .utilities import get_preferences, load_image
+
+LOGGER = logging.getLogger(__name__)
+
+NAME_COLUMN = "name"
+
+
+@dataclass
+class VariantResult():
+    materials: List[bpy.types.Material] = field(default_factory=list)
+    problems: List[str] = field(default_factory=list)
+
+
+def read_variant_table(path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Reads a variant table from a CSV or JSON file. Relative image paths are resolved from the table's directory.
+
+    A CSV table has a 'name' column and one column per overridden slot, empty cells keep the base image.
+    A JSON table maps each variant name to its slot overrides, e.g. {"Red": {"BaseColor": "red.png"}}.
+
+    Args:
+        path (str): The file path of the table.
+
+    Returns:
+        Dict[str, Dict[str, str]]: The image paths keyed by slot name, keyed by variant name.
+    """
+    if path.lower().endswith(".json"):
+        with open(path, 'r') as f:
+            table = json.load(f)
+    else:
+        with open(path, 'r', newline='') as f:
+            table = {
+                row.pop(NAME_COLUMN): {slot_name: value for slot_name, value in row.items() if value}
+                for row in csv.DictReader(f)
+            }
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return {
+        variant: {slot_name: os.path.join(base_dir, image_path) for slot_name, image_path in overrides.items()}
+        for variant, overrides in table.items()
+    }
+
+
+def get_variant_name(base: bpy.types.Material, suffix: str, variant: str) -> str:
+    """ Get the name of a variant, keeping the material type suffix at the end so the type is still recognized """
+    base_name = base.name[:-len(suffix)] if suffix and base.name.endswith(suffix) else base.name
+    return f"{base_name}_{variant}{suffix}"
+
+
+def load_variant_images(image_infos: Dict[str, image_scan.ImageInfo],
+                        colorspaces: Dict[str, str]) -> Dict[str, bpy.types.Image]:
+    """
+    Loads every image used by the variants once, reusing the images already in the file.
+
+    Args:
+        image_infos (Dict[str, ImageInfo]): The header information of the images keyed by absolute path.
+        colorspaces (Dict[str, str]): The colorspace given to newly loaded images keyed by absolute path.
+
+    Returns:
+        Dict[str, bpy.types.Image]: The images keyed by absolute path, invalid images are left out.
+    """
+    index = {
+        bpy.path.abspath(image.filepath): image for image in bpy.data.images
+        if image.source == 'FILE' and image.filepath
+    }
+    deduplicate = get_preferences().deduplicate_images
+    content_index = None
+    if deduplicate:
+        image_hash.hash_files(path for path in image_infos if path not in index)
+        content_index = image_hash.get_content_index()
+
+    images = {}
+    for path, info in image_infos.items():
+        if not info.is_valid:
+            for problem in info.problems:
+                LOGGER.error(problem)
+            continue
+        image = index.get(path)
+        if not image:
+            if deduplicate:
+                image = image_hash.load_image_by_content(path, colorspaces[path], content_index)
+            else:
+                image = load_image(path)
+            # Images which were already loaded keep their colorspace, they may be shared with other materials
+            if image.filepath and bpy.path.abspath(image.filepath) == path:
+                image.colorspace_settings.name = colorspaces[path]
+            index[path] = image
+        images[path] = image
+    return images
+
+
+def create_variants(base: bpy.types.Material, table: Dict[str, Dict[str, str]]) -> VariantResult:
+    """
+    Creates a variant of the base material per row of the table, by copying the base and swapping only the
+    overridden images. The node graph is never rebuilt from the template, and images shared by several
+    variants are only loaded once.
+
+    Existing variants with the same name are updated in place.
+
+    Args:
+        base (bpy.types.Material): The material the variants are copied from.
+        table (Dict[str, Dict[str, str]]): The image paths keyed by slot name, keyed by variant name.
+
+    Returns:
+        VariantResult: The variant materials and the overrides which could not be applied.
+    """
+    result = VariantResult()
+    table = {
+        variant: {slot_name: os.path.abspath(path) for slot_name, path in overrides.items()}
+        for variant, overrides in table.items()
+    }
+    properties = material.get_material_properties(base)
+    material_type = material.get_material_type(properties)
+    template = material.get_template()
+    suffix = template.material_config.material_types[material_type].suffix
+    slots = {slot.slot_name: slot for slot in material.get_texture_slots(properties, optional=True)}
+
+    slot_nodes = {}
+    for slot_name in {slot_name for overrides in table.values() for slot_name in overrides}:
+        texture_nodes = material.get_texture_nodes(properties, slot_name) if slot_name in slots else []
+        if isinstance(texture_nodes, ValueError) or not texture_nodes:
+            result.problems.append(f"'{base.name}' has no texture node for slot '{slot_name}'")
+            continue
+        slot_nodes[slot_name] = [node.name for node in texture_nodes]
+
+    paths = sorted({path for overrides in table.values() for path in overrides.values()})
+    image_infos = image_scan.scan_images(paths)
+    colorspaces = {}
+    for overrides in table.values():
+        for slot_name, path in overrides.items():
+            if slot_name in slots:
+                colorspaces.setdefault(path, image_scan.get_slot_colorspace(slots[slot_name], image_infos[path]))
+    images = load_variant_images({path: image_infos[path] for path in colorspaces}, colorspaces)
+
+    for variant, overrides in table.items():
+        name = get_variant_name(base, suffix, variant)
+        variant_material = bpy.data.materials.get(name)
+        if not variant_material:
+            variant_material = base.copy()
+            variant_material.name = name
+
+        nodes = variant_material.node_tree.nodes
+        for slot_name, path in overrides.items():
+            image = images.get(path)
+            if slot_name not in slot_nodes:
+                continue
+            if not image:
+                result.problems.append(f"Unable to use '{path}' for slot '{slot_name}' of '{name}'")
+                continue
+            for node_name in slot_nodes[slot_name]:
+                node = nodes.get(node_name)
+                if node and node.image != image:
+                    node.image = image
+        result.materials.append(variant_material)
+
+    LOGGER.info(f"Created {len(result.materials)} variants of '{base.name}' using {len(images)} images")
+    return result
@@ -0,0 +1,337 @@
+import os
+import sys
+import time
+import select
+import struct
+import logging
+import threading
+import bpy
+from bpy.app.handlers import persistent
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+from .utilities import get_preferences
+
+LOGGER = logging.getLogger(__name__)
+
+IMAGE_NODE_TYPE = "ShaderNodeTexImage"
+# Seconds without a write before a changed file is reloaded, image editors write files in several steps
+DEBOUNCE = 0.5
+TIMER_INTERVAL = 0.25
+# Seconds between the refreshes of the watched files, picking up newly assigned images
+REFRESH_INTERVAL = 5.0
+POLL_INTERVAL = 1.0
+
+# inotify flags, from sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def get_watched_images() -> Dict[str, List[str]]:
+    """
+    Get the texture files referenced by the node materials of the current file.
+
+    Returns:
+        Dict[str, List[str]]: The image names keyed by absolute file path.
+    """
+    images = defaultdict(list)
+    for mat in bpy.data.materials:
+        if mat.library or not mat.use_nodes or not mat.node_tree:
+            continue
+        for node in mat.node_tree.nodes:
+            image = node.image if node.bl_idname == IMAGE_NODE_TYPE else None
+            if image and image.source == 'FILE' and image.filepath and not image.packed_file:
+                names = images[os.path.normpath(bpy.path.abspath(image.filepath))]
+                if image.name not in names:
+                    names.append(image.name)
+    return dict(images)
+
+
+class PollingBackend():
+    """ Detects changed files by comparing their modification times, on any platform """
+
+    def __init__(self):
+        # Guards the stats, which the main thread replaces while the watcher thread scans them
+        self.lock = threading.Lock()
+        self.stats: Dict[str, tuple] = {}
+        self.last_scan = 0.0
+
+    @staticmethod
+    def get_stat(path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def watch(self, paths: Set[str]) -> None:
+        """ Replace the watched files, keeping the last known state of files which were already watched """
+        with self.lock:
+            known = dict(self.stats)
+        stats = {path: known.get(path) or self.get_stat(path) for path in paths}
+        with self.lock:
+            self.stats = stats
+
+    def read_changes(self, timeout: float) -> Set[str]:
+        """ Wait for the timeout, then return the files which changed since the last scan """
+        time.sleep(timeout)
+        if time.monotonic() - self.last_scan < POLL_INTERVAL:
+            return set()
+        self.last_scan = time.monotonic()
+
+        with self.lock:
+            known = list(self.stats.items())
+        current = {path: self.get_stat(path) for path, _stat in known}
+
+        changed = set()
+        with self.lock:
+            for path, stat in known:
+                # Files which stopped being watched during the scan are dropped
+                if current[path] != stat and path in self.stats:
+                    self.stats[path] = current[path]
+                    if current[path]:
+                        changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        with self.lock:
+            self.stats = {}
+
+
+class InotifyBackend():
+    """ Detects changed files with inotify watches on their directories, only available on Linux """
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Guards the watches and paths, which the main thread replaces while the watcher thread reads events
+        self.lock = threading.Lock()
+        self.directories: Dict[int, str] = {}
+        self.paths: Set[str] = set()
+
+    def watch(self, paths: Set[str]) -> None:
+        """ Replace the watched files, watching the directories not watched yet and removing the unused watches """
+        directories = {os.path.dirname(path) for path in paths}
+        with self.lock:
+            self.paths = set(paths)
+            for descriptor, directory in list(self.directories.items()):
+                if directory not in directories:
+                    self.libc.inotify_rm_watch(self.fd, descriptor)
+                    del self.directories[descriptor]
+
+            watched = set(self.directories.values())
+            for directory in directories - watched:
+                descriptor = self.libc.inotify_add_watch(self.fd, directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO)
+                if descriptor >= 0:
+                    self.directories[descriptor] = directory
+
+    def read_changes(self, timeout: float) -> Set[str]:
+        """ Wait up to the timeout for write events, then return the watched files which were written """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        with self.lock:
+            while offset + EVENT_HEADER.size <= len(data):
+                descriptor, _mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0").decode(errors="replace")
+                offset += EVENT_HEADER.size + length
+                directory = self.directories.get(descriptor)
+                if directory and name:
+                    path = os.path.join(directory, name)
+                    if path in self.paths:
+                        changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        # Closing the descriptor removes its watches
+        with self.lock:
+            self.directories.clear()
+        os.close(self.fd)
+
+
+def create_backend():
+    """ Use inotify where it is available, otherwise poll the modification times """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyBackend()
+        except (OSError, AttributeError) as error:
+            LOGGER.info(f"inotify is not available, polling for texture changes instead: {error}")
+    return PollingBackend()
+
+
+class TextureWatcher():
+    """
+    Watches the texture files of the current file on a background thread and reloads the changed images
+    on the main thread, once a file has not been written to for the debounce time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending: Dict[str, float] = {}
+        self.images: Dict[str, List[str]] = {}
+        self.backend = None
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.last_refresh = 0.0
+        # Modification times of the files when their images were last reloaded, keyed by path
+        self.reloaded: Dict[str, int] = {}
+        # Timers are identified by the function object, so keep a single bound method
+        self.timer = self.tick
+
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> None:
+        """ Start watching the texture files referenced by the current file """
+        if self.is_running:
+            return
+        self.backend = create_backend()
+        self.stop_event.clear()
+        self.refresh()
+        self.thread = threading.Thread(target=self.run, name="MaterialCreatorTextureWatcher", daemon=True)
+        self.thread.start()
+        if not bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.register(self.timer, first_interval=TIMER_INTERVAL, persistent=True)
+        LOGGER.info(f"Watching {len(self.images)} texture files with {type(self.backend).__name__}")
+
+    def stop(self) -> None:
+        """ Stop the background thread and the main thread timer """
+        if bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.unregister(self.timer)
+        if self.thread:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+        if self.backend:
+            self.backend.close()
+            self.backend = None
+        with self.lock:
+            self.pending.clear()
+        self.reloaded.clear()
+
+    def needs_reload(self, image: bpy.types.Image) -> bool:
+        """
+        Whether an image may be out of date with its file. Without the watcher every file image may be,
+        while it runs only files whose modification time differs from when they were last reloaded are.
+        """
+        if not self.is_running:
+            return True
+        if image.source != 'FILE' or not image.filepath or image.packed_file:
+            return False
+        path = os.path.normpath(bpy.path.abspath(image.filepath))
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return False
+        if self.reloaded.get(path) == mtime_ns:
+            return False
+        self.reloaded[path] = mtime_ns
+        return True
+
+    def refresh(self) -> None:
+        """ Update the watched files from the images referenced by the materials """
+        self.images = get_watched_images()
+        with self.lock:
+            self.backend.watch(set(self.images))
+        self.last_refresh = time.monotonic()
+
+    def run(self) -> None:
+        """ The background thread, recording when each watched file was last written """
+        while not self.stop_event.is_set():
+            with self.lock:
+                backend = self.backend
+            changed = backend.read_changes(TIMER_INTERVAL) if backend else set()
+            if changed:
+                now = time.monotonic()
+                with self.lock:
+                    for path in changed:
+                        self.pending[path] = now
+
+    def tick(self) -> Optional[float]:
+        """ Reload the images of the files which stopped changing, on the main thread """
+        now = time.monotonic()
+        with self.lock:
+            ready = [path for path, changed_at in self.pending.items() if now - changed_at >= DEBOUNCE]
+            for path in ready:
+                del self.pending[path]
+
+        reloaded = 0
+        for path in ready:
+            try:
+                self.reloaded[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                self.reloaded.pop(path, None)
+            for name in self.images.get(path, []):
+                image = bpy.data.images.get(name)
+                if image:
+                    image.reload()
+                    reloaded += 1
+
+        if reloaded:
+            LOGGER.info(f"Reloaded {reloaded} changed images")
+            for window in bpy.context.window_manager.windows:
+                for area in window.screen.areas:
+                    area.tag_redraw()
+        if now - self.last_refresh >= REFRESH_INTERVAL:
+            self.refresh()
+        return TIMER_INTERVAL
+
+
+WATCHER = TextureWatcher()
+
+
+def update_watcher() -> None:
+    """ Start or stop the watcher to match the addon preferences """
+    if get_preferences().watch_textures:
+        WATCHER.start()
+    else:
+        WATCHER.stop()
+
+
+@persistent
+def on_load_post(*args) -> None:
+    """ Watch the textures of the file that was loaded """
+    if WATCHER.is_running:
+        WATCHER.refresh()
+
+
+def start_if_enabled() -> None:
+    """ The addon preferences are only available once registration finished """
+    update_watcher()
+    return None
+
+
+def register():
+    """
+    Starts the watcher if it is enabled in the addon preferences.
+    """
+    if on_load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load_post)
+    if not bpy.app.background:
+        bpy.app.timers.register(start_if_enabled, first_interval=0.1)
+
+
+def unregister():
+    """
+    Stops the watcher.
+    """
+    if on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load_post)
+    if bpy.app.timers.is_registered(start_if_enabled):
+        bpy.app.timers.unregister(start_if_enabled)
+    WATCHER.stop()
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import logging
+import importlib
+import importlib.machinery
+import importlib.util
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+from typing import Any, List
+
+LOGGER = logging.getLogger(__name__)
+
+# This module is also the script run by the worker processes, so it must only use absolute imports
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_worker(module: str, function: str, payloads: List[Any]) -> List[Any]:
+    """
+    Runs a function of a core module in a background Blender process.
+
+    Args:
+        module (str): The name of the module in the core package, e.g. 'packing'.
+        function (str): The name of the function, which takes and returns a list of JSON serializable values.
+        payloads (List[Any]): The values passed to the function.
+
+    Returns:
+        List[Any]: The values returned by the function.
+    """
+    import bpy
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, "input.json")
+        output_path = os.path.join(temp_dir, "output.json")
+        with open(input_path, 'w') as f:
+            json.dump(payloads, f)
+
+        command = [
+            bpy.app.binary_path, "--background", "--factory-startup", "--python", os.path.abspath(__file__), "--",
+            os.path.dirname(PACKAGE_DIR), os.path.basename(PACKAGE_DIR), module, function, input_path, output_path
+        ]
+        process = subprocess.run(command, capture_output=True, text=True)
+        if process.returncode != 0 or not os.path.exists(output_path):
+            raise RuntimeError(f"Worker '{module}.{function}' failed: {process.stderr[-2000:]}")
+
+        with open(output_path, 'r') as f:
+            return json.load(f)
+
+
+def run_in_workers(module: str, function: str, payloads: List[Any], workers: int) -> List[Any]:
+    """
+    Splits the payloads between a pool of background Blender processes.
+
+    Args:
+        module (str): The name of the module in the core package.
+        function (str): The name of the function, which takes and returns a list of JSON serializable values.
+        payloads (List[Any]): The values to process.
+        workers (int): The number of processes to run at once.
+
+    Returns:
+        List[Any]: The returned values, in the order of the payloads.
+    """
+    if not payloads:
+        return []
+
+    workers = max(1, min(workers, len(payloads)))
+    chunks = [payloads[index::workers] for index in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        chunk_results = list(executor.map(lambda chunk: run_worker(module, function, chunk), chunks))
+
+    # Restore the payload order from the interleaved chunks
+    results = [None] * len(payloads)
+    for index, chunk_result in enumerate(chunk_results):
+        results[index::workers] = chunk_result
+    return results
+
+
+def import_core_module(parent_dir: str, package: str, module: str) -> ModuleType:
+    """
+    Imports a core module without running the add-on package __init__, which imports the operators and panels.
+    The add-on package is replaced by an empty package, so only the module and its own imports are loaded.
+
+    Args:
+        parent_dir (str): The directory holding the add-on package.
+        package (str): The name of the add-on package.
+        module (str): The name of the module in the core package.
+
+    Returns:
+        ModuleType: The imported module.
+    """
+    spec = importlib.machinery.ModuleSpec(package, None, is_package=True)
+    spec.submodule_search_locations = [os.path.join(parent_dir, package)]
+    sys.modules[package] = importlib.util.module_from_spec(spec)
+    return importlib.import_module(f"{package}.core.{module}")
+
+
+def main(argv: List[str]) -> None:
+    """ The entry point of a worker process """
+    parent_dir, package, module, function, input_path, output_path = argv[argv.index("--") + 1:]
+    worker_module = import_core_module(parent_dir, package, module)
+
+    with open(input_path, 'r') as f:
+        payloads = json.load(f)
+
+    results = getattr(worker_module, function)(payloads)
+
+    with open(output_path, 'w') as f:
+        json.dump(results, f)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,5 +1,9 @@
 import bpy
-from .core import material, utilities
+import os
+# Modules which import numpy or sqlite3 are imported by the operators which use them, keeping registration fast.
+# Every other module is imported here.
+# pylint: disable=import-outside-toplevel
+from .core import audit, dedupe, export, jobs, material, material_cache, memory, previews, utilities, variants
 from bpy_extras.io_utils import ExportHelper
 
 
@@ -34,6 +38,83 @@ class CreateMaterial(bpy.types.Operator):
         return context.window_manager.invoke_props_dialog(self)
 
 
+class ImportCatalogMaterial(bpy.types.Operator):
+    bl_idname = "material_creator.import_catalog_material"
+    bl_label = "Import Catalog Material"
+
+    def search_catalog(self, context, edit_text):
+        from .core import catalog
+        return [
+            (catalog.get_entry(result.file, result.name), result.material_type)
+            for result in catalog.search_catalog(edit_text)
+        ]
+
+    entry: bpy.props.StringProperty(
+        name="Material",
+        default='',
+        search=search_catalog,
+        description="Search the material catalog by material name"
+    )
+
+    link: bpy.props.BoolProperty(
+        name="Link",
+        default=False,
+        description="Link the material from its blend file instead of appending a copy"
+    )
+
+    def execute(self, context):
+        from .core import catalog
+        file, name = catalog.parse_entry(self.entry)
+        if not file or not os.path.isfile(file):
+            self.report({'ERROR'}, f"Blend file of '{self.entry}' not found!")
+            return {'CANCELLED'}
+
+        imported = catalog.import_material(file, name, link=self.link)
+        if not imported:
+            self.report({'ERROR'}, f"Material '{name}' not found in '{file}'!")
+            return {'CANCELLED'}
+
+        properties = bpy.context.scene.material_creator
+        properties.scene_material_index = utilities.get_material_index(imported)
+        self.report({'INFO'}, f"{'Linked' if self.link else 'Appended'} material '{imported.name}'")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        from .core import catalog
+        # Bring the catalog up to date once per session, the search uses the current catalog meanwhile
+        if catalog.get_catalog_roots() and not catalog.is_refreshed():
+            bpy.ops.material_creator.refresh_material_catalog()
+        self.entry = ''
+        return context.window_manager.invoke_props_dialog(self)
+
+
+class RefreshMaterialCatalog(bpy.types.Operator):
+    bl_idname = "material_creator.refresh_material_catalog"
+    bl_label = "Refresh Material Catalog"
+
+    force: bpy.props.BoolProperty(
+        name="Force",
+        default=False,
+        description="Read every blend file again, even if it did not change"
+    )
+
+    def execute(self, context):
+        from .core import catalog
+        roots = catalog.get_catalog_roots()
+        if not roots:
+            self.report({'ERROR'}, "No material library directories set in the addon preferences!")
+            return {'CANCELLED'}
+
+        job = jobs.start_job(
+            "Refresh Material Catalog",
+            catalog.iter_refresh_catalog(roots, utilities.get_preferences().worker_processes, force=self.force),
+            on_finish=lambda read: f"Read the materials of {read} blend files"
+        )
+        if job.is_done:
+            self.report({'ERROR'} if job.error else {'INFO'}, job.message)
+        return {'FINISHED'}
+
+
 class AssignMaterialTexture(bpy.types.Operator, ExportHelper):
     bl_idname = "material_creator.assign_texture"
     bl_label = "Assign Material Texture"
@@ -49,13 +130,247 @@ class AssignMaterialTexture(bpy.types.Operator, ExportHelper):
     def execute(self, context):
         properties = bpy.context.scene.material_creator
         if properties and properties.source_material:
-            material.set_texture_map(properties, self.slot_name, self.filepath)
+            result = material.set_texture_maps(properties, {self.slot_name: self.filepath})
+            material_cache.mark_dirty({properties.source_material.session_uid})
+            if result.problems:
+                self.report({'ERROR'}, "; ".join(result.problems[self.slot_name]))
+                return {'CANCELLED'}
+            for warning in result.warnings.get(self.slot_name, []):
+                self.report({'WARNING'}, warning)
         else:
             self.report({'ERROR'}, "No material found to assign texture to!")
             return {'CANCELLED'}
         return {'FINISHED'}
 
 
+class SearchLibraryTexture(bpy.types.Operator):
+    bl_idname = "material_creator.search_library_texture"
+    bl_label = "Search Texture Library"
+
+    def search_library(self, context, edit_text):
+        from .core import library
+        return [
+            (texture.path, f"{texture.width}x{texture.height}")
+            for texture in library.search_textures(edit_text, self.slot_name)
+        ]
+
+    slot_name: bpy.props.StringProperty(
+        default='',
+        maxlen=35,
+        options={'HIDDEN'}
+    )
+
+    filepath: bpy.props.StringProperty(
+        name="Texture",
+        default='',
+        search=search_library,
+        description="Search the texture library by file name"
+    )
+
+    def execute(self, context):
+        properties = bpy.context.scene.material_creator
+        if not properties or not properties.source_material:
+            self.report({'ERROR'}, "No material found to assign texture to!")
+            return {'CANCELLED'}
+        if not os.path.isfile(self.filepath):
+            self.report({'ERROR'}, f"Texture '{self.filepath}' not found!")
+            return {'CANCELLED'}
+
+        result = material.set_texture_maps(properties, {self.slot_name: self.filepath})
+        material_cache.mark_dirty({properties.source_material.session_uid})
+        if result.problems:
+            self.report({'ERROR'}, "; ".join(result.problems[self.slot_name]))
+            return {'CANCELLED'}
+        for warning in result.warnings.get(self.slot_name, []):
+            self.report({'WARNING'}, warning)
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        from .core import library
+        # Bring the index up to date once per session, the search uses the current index meanwhile
+        if library.get_library_roots() and not library.is_refreshed():
+            bpy.ops.material_creator.refresh_texture_library()
+        self.filepath = ''
+        return context.window_manager.invoke_props_dialog(self)
+
+
+class RefreshTextureLibrary(bpy.types.Operator):
+    bl_idname = "material_creator.refresh_texture_library"
+    bl_label = "Refresh Texture Library"
+
+    force: bpy.props.BoolProperty(
+        name="Force",
+        default=False,
+        description="Read every directory and image again, picking up images which were overwritten in place"
+    )
+
+    def execute(self, context):
+        from .core import library
+        roots = library.get_library_roots()
+        if not roots:
+            self.report({'ERROR'}, "No texture library directories set in the addon preferences!")
+            return {'CANCELLED'}
+
+        job = jobs.start_job(
+            "Refresh Texture Library",
+            library.iter_refresh_library(roots, force=self.force),
+            on_finish=lambda indexed: f"Indexed {indexed} library textures"
+        )
+        if job.is_done:
+            self.report({'ERROR'} if job.error else {'INFO'}, job.message)
+        return {'FINISHED'}
+
+
+class AssignTextureSet(bpy.types.Operator):
+    bl_idname = "material_creator.assign_texture_set"
+    bl_label = "Assign Texture Set"
+
+    directory: bpy.props.StringProperty(
+        subtype='DIR_PATH'
+    )
+
+    def execute(self, context):
+        properties = bpy.context.scene.material_creator
+        if not properties or not properties.source_material:
+            self.report({'ERROR'}, "No material found to assign textures to!")
+            return {'CANCELLED'}
+
+        # The file browser gives paths relative to the blend file when relative paths are enabled
+        directory = bpy.path.abspath(self.directory)
+        try:
+            file_names = sorted(os.listdir(directory))
+        except OSError as error:
+            self.report({'ERROR'}, f"Unable to list '{directory}': {error}")
+            return {'CANCELLED'}
+
+        slot_names = [slot.slot_name for slot in material.get_texture_slots(properties, optional=True)]
+        texture_maps = {}
+        for file_name in file_names:
+            slot_name = utilities.infer_slot_name(file_name, slot_names)
+            if slot_name and slot_name not in texture_maps:
+                texture_maps[slot_name] = os.path.join(directory, file_name)
+
+        if not texture_maps:
+            self.report({'ERROR'}, "No textures named after the material slots found in directory!")
+            return {'CANCELLED'}
+
+        result = material.set_texture_maps(properties, texture_maps)
+        material_cache.mark_dirty({properties.source_material.session_uid})
+        if result.problems:
+            self.report({'WARNING'}, f"{len(result.problems)} of {len(texture_maps)} textures were not assigned, see the console for details")
+        if result.warnings:
+            self.report({'WARNING'}, f"{len(result.warnings)} textures exceed their slot budget, see the console for details")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
+class CreateMaterialVariants(bpy.types.Operator):
+    bl_idname = "material_creator.create_material_variants"
+    bl_label = "Create Material Variants"
+
+    filepath: bpy.props.StringProperty(
+        subtype='FILE_PATH'
+    )
+
+    filter_glob: bpy.props.StringProperty(
+        default="*.csv;*.json",
+        options={'HIDDEN'}
+    )
+
+    def execute(self, context):
+        properties = bpy.context.scene.material_creator
+        if not properties or not properties.source_material:
+            self.report({'ERROR'}, "No material found to create variants of!")
+            return {'CANCELLED'}
+
+        try:
+            table = variants.read_variant_table(bpy.path.abspath(self.filepath))
+        except (OSError, ValueError, KeyError) as error:
+            self.report({'ERROR'}, f"Unable to read variant table: {error}")
+            return {'CANCELLED'}
+
+        result = variants.create_variants(properties.source_material, table)
+        for problem in result.problems:
+            self.report({'WARNING'}, problem)
+        self.report({'INFO'}, f"Created {len(result.materials)} variants")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
+class PackSlotTextures(bpy.types.Operator):
+    bl_idname = "material_creator.pack_slot_textures"
+    bl_label = "Pack Slot Textures"
+
+    slot_name: bpy.props.StringProperty(
+        default='',
+        maxlen=35
+    )
+
+    directory: bpy.props.StringProperty(
+        subtype='DIR_PATH'
+    )
+
+    recursive: bpy.props.BoolProperty(
+        name="Recursive",
+        default=False,
+        description="Pack the maps of every sub directory into a texture named after that directory, "
+                    "instead of assigning the maps of the chosen directory to this material"
+    )
+
+    def execute(self, context):
+        from .core import packing
+        properties = bpy.context.scene.material_creator
+        if not properties or not properties.source_material:
+            self.report({'ERROR'}, "No material found to pack textures for!")
+            return {'CANCELLED'}
+
+        layout = packing.get_slot_layout(material.get_texture_slots(properties, optional=True), self.slot_name)
+        if not layout:
+            self.report({'ERROR'}, f"Slot '{self.slot_name}' does not pack several channels!")
+            return {'CANCELLED'}
+
+        # The file browser gives paths relative to the blend file when relative paths are enabled
+        root = bpy.path.abspath(self.directory)
+        directories = [directory for directory, _dirs, _files in os.walk(root)] if self.recursive else [root]
+        pack_jobs = []
+        for directory in directories:
+            sources = packing.find_source_maps(directory, layout)
+            if sources:
+                name = os.path.basename(os.path.normpath(directory)) if self.recursive else properties.source_material.name
+                pack_jobs.append(packing.PackJob(sources, os.path.join(directory, f"{name}_{self.slot_name}.png")))
+
+        if not pack_jobs:
+            self.report({'ERROR'}, "No maps named after the slot's shader inputs found!")
+            return {'CANCELLED'}
+
+        results = packing.pack_texture_sets(pack_jobs, utilities.get_preferences().worker_processes)
+        errors = [result["error"] for result in results if "error" in result]
+        for error in errors:
+            self.report({'WARNING'}, error)
+
+        if not self.recursive and not errors:
+            result = material.set_texture_maps(properties, {self.slot_name: results[0]["output_path"]})
+            material_cache.mark_dirty({properties.source_material.session_uid})
+            if result.problems:
+                self.report({'ERROR'}, "; ".join(result.problems[self.slot_name]))
+                return {'CANCELLED'}
+            for warning in result.warnings.get(self.slot_name, []):
+                self.report({'WARNING'}, warning)
+
+        self.report({'INFO'}, f"Packed {len(results) - len(errors)} of {len(pack_jobs)} texture sets")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
 class CreateTexturePreview(bpy.types.Operator):
     bl_idname = "material_creator.create_texture_preview"
     bl_label = "Assign Material Texture"
@@ -87,12 +402,30 @@ class ChangeMaterialType(bpy.types.Operator):
         description="Select the material type",
     )
 
+    selected_objects: bpy.props.BoolProperty(
+        name="Selected Objects",
+        default=False,
+        description="Change the type of every material of the selected objects instead of only the selected material"
+    )
+
     def execute(self, context):
 
         properties = bpy.context.scene.material_creator
         config = material.get_template()
-        if properties and properties.source_material and self.type_name in config.material_config.material_types:
+        if self.selected_objects and self.type_name in config.material_config.material_types:
+            materials = {
+                slot.material for obj in context.selected_objects for slot in obj.material_slots if slot.material
+            }
+            job = jobs.start_job(
+                "Change Material Type",
+                material.iter_change_materials_type(sorted(mat.name for mat in materials), self.type_name),
+                on_finish=lambda changed: f"Changed the type of {changed} materials"
+            )
+            if job.is_done:
+                self.report({'INFO'}, job.message)
+        elif properties and properties.source_material and self.type_name in config.material_config.material_types:
             material.change_material_type(properties, self.type_name)
+            material_cache.mark_dirty({properties.source_material.session_uid})
             properties.scene_material_index = utilities.get_material_index(properties.source_material)
         else:
             self.report({'ERROR'}, "Did not find material to change type of!")
@@ -116,6 +449,7 @@ class CreateTextureSlot(bpy.types.Operator):
         properties = bpy.context.scene.material_creator
         if properties and properties.source_material:
             material.create_texture_slot(properties, self.slot_name)
+            material_cache.mark_dirty({properties.source_material.session_uid})
         else:
             self.report({'ERROR'}, "No material found to create texture slot for!")
             return {'CANCELLED'}
@@ -154,6 +488,7 @@ class RenameMaterial(bpy.types.Operator):
         if properties and properties.source_material:
             material_type = material.get_template().material_config.material_types[material.get_material_type(properties)]
             material.rename_material(properties, self.material_name + material_type.suffix)
+            material_cache.mark_dirty({properties.source_material.session_uid})
         else:
             self.report({'ERROR'}, "No material found to rename!")
             return {'CANCELLED'}
@@ -186,17 +521,335 @@ class DeleteUnusedMaterials(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class CompactMaterialSlots(bpy.types.Operator):
+    bl_idname = "material_creator.compact_material_slots"
+    bl_label = "Compact Material Slots"
+
+    def execute(self, context):
+        from .core import slots
+        was_in_edit_mode = context.mode == 'EDIT_MESH'
+        if was_in_edit_mode:
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        meshes = {obj.data for obj in context.selected_objects if obj.type == 'MESH'}
+        result = slots.compact_slots(sorted(meshes, key=lambda mesh: mesh.name))
+
+        if was_in_edit_mode:
+            bpy.ops.object.mode_set(mode='EDIT')
+
+        if result.skipped:
+            self.report({'WARNING'}, f"Skipped meshes with object linked materials: {', '.join(result.skipped)}")
+        self.report({'INFO'}, f"Removed {result.removed_slots} material slots from {result.meshes} meshes")
+        return {'FINISHED'}
+
+
+class MergeDuplicateMaterials(bpy.types.Operator):
+    bl_idname = "material_creator.merge_duplicate_materials"
+    bl_label = "Merge Duplicate Materials"
+
+    def execute(self, context):
+        removed = dedupe.merge_duplicate_materials(bpy.data.materials)
+        material_cache.mark_dirty()
+        self.report({'INFO'}, f"Merged {removed} duplicate materials")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_confirm(self, event)
+
+
+class ExportMaterials(bpy.types.Operator):
+    bl_idname = "material_creator.export_materials"
+    bl_label = "Export Materials"
+
+    directory: bpy.props.StringProperty(
+        subtype='DIR_PATH'
+    )
+
+    force: bpy.props.BoolProperty(
+        name="Force",
+        default=False,
+        description="Export every material, including those which did not change since the last export"
+    )
+
+    def execute(self, context):
+        if not self.directory:
+            self.report({'ERROR'}, "No directory to export materials to!")
+            return {'CANCELLED'}
+
+        job = jobs.start_job(
+            "Export Materials",
+            export.iter_export_materials(bpy.path.abspath(self.directory), force=self.force),
+            on_finish=lambda result: f"Exported {result.exported} materials ({result.unchanged} unchanged, {result.removed} removed)"
+        )
+        if job.is_done:
+            self.report({'ERROR'} if job.error else {'INFO'}, job.message)
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
+class EnforceTextureBudgets(bpy.types.Operator):
+    bl_idname = "material_creator.enforce_texture_budgets"
+    bl_label = "Enforce Texture Budgets"
+
+    filter_type: bpy.props.EnumProperty(
+        name="Filter",
+        default='LANCZOS',
+        items=[
+            ('BOX', "Box", "Average the source pixels covered by each pixel"),
+            ('LANCZOS', "Lanczos", "Sharper downsampling with a Lanczos filter"),
+        ],
+        description="The filter used to downsample images"
+    )
+
+    all_materials: bpy.props.BoolProperty(
+        name="All Materials",
+        default=True,
+        description="Enforce the budgets of every material instead of only the selected material"
+    )
+
+    def execute(self, context):
+        from .core import budgets
+        properties = bpy.context.scene.material_creator
+        if self.all_materials:
+            materials = list(export.get_managed_materials())
+        elif properties and properties.source_material:
+            materials = [properties.source_material]
+        else:
+            self.report({'ERROR'}, "No material found to enforce texture budgets for!")
+            return {'CANCELLED'}
+
+        rewired = budgets.enforce_budgets(materials, filter_type=self.filter_type)
+        material_cache.mark_dirty()
+        self.report({'INFO'}, f"Rewired {rewired} textures to downsampled copies")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+
+class BuildMaterialAtlases(bpy.types.Operator):
+    bl_idname = "material_creator.build_material_atlases"
+    bl_label = "Build Material Atlases"
+
+    directory: bpy.props.StringProperty(
+        subtype='DIR_PATH'
+    )
+
+    max_size: bpy.props.IntProperty(
+        name="Max Size",
+        default=4096,
+        min=256,
+        max=16384,
+        description="The largest width and height of an atlas"
+    )
+
+    padding: bpy.props.IntProperty(
+        name="Padding",
+        default=4,
+        min=0,
+        max=64,
+        description="The number of edge pixels repeated around each material's images, to avoid bleeding"
+    )
+
+    selected_only: bpy.props.BoolProperty(
+        name="Selected Objects Only",
+        default=True,
+        description="Only combine the materials of the selected objects"
+    )
+
+    def execute(self, context):
+        from .core import atlas
+        if not self.directory:
+            self.report({'ERROR'}, "No directory to write the atlases to!")
+            return {'CANCELLED'}
+
+        if self.selected_only:
+            materials = {
+                slot.material for obj in context.selected_objects for slot in obj.material_slots if slot.material
+            }
+        else:
+            materials = set(export.get_managed_materials())
+
+        result = atlas.build_atlases(
+            sorted(materials, key=lambda mat: mat.name), bpy.path.abspath(self.directory), self.max_size, self.padding
+        )
+        material_cache.mark_dirty()
+        for problem in result.problems:
+            self.report({'WARNING'}, problem)
+        self.report({'INFO'}, f"Created {len(result.materials)} atlas materials across {result.meshes} meshes")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
+class RenderMaterialPreviews(bpy.types.Operator):
+    bl_idname = "material_creator.render_material_previews"
+    bl_label = "Render Material Previews"
+
+    force: bpy.props.BoolProperty(
+        name="Force",
+        default=False,
+        description="Render every preview again, including those which are cached for the current node graph"
+    )
+
+    def execute(self, context):
+        material_names = [mat.name for mat in export.get_managed_materials()]
+        if not material_names:
+            self.report({'ERROR'}, "No materials to render previews of!")
+            return {'CANCELLED'}
+
+        job = jobs.start_job(
+            "Render Material Previews",
+            previews.iter_render_previews(material_names, utilities.get_preferences().worker_processes, force=self.force),
+            on_finish=lambda rendered: f"Rendered {rendered} material previews"
+        )
+        if job.is_done:
+            self.report({'ERROR'} if job.error else {'INFO'}, job.message)
+        return {'FINISHED'}
+
+
+class ExportTextureMemory(bpy.types.Operator, ExportHelper):
+    bl_idname = "material_creator.export_texture_memory"
+    bl_label = "Export Texture Memory"
+
+    filename_ext = ".csv"
+
+    filter_glob: bpy.props.StringProperty(default='*.csv', options={'HIDDEN'}, maxlen=255)
+
+    def execute(self, context):
+        report = memory.get_memory_report(export.get_managed_materials())
+        memory.export_memory_csv(self.filepath, report, utilities.get_preferences().material_memory_budget)
+        self.report({'INFO'}, f"Exported the texture memory of {len(report)} materials")
+        return {'FINISHED'}
+
+
+class AuditMaterials(bpy.types.Operator):
+    bl_idname = "material_creator.audit_materials"
+    bl_label = "Audit Materials"
+
+    def execute(self, context):
+        scene = bpy.context.scene
+
+        def apply_results(results):
+            properties = scene.material_creator
+            properties.audit_results.clear()
+            for result in results:
+                item = properties.audit_results.add()
+                item.name = result.material_name
+                item.material_name = result.material_name
+                item.status = result.status
+                item.material_type = result.material_type
+                item.node_count = result.node_count
+                item.extra_nodes = result.extra_nodes
+                issues = list(result.issues)
+                if result.missing_required:
+                    issues.append("Missing required slots: " + ", ".join(result.missing_required))
+                if result.missing_optional:
+                    issues.append("Missing optional slots: " + ", ".join(result.missing_optional))
+                item.issues = "; ".join(issues)
+
+            foreign = sum(result.status == audit.STATUS_FOREIGN for result in results)
+            return f"Audited {len(results)} materials, {foreign} foreign"
+
+        job = jobs.start_job(
+            "Audit Materials",
+            audit.iter_audit_materials([mat.name for mat in bpy.data.materials], material.get_template()),
+            on_finish=apply_results
+        )
+        if job.is_done:
+            self.report({'ERROR'} if job.error else {'INFO'}, job.message)
+        return {'FINISHED'}
+
+
+class MonitorJobs(bpy.types.Operator):
+    bl_idname = "material_creator.monitor_jobs"
+    bl_label = "Monitor Jobs"
+
+    # Seconds between the checks for finished jobs
+    INTERVAL = 0.2
+
+    _timer = None
+    # The ids of the finished jobs already reported, set per instance in invoke
+    _reported = set()
+
+    def invoke(self, context, event):
+        if jobs.RUNNER.is_monitored:
+            return {'CANCELLED'}
+        jobs.RUNNER.is_monitored = True
+        self._reported = {job.id for job in jobs.RUNNER.finished}
+        self._timer = context.window_manager.event_timer_add(self.INTERVAL, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        cancelled = event.type == 'ESC' and event.value == 'PRESS' and jobs.RUNNER.jobs
+        if cancelled:
+            jobs.RUNNER.cancel()
+
+        for job in jobs.RUNNER.finished:
+            if job.id not in self._reported:
+                self._reported.add(job.id)
+                level = {jobs.STATUS_FAILED: 'ERROR', jobs.STATUS_CANCELLED: 'WARNING'}.get(job.status, 'INFO')
+                self.report({level}, job.message)
+
+        if not jobs.RUNNER.jobs:
+            context.window_manager.event_timer_remove(self._timer)
+            jobs.RUNNER.is_monitored = False
+            return {'FINISHED'}
+        return {'RUNNING_MODAL'} if cancelled else {'PASS_THROUGH'}
+
+
+class CancelJob(bpy.types.Operator):
+    bl_idname = "material_creator.cancel_job"
+    bl_label = "Cancel Job"
+
+    job_id: bpy.props.IntProperty(
+        name="Job",
+        default=-1,
+        description="The id of the job to cancel, or -1 for the active job"
+    )
+
+    def execute(self, context):
+        if not jobs.RUNNER.jobs:
+            self.report({'ERROR'}, "No job to cancel!")
+            return {'CANCELLED'}
+
+        jobs.RUNNER.cancel(None if self.job_id < 0 else self.job_id)
+        return {'FINISHED'}
+
 
 operator_classes = [
     CreateMaterial,
+    ImportCatalogMaterial,
+    RefreshMaterialCatalog,
     AssignMaterialTexture,
+    SearchLibraryTexture,
+    RefreshTextureLibrary,
+    AssignTextureSet,
+    CreateMaterialVariants,
+    PackSlotTextures,
     ChangeMaterialType,
     CreateTextureSlot,
     CreateTexturePreview,
     DeleteMaterial,
     RenameMaterial,
     AssignToSelection,
-    DeleteUnusedMaterials
+    CompactMaterialSlots,
+    DeleteUnusedMaterials,
+    MergeDuplicateMaterials,
+    ExportMaterials,
+    EnforceTextureBudgets,
+    BuildMaterialAtlases,
+    RenderMaterialPreviews,
+    ExportTextureMemory,
+    AuditMaterials,
+    MonitorJobs,
+    CancelJob
 ]
 
 
@@ -1,7 +1,7 @@
 import bpy
 import os
 
-from .core import material, utilities
+from .core import material, material_cache, utilities, watcher
 from . import constants
 
 
@@ -19,11 +19,15 @@ class MaterialCreatorAddonProperties:
 
         return templates
 
+    def update_template_path(self, context):
+        material_cache.mark_dirty()
+
     template_path: bpy.props.EnumProperty(
         name="Template Path",
         default=None,
         items=get_templates,
         description="Select the material type",
+        update=update_template_path,
     )
 
     remove_existing_nodes: bpy.props.BoolProperty(
@@ -32,6 +36,98 @@ class MaterialCreatorAddonProperties:
         description="Remove all existing nodes from the material when changing material types."
     )
 
+    use_node_group_prototypes: bpy.props.BoolProperty(
+        name="Use Node Group Prototypes",
+        default=False,
+        description="Build each slot's node chain once per template and type as a shared node group, "
+                    "and instance it in every material instead of duplicating the nodes."
+    )
+
+    defer_image_loading: bpy.props.BoolProperty(
+        name="Defer Image Loading",
+        default=False,
+        description="Only reference texture files when assigning them, and load the pixels once an image is "
+                    "first displayed or prefetched for the selected material."
+    )
+
+    deduplicate_images: bpy.props.BoolProperty(
+        name="Deduplicate Images By Content",
+        default=False,
+        description="Reuse an existing image when an assigned texture file has identical contents, "
+                    "even if it is stored in a different folder."
+    )
+
+    def update_watch_textures(self, context):
+        watcher.update_watcher()
+
+    watch_textures: bpy.props.BoolProperty(
+        name="Watch Texture Files",
+        default=False,
+        description="Reload images automatically when their texture files are saved by another application.",
+        update=update_watch_textures,
+    )
+
+    material_memory_budget: bpy.props.FloatProperty(
+        name="Material Memory Budget (MB)",
+        default=32.0,
+        min=0.0,
+        description="The estimated texture memory above which a material is flagged as over budget."
+    )
+
+    texture_library_roots: bpy.props.StringProperty(
+        name="Texture Library",
+        default="",
+        description="The directories of the texture library searched from the texture slots, separated by semicolons."
+    )
+
+    material_library_roots: bpy.props.StringProperty(
+        name="Material Library",
+        default="",
+        description="The directories of the blend files whose materials are listed in the material catalog, separated by semicolons."
+    )
+
+    worker_processes: bpy.props.IntProperty(
+        name="Worker Processes",
+        default=4,
+        min=1,
+        description="The number of background Blender processes used for batch texture processing."
+    )
+
+    prefetch_neighbours: bpy.props.IntProperty(
+        name="Prefetch Neighbours",
+        default=2,
+        min=0,
+        description="The number of materials before and after the selected material to prefetch images for."
+    )
+
+    prefetch_budget: bpy.props.IntProperty(
+        name="Prefetch Budget (MB)",
+        default=1024,
+        min=0,
+        description="The memory prefetched images may use before the least recently requested ones are freed."
+    )
+
+
+class MaterialAuditItem(bpy.types.PropertyGroup):
+
+    material_name: bpy.props.StringProperty()
+
+    status: bpy.props.EnumProperty(
+        items=[
+            ('CONFORMING', "Conforming", "The material matches the template", 'CHECKMARK', 0),
+            ('REPAIRABLE', "Repairable", "The material is missing slots or has extra nodes", 'ERROR', 1),
+            ('FOREIGN', "Foreign", "The material's nodes are not laid out the way the template describes", 'CANCEL', 2),
+        ]
+    )
+
+    material_type: bpy.props.StringProperty()
+
+    node_count: bpy.props.IntProperty()
+
+    extra_nodes: bpy.props.IntProperty()
+
+    issues: bpy.props.StringProperty()
+
 
 class MaterialProperties(bpy.types.PropertyGroup):
 
@@ -55,7 +151,15 @@ class MaterialProperties(bpy.types.PropertyGroup):
         default='',
         maxlen=35,
     )
-    
+
+    audit_results: bpy.props.CollectionProperty(
+        type=MaterialAuditItem
+    )
+
+    audit_index: bpy.props.IntProperty(
+        default=0
+    )
+
 
 def register():
     """
@@ -64,6 +168,7 @@ def register():
     """
     properties = getattr(bpy.types.Scene, constants.ToolInfo.NAME.value, None)
     if not properties:
+        bpy.utils.register_class(MaterialAuditItem)
         bpy.utils.register_class(MaterialProperties)
         bpy.types.Scene.material_creator = bpy.props.PointerProperty(type=MaterialProperties)
 
@@ -76,4 +181,5 @@ def unregister():
     properties = getattr(bpy.types.Scene, constants.ToolInfo.NAME.value, None)
     if properties:
         bpy.utils.unregister_class(MaterialProperties)
+        bpy.utils.unregister_class(MaterialAuditItem)
         del bpy.types.Scene.material_creator
\ No newline at end of file
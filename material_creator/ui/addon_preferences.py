@@ -20,6 +20,26 @@ class MaterialCreatorPreferences(MaterialCreatorAddonProperties, bpy.types.Addon
         row = self.layout.row()
         row.prop(self, 'template_path')
         row.prop(self, 'remove_existing_nodes')
+        row = self.layout.row()
+        row.prop(self, 'use_node_group_prototypes')
+        row.prop(self, 'watch_textures')
+        row = self.layout.row()
+        row.prop(self, 'deduplicate_images')
+        row.prop(self, 'worker_processes')
+        row = self.layout.row()
+        row.prop(self, 'material_memory_budget')
+        row = self.layout.row()
+        row.prop(self, 'texture_library_roots')
+        row.operator("material_creator.refresh_texture_library", text="", icon='FILE_REFRESH')
+        row = self.layout.row()
+        row.prop(self, 'material_library_roots')
+        row.operator("material_creator.refresh_material_catalog", text="", icon='FILE_REFRESH')
+        row = self.layout.row()
+        row.prop(self, 'defer_image_loading')
+        sub_row = row.row()
+        sub_row.enabled = self.defer_image_loading
+        sub_row.prop(self, 'prefetch_neighbours')
+        sub_row.prop(self, 'prefetch_budget')
 
 
 def register():
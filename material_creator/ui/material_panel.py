@@ -1,6 +1,8 @@
 import bpy
 
-from ..core import material
+# Modules which import numpy are imported by the draw code which uses them, see operators.py
+# pylint: disable=import-outside-toplevel
+from ..core import jobs, material_cache, memory, previews, utilities
 from ..constants import ToolInfo
 
 
@@ -9,11 +11,58 @@ class MATERIAL_UL_items(bpy.types.UIList):
 
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
         material = item
+        # Materials without a rendered preview keep the generic icon
+        icon_value = previews.get_material_icon(material)
+        icon_args = {"icon_value": icon_value} if icon_value else {"icon": 'MATERIAL'}
         if self.layout_type in {'DEFAULT', 'COMPACT'}:
-            layout.label(text=material.name, icon='MATERIAL')
+            layout.label(text=material.name, **icon_args)
         elif self.layout_type == 'GRID':
             layout.alignment = 'CENTER'
-            layout.label(text="", icon='MATERIAL')
+            layout.label(text="", **icon_args)
+
+
+class MATERIAL_UL_audit(bpy.types.UIList):
+    bl_idname = "MATERIAL_UL_audit"
+
+    sort_key: bpy.props.EnumProperty(
+        name="Sort By",
+        items=[
+            ('STATUS', "Status", "Sort by how far the material is from the template"),
+            ('NODES', "Nodes", "Sort by the number of nodes"),
+            ('EXTRA', "Extra Nodes", "Sort by the number of nodes the template does not describe"),
+            ('NAME', "Name", "Sort by material name"),
+        ]
+    )
+
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        status_icon = item.bl_rna.properties['status'].enum_items[item.status].icon
+        row = layout.row()
+        row.label(text=item.material_name, icon=status_icon)
+        row.label(text=item.material_type)
+        row.label(text=f"{item.node_count} nodes, {item.extra_nodes} extra")
+
+    def draw_filter(self, context, layout):
+        row = layout.row()
+        row.prop(self, "filter_name", text="")
+        row.prop(self, "sort_key", text="")
+        row.prop(self, "use_filter_sort_reverse", text="", icon='SORT_DESC')
+
+    def filter_items(self, context, data, propname):
+        items = getattr(data, propname)
+        helper = bpy.types.UI_UL_list
+
+        flags = helper.filter_items_by_name(self.filter_name, self.bitflag_filter_item, items, "material_name")
+        if self.sort_key == 'NAME':
+            order = helper.sort_items_by_name(items, "material_name")
+        else:
+            status_order = {'FOREIGN': 0, 'REPAIRABLE': 1, 'CONFORMING': 2}
+            keys = {
+                'STATUS': lambda item: status_order[item.status],
+                'NODES': lambda item: -item.node_count,
+                'EXTRA': lambda item: -item.extra_nodes,
+            }[self.sort_key]
+            order = helper.sort_items_helper([(index, keys(item)) for index, item in enumerate(items)], lambda pair: pair[1])
+        return flags, order
 
 
 class MATERIAL_PT_panel(bpy.types.Panel):
@@ -34,41 +83,60 @@ class MATERIAL_PT_panel(bpy.types.Panel):
         row.template_list("MATERIAL_UL_items", "", bpy.data, "materials", properties, "scene_material_index")
 
         if properties.source_material:
+            state = material_cache.get_material_state(properties)
+
             # Draw the material properties
             box = layout.box()
-            box.label(text="Material Properties - " + properties.material_type, icon='MATERIAL')
-            self.draw_material_properties(box, properties)
+            box.label(text="Material Properties - " + state.material_type, icon='MATERIAL')
+            self.draw_material_properties(box, properties, state)
 
             # Draw the texture slots
-            self.draw_texture_slots(layout, properties)
+            self.draw_texture_slots(layout, properties, state)
 
         # Draw the operations
         layout.separator()
         layout.label(text="Operations", icon='MODIFIER')
+        self.draw_jobs()
         self.draw_operations()
 
-    def draw_material_properties(self, box, properties):
+    def draw_jobs(self):
+        """ Draw the progress of the running jobs """
+        if not jobs.RUNNER.jobs:
+            return
+        box = self.layout.box()
+        for job in jobs.RUNNER.jobs:
+            row = box.row()
+            row.progress(factor=job.progress, type='BAR', text=f"{job.name} {job.progress:.0%}")
+            row.operator("material_creator.cancel_job", text="", icon='CANCEL').job_id = job.id
+
+    def draw_material_properties(self, box, properties, state):
         """ Draw the properties of the selected material """
+        from ..core import usage
+
+        material_usage = usage.get_material_usage(properties.source_material)
+        box.label(text=f"Used on {material_usage.faces} faces across {len(material_usage.objects)} objects")
+        material_memory = memory.get_material_memory(properties.source_material)
+        over_budget = material_memory.total > utilities.get_preferences().material_memory_budget * memory.MEGABYTE
+        box.label(
+            text=f"Texture memory: {material_memory.total / memory.MEGABYTE:.1f} MB",
+            icon='ERROR' if over_budget else 'TEXTURE'
+        )
+
         rename_operator = box.operator("material_creator.rename_material", text="Rename Material")
         box.operator("material_creator.change_type", text="Change Type")
+        box.operator("material_creator.create_material_variants", text="Create Variants")
         box.operator("material_creator.delete_material", text="Delete", icon='ERROR')
 
-        material_type = material.get_template().material_config.material_types[material.get_material_type(properties)]
-        rename_operator.material_name = properties.source_material.name.replace(material_type.suffix, '')
+        rename_operator.material_name = properties.source_material.name.replace(state.suffix, '')
 
-    def draw_texture_slots(self, layout, properties):
+    def draw_texture_slots(self, layout, properties, state):
         """ Draw the texture slots for the selected material """
 
         layout.separator()
         layout.label(text="Texture Slots", icon='TEXTURE')
-        for texture_slot in material.get_texture_slots(properties, optional=True):
-            texture_nodes = material.get_texture_nodes(properties, texture_slot.slot_name)
-            if isinstance(texture_nodes, ValueError):
-                continue
-
-            texture_node = None
-            if len(texture_nodes) > 0:
-                texture_node = texture_nodes[0]
+        has_library = bool(utilities.get_preferences().texture_library_roots.strip())
+        for texture_slot in state.slots:
+            texture_node = state.get_texture_node(properties.node_tree, texture_slot.slot_name)
 
             texture_slot_box = layout.box()
             if not texture_node:
@@ -82,23 +150,37 @@ class MATERIAL_PT_panel(bpy.types.Panel):
                 row.label(text="Slot : " + texture_slot.slot_name + " " + texture_slot.description)
                 if texture_node.image:
 
-                    texture = bpy.data.textures.get(texture_slot.slot_name)
-                    if not texture:
-                        self.create_texture_preview_deferred(texture_slot.slot_name)
-                    elif texture_node.image != texture.image:
+                    texture, is_current = state.get_preview(texture_slot.slot_name, texture_node)
+                    if not is_current:
                         self.create_texture_preview_deferred(texture_slot.slot_name)
 
                     texture_slot_box.template_ID_preview(texture, "image", hide_buttons=True)
                 op = texture_slot_box.operator("material_creator.assign_texture", text="Browse Image")
                 op.slot_name = texture_slot.slot_name
 
+            if has_library:
+                op = texture_slot_box.operator("material_creator.search_library_texture", text="Search Library", icon='VIEWZOOM')
+                op.slot_name = texture_slot.slot_name
+
+            if texture_slot.slot_name in state.packed_slots:
+                op = texture_slot_box.operator("material_creator.pack_slot_textures", text="Pack Channels")
+                op.slot_name = texture_slot.slot_name
+
     def draw_operations(self):
         """ Draw the operations for the selected material """
         layout = self.layout
         box_buttons = layout.box()
         box_buttons.operator("material_creator.create_material", text="Create Material")
+        box_buttons.operator("material_creator.import_catalog_material", text="Import From Catalog")
+        box_buttons.operator("material_creator.assign_texture_set", text="Assign Texture Set")
         box_buttons.operator("material_creator.assign_to_selection", text="Assign To Selection")
+        box_buttons.operator("material_creator.compact_material_slots", text="Compact Material Slots")
         box_buttons.operator("material_creator.delete_unused_materials", text="Delete Unused Materials")
+        box_buttons.operator("material_creator.merge_duplicate_materials", text="Merge Duplicate Materials")
+        box_buttons.operator("material_creator.export_materials", text="Export Materials")
+        box_buttons.operator("material_creator.enforce_texture_budgets", text="Enforce Texture Budgets")
+        box_buttons.operator("material_creator.build_material_atlases", text="Build Material Atlases")
+        box_buttons.operator("material_creator.render_material_previews", text="Render Material Previews")
 
     def create_texture_preview_deferred(self, slot_name):
         """ Create a texture preview for the given slot name """
@@ -109,11 +191,74 @@ class MATERIAL_PT_panel(bpy.types.Panel):
         bpy.app.timers.register(_create_texture_preview)
 
 
+class MATERIAL_PT_audit(bpy.types.Panel):
+    bl_label = "Template Audit"
+    bl_idname = "MATERIAL_PT_audit"
+    bl_parent_id = "MATERIAL_PT_panel"
+    bl_space_type = ToolInfo.AREA.value
+    bl_region_type = ToolInfo.REGION.value
+    bl_category = ToolInfo.CATEGORY.value
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        properties = bpy.context.scene.material_creator
+        layout.operator("material_creator.audit_materials", text="Audit Materials")
+        layout.template_list("MATERIAL_UL_audit", "", properties, "audit_results", properties, "audit_index")
+
+        if 0 <= properties.audit_index < len(properties.audit_results):
+            item = properties.audit_results[properties.audit_index]
+            for issue in filter(None, item.issues.split("; ")):
+                layout.label(text=issue)
+
+
+class MATERIAL_PT_memory(bpy.types.Panel):
+    bl_label = "Texture Memory"
+    bl_idname = "MATERIAL_PT_memory"
+    bl_parent_id = "MATERIAL_PT_panel"
+    bl_space_type = ToolInfo.AREA.value
+    bl_region_type = ToolInfo.REGION.value
+    bl_category = ToolInfo.CATEGORY.value
+    bl_options = {'DEFAULT_CLOSED'}
+
+    # The number of largest materials listed
+    TOP_MATERIALS = 10
+
+    def draw(self, context):
+        layout = self.layout
+        budget = utilities.get_preferences().material_memory_budget
+        scene_memory = memory.get_scene_memory()
+        report = scene_memory.report
+
+        box = layout.box()
+        box.label(text=f"Scene: {scene_memory.total / memory.MEGABYTE:.1f} MB", icon='SCENE_DATA')
+        for type_name, total in sorted(scene_memory.by_type.items(), key=lambda item: -item[1]):
+            box.label(text=f"{type_name}: {total / memory.MEGABYTE:.1f} MB")
+        if scene_memory.unknown:
+            box.label(text=f"{scene_memory.unknown} materials with images of unknown size", icon='QUESTION')
+
+        over_budget = {item.material_name for item in memory.get_over_budget(report, budget)}
+        box = layout.box()
+        box.label(text=f"{len(over_budget)} materials over {budget:.0f} MB", icon='ERROR' if over_budget else 'CHECKMARK')
+        for item in report[:self.TOP_MATERIALS]:
+            row = box.row()
+            row.label(text=item.material_name, icon='ERROR' if item.material_name in over_budget else 'MATERIAL')
+            row.label(text=f"{item.total / memory.MEGABYTE:.1f} MB")
+
+        layout.operator("material_creator.export_texture_memory", text="Export CSV")
+
+
 def register():
     bpy.utils.register_class(MATERIAL_UL_items)
+    bpy.utils.register_class(MATERIAL_UL_audit)
     bpy.utils.register_class(MATERIAL_PT_panel)
+    bpy.utils.register_class(MATERIAL_PT_audit)
+    bpy.utils.register_class(MATERIAL_PT_memory)
 
 
 def unregister():
     bpy.utils.unregister_class(MATERIAL_UL_items)
+    bpy.utils.unregister_class(MATERIAL_UL_audit)
+    bpy.utils.unregister_class(MATERIAL_PT_audit)
+    bpy.utils.unregister_class(MATERIAL_PT_memory)
     bpy.utils.unregister_class(MATERIAL_PT_panel)
@@ -1,8 +1,13 @@
 import unittest
 import bpy
+import numpy as np
 import os
+import shutil
+import struct
+import tempfile
 from ..constants import MaterialConstants
-from ..core import material
+from ..core import atlas, budgets, bulk_edit, catalog, export, image_prefetch, image_scan, jobs, library, material, material_cache, node_groups, packing, previews, usage, utilities, variants
+from ..core.template import TextureSlot
 
 PATH = __file__
 
@@ -100,6 +105,39 @@ class TestOperators(unittest.TestCase):
         if not texture_nodes[0].image:
             self.fail('Texture not assigned to material!')
 
+    def test_prototype_names(self):
+        """ Test that prototype names change when the slot connections of the template change """
+        connections = [
+            [["ShaderNodeTexImage.Color", "ShaderNodeInvert.Color"], ["ShaderNodeInvert.Color", "{SHADER}.Base Color"]]
+        ]
+        edited_connections = [[["ShaderNodeTexImage.Color", "{SHADER}.Base Color"]]]
+        slot = TextureSlot(slot_name=self.SLOT_NAME, description="", properties={}, connections=connections)
+        edited = TextureSlot(slot_name=self.SLOT_NAME, description="", properties={}, connections=edited_connections)
+        name = node_groups.get_prototype_name("template.json", "Default", slot)
+        if name != node_groups.get_prototype_name("template.json", "Default", slot):
+            self.fail('Prototype name not stable!')
+        if name == node_groups.get_prototype_name("template.json", "Default", edited):
+            self.fail('Prototype name not versioned by the slot connections!')
+
+    def test_node_group_prototypes(self):
+        """ Test that texture slots instance a shared node group prototype """
+        preferences = utilities.get_preferences()
+        preferences.use_node_group_prototypes = True
+        try:
+            self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
+            self.operators.create_texture_slot(slot_name=self.SLOT_NAME)
+        finally:
+            preferences.use_node_group_prototypes = False
+
+        properties = bpy.context.scene.material_creator
+        group_nodes = [node for node in properties.node_tree.nodes if node.bl_idname == 'ShaderNodeGroup']
+        if len(group_nodes) != 1:
+            self.fail('Node group prototype not instanced!')
+
+        texture_nodes = material.get_texture_nodes(properties, slot_name=self.SLOT_NAME)
+        if len(texture_nodes) < 1:
+            self.fail('Texture nodes not created!')
+
     def test_assign_to_selected(self):
         """ Test the assignment of a material to a selected object """
         self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
@@ -112,6 +150,21 @@ class TestOperators(unittest.TestCase):
         if bpy.context.object.active_material.name != self.TEST_MATERIAL_NAME:
             self.fail('Material not assigned to object!')   
 
+    def test_compact_material_slots(self):
+        """ Test that unused and duplicate material slots are removed """
+        self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
+        test_material = bpy.data.materials[self.TEST_MATERIAL_NAME]
+        bpy.ops.mesh.primitive_cube_add()
+        mesh = bpy.context.object.data
+        for _ in range(3):
+            mesh.materials.append(test_material)
+        for face in mesh.polygons:
+            face.material_index = face.index % 3
+
+        self.operators.compact_material_slots()
+        if len(mesh.materials) != 1 or any(face.material_index != 0 for face in mesh.polygons):
+            self.fail('Material slots not compacted!')
+
     def test_delete_unused_materials(self):
         """ Test the deletion of unused materials """
         self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
@@ -121,6 +174,437 @@ class TestOperators(unittest.TestCase):
         if self.TEST_MATERIAL_NAME in bpy.data.materials:
             self.fail('Material not deleted!')
 
+    def test_merge_duplicate_materials(self):
+        """ Test that identical materials are merged into one """
+        self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
+        duplicate = bpy.data.materials[self.TEST_MATERIAL_NAME].copy()
+        duplicate_name = duplicate.name
+        self.operators.merge_duplicate_materials()
+
+        if duplicate_name in bpy.data.materials or self.TEST_MATERIAL_NAME not in bpy.data.materials:
+            self.fail('Duplicate material not merged!')
+
+    def test_merge_duplicate_typed_materials(self):
+        """ Test that numbered copies of a material with a type suffix are merged into it """
+        preferences = utilities.get_preferences()
+        template_name = preferences.template_path
+        preferences.template_path = 'unity_urp.json'
+        try:
+            self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name='PBR')
+            properties = bpy.context.scene.material_creator
+            material_name = properties.source_material.name
+            duplicate_name = properties.source_material.copy().name
+            self.operators.merge_duplicate_materials()
+        finally:
+            preferences.template_path = template_name
+
+        if duplicate_name in bpy.data.materials or material_name not in bpy.data.materials:
+            self.fail('Duplicate typed material not merged!')
+
+    def test_cancel_type_change_job(self):
+        """ Test that a cancelled type change restores the textures of the slots the new type removed """
+        preferences = utilities.get_preferences()
+        template_name = preferences.template_path
+        preferences.template_path = 'unity_urp.json'
+        try:
+            self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name='PBR')
+            self.operators.assign_texture(slot_name='Mask', filepath=os.path.join(os.path.dirname(PATH), 'grid.png'))
+            material_name = bpy.context.scene.material_creator.source_material.name
+
+            job = jobs.Job("Change Type", material.iter_change_materials_type([material_name], 'Unlit', False))
+            job.advance()
+            job.cancel()
+            if job.status != jobs.STATUS_CANCELLED:
+                self.fail('Job not cancelled!')
+
+            restored = bpy.data.materials.get(material_name)
+            if not restored:
+                self.fail('Material not restored!')
+            properties = material.get_material_properties(restored)
+            texture_nodes = material.get_texture_nodes(properties, slot_name='Mask')
+        finally:
+            preferences.template_path = template_name
+
+        if not texture_nodes or not texture_nodes[0].image:
+            self.fail('Texture not restored!')
+
+    def create_quad_mesh(self, name, materials):
+        """ Create an object with a unit quad per material, each quad using the whole 0-1 UV range """
+        mesh = bpy.data.meshes.new(name)
+        corners = ((0, 0), (1, 0), (1, 1), (0, 1))
+        vertices = [(x + offset, y, 0.0) for offset in range(len(materials)) for x, y in corners]
+        faces = [tuple(range(index * 4, index * 4 + 4)) for index in range(len(materials))]
+        mesh.from_pydata(vertices, [], faces)
+        uv_layer = mesh.uv_layers.new(name="UVMap")
+        uv_layer.data.foreach_set("uv", [0, 0, 1, 0, 1, 1, 0, 1] * len(materials))
+        for index, mat in enumerate(materials):
+            mesh.materials.append(mat)
+            mesh.polygons[index].material_index = index
+        obj = bpy.data.objects.new(name, mesh)
+        bpy.context.scene.collection.objects.link(obj)
+        return mesh
+
+    def test_plan_atlas(self):
+        """ Test that atlas entries are placed tallest first without overlapping, in a power of two atlas """
+        entries = [atlas.AtlasEntry("A", {}, 64, 64), atlas.AtlasEntry("B", {}, 64, 32)]
+        width, height, remaining = atlas.plan_atlas(entries, 256, 4)
+        if (width, height) != (128, 128) or remaining:
+            self.fail('Atlas size not planned correctly!')
+        if [(entry.x, entry.y) for entry in entries] != [(4, 4), (4, 76)]:
+            self.fail('Atlas entries not placed correctly!')
+
+    def test_remap_mesh(self):
+        """ Test that the UVs of atlased materials are moved into their rectangle and their faces reassigned """
+        source = bpy.data.materials.new("AtlasSource")
+        atlas_material = bpy.data.materials.new("AtlasTarget")
+        mesh = self.create_quad_mesh("AtlasRemap", [source])
+        try:
+            placements = {source.name: (atlas_material.name, np.array([0.5, 0.5, 0.25, 0.5], dtype=np.float32))}
+            if not atlas.remap_mesh(mesh, placements):
+                self.fail('Mesh not remapped!')
+            uvs = np.empty(8, dtype=np.float32)
+            mesh.uv_layers["UVMap"].data.foreach_get("uv", uvs)
+            if not np.allclose(uvs, [0.25, 0.5, 0.75, 0.5, 0.75, 1.0, 0.25, 1.0]):
+                self.fail('UVs not moved into the atlas rectangle!')
+            if mesh.polygons[0].material_index != mesh.materials.find(atlas_material.name):
+                self.fail('Faces not assigned to the atlas material!')
+        finally:
+            bpy.data.meshes.remove(mesh)
+            bpy.data.materials.remove(source)
+            bpy.data.materials.remove(atlas_material)
+
+    def test_atlas_size_budget(self):
+        """ Test that atlases are no larger than the budgets of the slots they fill """
+        preferences = utilities.get_preferences()
+        template_name = preferences.template_path
+        preferences.template_path = 'unity_urp.json'
+        try:
+            if atlas.get_atlas_size('PBR', ['B', 'Mask'], 4096) != 2048:
+                self.fail('Atlas size not capped at the slot budget!')
+            if atlas.get_atlas_size('PBR', ['B'], 1024) != 1024:
+                self.fail('Atlas size larger than asked for!')
+        finally:
+            preferences.template_path = template_name
+
+    def test_rebuild_atlases(self):
+        """ Test that building atlases again never overwrites the atlases earlier materials use """
+        texture_path = os.path.join(os.path.dirname(PATH), 'grid.png')
+        materials = []
+        for name in ("AtlasFirst", "AtlasSecond"):
+            self.operators.create_material(material_name=name, type_name=MaterialConstants.DEFAULT_TYPE)
+            self.operators.assign_texture(slot_name=self.SLOT_NAME, filepath=texture_path)
+            materials.append(bpy.context.scene.material_creator.source_material)
+        self.create_quad_mesh("AtlasRebuild", materials)
+
+        with tempfile.TemporaryDirectory() as directory:
+            first_result = atlas.build_atlases(materials, directory, 2048, 4)
+            first_files = set(os.listdir(directory))
+            second_result = atlas.build_atlases(materials, directory, 2048, 4)
+
+            if len(first_result.materials) != 1 or len(second_result.materials) != 1:
+                self.fail('Atlas materials not created!')
+            if set(first_result.materials) & set(second_result.materials):
+                self.fail('Atlas material reused!')
+            if not first_files < set(os.listdir(directory)):
+                self.fail('Atlas files overwritten!')
+
+    def test_export_materials(self):
+        """ Test that materials are exported once and skipped when unchanged """
+        self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
+
+        with tempfile.TemporaryDirectory() as directory:
+            first_result = export.export_materials(directory)
+            if not os.path.exists(os.path.join(directory, export.MANIFEST_FILE)):
+                self.fail('Manifest not exported!')
+            if first_result.exported < 1:
+                self.fail('Material not exported!')
+
+            second_result = export.export_materials(directory)
+            if second_result.exported != 0:
+                self.fail('Unchanged materials exported again!')
+
+    def test_descriptor_file_names(self):
+        """ Test that names which only differ by unsafe characters get different descriptor files """
+        if export.get_descriptor_file_name("Crate/M") == export.get_descriptor_file_name("Crate_M"):
+            self.fail('Descriptor file names collide!')
+        if not export.get_descriptor_file_name("Crate/M").startswith("Crate_M_"):
+            self.fail('Descriptor file name not readable!')
+
+    def test_bulk_edit_scoped_to_job(self):
+        """ Test that a bulk edit spanning the yields of a job does not defer the edits made between its steps """
+        self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
+        source_material = bpy.context.scene.material_creator.source_material
+
+        def steps():
+            with bulk_edit.bulk_edit() as edit:
+                edit.touch(source_material)
+                yield 0.5
+
+        job = jobs.Job("Bulk Edit", steps())
+        job.advance()
+        with bulk_edit.bulk_edit() as edit:
+            if edit.depth != 1:
+                self.fail('Edit between job steps nested in the job edit!')
+        job.advance()
+        if job.status != jobs.STATUS_FINISHED or job.edit.is_active or job.edit.materials:
+            self.fail('Job edit not flushed!')
+
+    def test_cancel_export_job(self):
+        """ Test that a cancelled export leaves no files behind """
+        self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
+
+        with tempfile.TemporaryDirectory() as directory:
+            job = jobs.Job("Export", export.iter_export_materials(directory))
+            job.advance()
+            job.cancel()
+            if job.status != jobs.STATUS_CANCELLED:
+                self.fail('Job not cancelled!')
+            descriptor_dir = os.path.join(directory, export.DESCRIPTOR_DIR)
+            if os.listdir(descriptor_dir) or os.path.exists(os.path.join(directory, export.MANIFEST_FILE)):
+                self.fail('Cancelled export not rolled back!')
+
+    def test_slot_budget_warnings(self):
+        """ Test that images over the slot budget are assigned with a warning instead of being rejected """
+        slot = TextureSlot(slot_name=self.SLOT_NAME, description="", properties={},
+                           connections=[[["ShaderNodeTexImage.Color", "{SHADER}.Base Color"]]])
+        info = image_scan.ImageInfo(path="large.png", format="PNG", width=8192, height=4096, channels=4, bit_depth=8)
+        if image_scan.get_slot_problems(info, slot):
+            self.fail('Image over the budget rejected!')
+        if not image_scan.get_slot_warnings(info, slot, 2048):
+            self.fail('Image over the budget not reported!')
+        if image_scan.get_slot_warnings(info, slot, 8192):
+            self.fail('Image within the budget reported!')
+
+    def test_image_headers(self):
+        """ Test that the dimensions, channels and bit depth are read from the PNG, JPEG, TGA and EXR headers """
+        exr_channels = b"".join(name + b"\0" + struct.pack("<i4x8x", 1) for name in (b"B", b"G", b"R")) + b"\0"
+        headers = {
+            'rgba.png': image_scan.PNG_SIGNATURE + struct.pack(">I4sIIBBBBB4x", 13, b"IHDR", 64, 32, 8, 6, 0, 0, 0),
+            'trns.png': image_scan.PNG_SIGNATURE + struct.pack(">I4sIIBBBBB4x", 13, b"IHDR", 64, 32, 16, 2, 0, 0, 0)
+                        + struct.pack(">I4s6x4x", 6, b"tRNS"),
+            'rgb.jpg': image_scan.JPEG_SIGNATURE + struct.pack(">2sH14x", b"\xff\xe0", 16)
+                       + struct.pack(">2sHBHHB9x", b"\xff\xc0", 17, 8, 48, 96, 3),
+            'rgba.tga': struct.pack("<2xB9xHHBB", 2, 16, 8, 32, 8),
+            'half.exr': image_scan.EXR_SIGNATURE + struct.pack("<i", 2)
+                        + b"channels\0chlist\0" + struct.pack("<i", len(exr_channels)) + exr_channels
+                        + b"dataWindow\0box2i\0" + struct.pack("<iiiii", 16, 0, 0, 127, 63) + b"\0",
+            'corrupt.png': image_scan.PNG_SIGNATURE + b"\0\0",
+        }
+        expected = {
+            'rgba.png': ("PNG", 64, 32, 4, 8),
+            'trns.png': ("PNG", 64, 32, 4, 16),
+            'rgb.jpg': ("JPEG", 96, 48, 3, 8),
+            'rgba.tga': ("TARGA", 16, 8, 4, 8),
+            'half.exr': ("OPEN_EXR", 128, 64, 3, 16),
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            for file_name, header in headers.items():
+                with open(os.path.join(directory, file_name), 'wb') as file:
+                    file.write(header)
+            infos = {file_name: image_scan.read_image_header(os.path.join(directory, file_name)) for file_name in headers}
+
+        for file_name, values in expected.items():
+            info = infos[file_name]
+            if not info.is_valid or (info.format, info.width, info.height, info.channels, info.bit_depth) != values:
+                self.fail(f"Header of '{file_name}' not read correctly!")
+        if not infos['half.exr'].is_float:
+            self.fail('EXR image not read as float!')
+        if infos['corrupt.png'].is_valid:
+            self.fail('Corrupt image header not reported!')
+
+    def test_prefetch_eviction(self):
+        """ Test that prefetched images are evicted least recently requested first, and requested images never are """
+        prefetcher = image_prefetch.ImagePrefetcher()
+        prefetcher.budget = 3
+        prefetcher.loaded.update([('A', 1), ('B', 1), ('C', 1), ('D', 1)])
+        prefetcher.pinned = {'A'}
+        if not prefetcher.evict() or list(prefetcher.loaded) != ['A', 'C', 'D']:
+            self.fail('Prefetched images not evicted least recently requested first!')
+
+        prefetcher.loaded.update([('E', 3)])
+        prefetcher.pinned = {'A', 'E'}
+        if prefetcher.evict() or list(prefetcher.loaded) != ['A', 'E']:
+            self.fail('Requested images not counted in the prefetch budget!')
+
+    def test_pack_channels(self):
+        """ Test that grayscale maps are packed into the channels of the slot layout, with defaults for missing maps """
+        slot = material.get_template().material_config.material_types[MaterialConstants.DEFAULT_TYPE].required_texture_slots[0]
+        if packing.get_channel_layout(slot) != {'Red': 'Roughness', 'Green': 'Metallic', 'Blue': 'Alpha'}:
+            self.fail('Channel layout not read from the slot connections!')
+
+        red = np.full((2, 3), 0.25, dtype=np.float32)
+        blue = np.full((2, 3), 0.75, dtype=np.float32)
+        packed = packing.pack_arrays({0: red, 2: blue}, (2, 3))
+        if packed.shape != (2, 3, 4):
+            self.fail('Packed image has the wrong shape!')
+        if not np.allclose(packed[0, 0], (0.25, 0.0, 0.75, 1.0)):
+            self.fail('Channels not packed with the defaults of missing maps!')
+
+    def test_resize_pixels(self):
+        """ Test that resizing keeps flat colors, averages with the box filter and clamps the Lanczos ringing """
+        flat = np.full((8, 8, 4), 0.5, dtype=np.float32)
+        for filter_type in ('BOX', 'LANCZOS'):
+            resized = budgets.resize_pixels(flat, 2, 4, filter_type)
+            if resized.shape != (4, 2, 4) or not np.allclose(resized, 0.5):
+                self.fail(f"{filter_type} resize changed a flat color!")
+
+        stripes = np.zeros((4, 4, 1), dtype=np.float32)
+        stripes[:, ::2] = 1.0
+        if not np.allclose(budgets.resize_pixels(stripes, 2, 4, 'BOX'), 0.5):
+            self.fail('Box filter does not average the source pixels!')
+
+        edge = np.zeros((16, 16, 1), dtype=np.float32)
+        edge[:, 8:] = 1.0
+        resized = budgets.resize_pixels(edge, 6, 16, 'LANCZOS')
+        if resized.min() < 0.0 or resized.max() > 1.0:
+            self.fail('Lanczos ringing not clamped!')
+
+    def test_texture_library(self):
+        """ Test that library textures are indexed and found by slot """
+        preferences = utilities.get_preferences()
+        roots = preferences.texture_library_roots
+
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copy(os.path.join(os.path.dirname(PATH), 'grid.PNG'), os.path.join(directory, 'Crate_Normal.png'))
+            preferences.texture_library_roots = directory
+            try:
+                library.refresh_library()
+                results = library.search_textures("crate", "Normal")
+            finally:
+                preferences.texture_library_roots = roots
+
+            if [os.path.basename(result.path) for result in results] != ['Crate_Normal.png']:
+                self.fail('Library texture not found!')
+            if library.search_textures("crate", "Mask"):
+                self.fail('Library texture found for the wrong slot!')
+
+    def test_material_catalog(self):
+        """ Test that catalog materials are classified by the template and searched by name and type """
+        file = os.path.join(tempfile.gettempdir(), 'props.blend')
+        entry = catalog.get_entry(file, 'Crate_PBR')
+        if catalog.parse_entry(entry) != (file, 'Crate_PBR'):
+            self.fail('Catalog entry not parsed!')
+
+        preferences = utilities.get_preferences()
+        template_name = preferences.template_path
+        preferences.template_path = 'unity_urp.json'
+        connection = catalog.open_catalog(':memory:')
+        try:
+            connection.executemany(
+                "INSERT INTO materials VALUES (?, ?, '')",
+                [(file, 'Old_Crate'), (file, 'Crate_Unlit'), (file, 'Crate_PBR'), (file, 'Barrel_PBR')]
+            )
+            connection.execute("INSERT INTO images VALUES (?, 'Crate_PBR', 'crate.png')", (file,))
+            catalog.classify_materials(connection)
+
+            types = dict(connection.execute("SELECT name, material_type FROM materials"))
+            expected = {'Old_Crate': MaterialConstants.DEFAULT_TYPE, 'Crate_Unlit': 'Unlit', 'Crate_PBR': 'PBR', 'Barrel_PBR': 'PBR'}
+            if types != expected:
+                self.fail('Catalog materials not classified by the template!')
+            template_hash = connection.execute("SELECT value FROM settings WHERE key = 'template_hash'").fetchone()
+            if not template_hash or template_hash[0] != material.get_template_hash():
+                self.fail('Catalog not keyed on the template hash!')
+
+            results = catalog.search_catalog('crate', connection=connection)
+            if [result.name for result in results] != ['Crate_PBR', 'Crate_Unlit', 'Old_Crate']:
+                self.fail('Catalog search not ordered by prefix matches first!')
+            if results[0].images != ['crate.png']:
+                self.fail('Catalog material images not listed!')
+            if [result.name for result in catalog.search_catalog('crate', 'PBR', connection=connection)] != ['Crate_PBR']:
+                self.fail('Catalog search not filtered by type!')
+        finally:
+            connection.close()
+            preferences.template_path = template_name
+
+    def test_material_record(self):
+        """ Test that a persisted material state is trusted until the node tree changes """
+        self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
+        properties = bpy.context.scene.material_creator
+        state = material_cache.get_material_state(properties)
+        material_cache.write_record(properties.source_material, state)
+
+        # Records are only trusted for the materials not edited since the file was opened
+        material_cache.on_load_post()
+        restored = material_cache.get_material_state(properties)
+        if not restored.is_persisted or restored.texture_nodes != state.texture_nodes:
+            self.fail('Material state not restored from its record!')
+        if [slot.slot_name for slot in restored.slots] != [slot.slot_name for slot in state.slots]:
+            self.fail('Material slots not restored from its record!')
+
+        properties.node_tree.nodes.new("ShaderNodeTexImage")
+        if material_cache.read_record(properties.source_material) is not None:
+            self.fail('Out of date record trusted!')
+
+    def test_save_material_records(self):
+        """ Test that saving writes the records of the materials which were never shown in the panel """
+        mat = bpy.data.materials.new(self.TEST_MATERIAL_NAME)
+        mat.use_nodes = True
+        try:
+            material_cache.on_save_pre()
+            if material_cache.RECORD_PROPERTY not in mat or material_cache.read_record(mat) is None:
+                self.fail('Record not written on save!')
+        finally:
+            bpy.data.materials.remove(mat)
+
+    def test_material_usage(self):
+        """ Test that the usage index counts the faces using a material """
+        self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
+        bpy.ops.mesh.primitive_cube_add()
+        bpy.context.object.data.materials.append(bpy.data.materials[self.TEST_MATERIAL_NAME])
+        usage.mark_dirty()
+
+        material_usage = usage.get_material_usage(bpy.data.materials[self.TEST_MATERIAL_NAME])
+        if material_usage.faces != 6 or bpy.context.object.name not in material_usage.objects:
+            self.fail('Material usage not indexed!')
+
+    def test_material_variants(self):
+        """ Test that variants are copied from the base material """
+        self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
+        base = bpy.data.materials[self.TEST_MATERIAL_NAME]
+
+        self.operators.create_texture_slot(slot_name=self.SLOT_NAME)
+        properties = bpy.context.scene.material_creator
+        node_name = material.get_texture_nodes(properties, slot_name=self.SLOT_NAME)[0].name
+        image_path = os.path.join(os.path.dirname(PATH), 'grid.PNG')
+
+        result = variants.create_variants(base, {"Red": {self.SLOT_NAME: image_path}, "Blue": {}})
+        if len(result.materials) != 2 or result.problems:
+            self.fail('Variants not created!')
+        for variant in result.materials:
+            if len(variant.node_tree.nodes) != len(base.node_tree.nodes):
+                self.fail('Variant node tree differs from the base material!')
+
+        red, blue = result.materials
+        red_image = red.node_tree.nodes[node_name].image
+        if not red_image or bpy.path.abspath(red_image.filepath) != os.path.abspath(image_path):
+            self.fail('Variant slot not overridden!')
+        if base.node_tree.nodes[node_name].image or blue.node_tree.nodes[node_name].image:
+            self.fail('Override applied to the base material!')
+
+    def test_preview_hash(self):
+        """ Test that preview hashes only change with the node graph, and identical graphs share a preview """
+        self.operators.create_material(material_name=self.TEST_MATERIAL_NAME, type_name=MaterialConstants.DEFAULT_TYPE)
+        base = bpy.data.materials[self.TEST_MATERIAL_NAME]
+        copy = base.copy()
+        preview_hash = previews.get_preview_hash(base)
+
+        previews.mark_dirty()
+        if previews.get_preview_hash(base) != preview_hash or previews.get_preview_hash(copy) != preview_hash:
+            self.fail('Preview hash not stable!')
+
+        stale = previews.get_stale_previews([base.name, copy.name], force=True)
+        if list(stale.values()) != [base]:
+            self.fail('Identical materials do not share a preview!')
+
+        copy.node_tree.nodes.new("ShaderNodeTexImage")
+        previews.mark_dirty({copy.session_uid})
+        if previews.get_preview_hash(copy) == preview_hash:
+            self.fail('Preview hash not changed with the node graph!')
+        if len(previews.get_stale_previews([base.name, copy.name], force=True)) != 2:
+            self.fail('Changed material shares the preview of the base material!')
+        bpy.data.materials.remove(copy)
+
 def test_operators():
     suite = unittest.TestLoader().loadTestsFromTestCase(TestOperators)
     unittest.TextTestRunner(verbosity=2).run(suite) 
\ No newline at end of file